@@ -1,50 +1,41 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import time
-import random
+# Run from the directory that contains the app package: python -m app.anti_crisis
+from datetime import datetime, timedelta
 
-# DB CONFIG
-DB_CONFIG = {
-    "dbname": "hospitaldb",
-    "user": "postgres",
-    "password": "posthack", 
-    "host": "localhost",
-    "port": 5432
-}
+from app.database import copy_rows, transaction
 
-def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
+HISTORY_COLUMNS = ["facility_id", "beds_occupied", "oxygen_percent", "recorded_at"]
 
 def trigger_crisis(hospital_id="H001"):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
     print(f"🚨 INITIATING CRISIS PROTOCOL FOR {hospital_id}...")
-    
-    # 1. Update LIVE DASHBOARD to Critical
-    # Oxygen drops to 82% (Warning/Critical), Beds fill up
-    cur.execute("""
-        UPDATE hospital_state 
-        SET oxygen_percent = 82.0, 
-            beds_occupied = 5, 
-            ventilators_in_use = 5,
-            oxygen_status = 'CRITICAL'
-        WHERE facility_id = %s
-    """, (hospital_id,))
-    
-    # 2. Inject BAD HISTORY (so the AI sees a downward trend)
-    # We insert records showing oxygen dropping rapidly over the last 30 mins
-    cur.execute("""
-        INSERT INTO hospital_history (facility_id, beds_occupied, oxygen_percent, recorded_at) VALUES 
-        (%s, 40, 95.0, NOW() - INTERVAL '30 minutes'),
-        (%s, 42, 92.0, NOW() - INTERVAL '20 minutes'),
-        (%s, 45, 88.0, NOW() - INTERVAL '10 minutes'),
-        (%s, 48, 82.0, NOW());
-    """, (hospital_id, hospital_id, hospital_id, hospital_id))
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    now = datetime.now()
+
+    # State and history land in one transaction: the dashboard never shows one without the other
+    with transaction() as conn:
+        # 1. Update LIVE DASHBOARD to Critical
+        # Oxygen drops to 82% (Warning/Critical), Beds fill up
+        # UPDATE only: an unknown id must not create a hospital_state row
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE hospital_state
+                SET oxygen_percent = 82.0,
+                    beds_occupied = 5,
+                    ventilators_in_use = 5,
+                    oxygen_status = 'CRITICAL'
+                WHERE facility_id = %s
+            """, (hospital_id,))
+            if cur.rowcount == 0:
+                print(f"❌ Unknown facility {hospital_id}, nothing changed")
+                return
+
+        # 2. Inject BAD HISTORY (so the AI sees a downward trend)
+        # We insert records showing oxygen dropping rapidly over the last 30 mins
+        copy_rows("hospital_history", HISTORY_COLUMNS, [
+            (hospital_id, 40, 95.0, now - timedelta(minutes=30)),
+            (hospital_id, 42, 92.0, now - timedelta(minutes=20)),
+            (hospital_id, 45, 88.0, now - timedelta(minutes=10)),
+            (hospital_id, 48, 82.0, now),
+        ], conn=conn)
+
     print(f"⚠️  CRITICAL STATUS SET. {hospital_id} is now Red.")
 
 if __name__ == "__main__":
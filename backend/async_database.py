@@ -0,0 +1,92 @@
+"""
+Async DB layer (psycopg 3) for the async routers.
+
+Sync code keeps using app.database.execute_query; `async def` endpoints
+should await these instead, so a query never blocks the event loop and
+concurrent requests overlap their DB time.
+"""
+import time
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from app.database import DB_CONFIG, record_query, wants_explain
+
+# --- POOL CONFIG ---
+ASYNC_POOL_MIN_SIZE = 2
+ASYNC_POOL_MAX_SIZE = 10
+ASYNC_POOL_TIMEOUT = 5.0        # Seconds to wait for a free connection
+ASYNC_POOL_MAX_LIFETIME = 30 * 60
+ASYNC_POOL_MAX_IDLE = 5 * 60
+
+async_pool = AsyncConnectionPool(
+    conninfo="",
+    kwargs={**DB_CONFIG, "row_factory": dict_row},
+    min_size=ASYNC_POOL_MIN_SIZE,
+    max_size=ASYNC_POOL_MAX_SIZE,
+    timeout=ASYNC_POOL_TIMEOUT,
+    max_lifetime=ASYNC_POOL_MAX_LIFETIME,
+    max_idle=ASYNC_POOL_MAX_IDLE,
+    check=AsyncConnectionPool.check_connection,
+    open=False,
+)
+
+_opened = False
+
+async def open_pool():
+    """Called from the app lifespan; also done lazily on first use."""
+    global _opened
+    if not _opened:
+        _opened = True
+        await async_pool.open()
+
+async def close_pool():
+    global _opened
+    if _opened:
+        _opened = False
+        await async_pool.close()
+
+async def _explain(conn, query, params):
+    try:
+        cur = await conn.execute("EXPLAIN " + query, params)
+        return [row["QUERY PLAN"] for row in await cur.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+
+async def _run(query, params, fetch):
+    """Runs one statement and times it into app.database.query_stats."""
+    await open_pool()
+    async with async_pool.connection() as conn:
+        started = time.perf_counter()
+        try:
+            cur = await conn.execute(query, params)
+            if fetch == "one":
+                result = await cur.fetchone()
+                rows = 1 if result else 0
+            elif fetch == "all":
+                result = await cur.fetchall()
+                rows = len(result)
+            else:
+                result = cur.rowcount
+                rows = max(cur.rowcount, 0)
+        except Exception as e:
+            record_query(query, params, (time.perf_counter() - started) * 1000.0, error=e)
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        # Writes commit when the block exits; EXPLAIN only ever runs for reads here
+        plan = await _explain(conn, query, params) if fetch == "all" and wants_explain(elapsed_ms) else None
+        record_query(query, params, elapsed_ms, rows=rows, plan=plan)
+        return result
+
+async def fetch_all(query, params=None):
+    """All rows as a list of dicts."""
+    return await _run(query, params, "all")
+
+async def execute(query, params=None, returning=False):
+    """
+    Runs a write and commits it (the pool commits when the block exits cleanly).
+    With returning=True, gives back the first row of 'INSERT ... RETURNING'.
+    """
+    return await _run(query, params, "one" if returning else None)
+
+def stats():
+    """psycopg_pool's counters (pool_size, pool_available, requests_waiting, ...)."""
+    return async_pool.get_stats()
@@ -1,49 +1,661 @@
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime
+from itertools import islice
+
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
 
 # Update with your credentials
 DB_CONFIG = {
     "dbname": "hospitaldb",
     "user": "postgres",
-    "password": "posthack", 
+    "password": "posthack",
     "host": "localhost",
     "port": 5432
 }
 
+# --- POOL CONFIG ---
+POOL_MIN_SIZE = 2               # Connections opened up front
+POOL_MAX_SIZE = 10              # Hard cap on open connections
+POOL_ACQUIRE_TIMEOUT = 5.0      # Seconds a request waits for a free connection
+POOL_MAX_LIFETIME = 30 * 60     # Recycle connections older than this (seconds)
+POOL_HEALTH_CHECK_IDLE = 30     # Ping connections idle longer than this before reuse (seconds)
+ACQUIRE_SAMPLES = 1000          # Recent acquire latencies kept for the stats
+
+# --- QUERY STATS CONFIG ---
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))        # Log statements slower than this
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "0") == "1"  # Attach EXPLAIN output to slow entries
+SLOW_QUERY_LOG_SIZE = 200       # Recent slow statements kept for the admin endpoint
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# --- BULK WRITE CONFIG ---
+BULK_PAGE_SIZE = 1000           # Rows per multi-row INSERT statement
+
 def get_db_connection():
-    """Establishes a connection to the database."""
+    """Establishes a new (unpooled) connection to the database."""
     conn = psycopg2.connect(**DB_CONFIG)
     return conn
 
+
+class PoolTimeout(Exception):
+    """No connection became free within POOL_ACQUIRE_TIMEOUT."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used", "prepared")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.prepared = set()   # Statement names PREPAREd on this connection
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe psycopg2 pool.
+    - acquire() waits up to acquire_timeout for a connection, then raises PoolTimeout
+    - connections idle longer than health_check_idle are pinged before reuse
+    - connections older than max_lifetime, closed or broken are replaced
+    """
+
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 acquire_timeout=POOL_ACQUIRE_TIMEOUT, max_lifetime=POOL_MAX_LIFETIME,
+                 health_check_idle=POOL_HEALTH_CHECK_IDLE, connect=get_db_connection):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_idle = health_check_idle
+        self._connect = connect
+
+        self._cond = threading.Condition()
+        self._idle = deque()     # _PooledConnection, most recently used on the right
+        self._in_use = {}        # id(conn) -> _PooledConnection
+        self._opening = 0        # Connections being opened outside the lock
+        self._waiting = 0
+        self._acquire_ms = deque(maxlen=ACQUIRE_SAMPLES)
+        self.counters = {"acquired": 0, "timeouts": 0, "created": 0, "closed": 0,
+                         "health_check_failures": 0, "recycled": 0}
+        self._warmed = False
+
+    # --- LIFECYCLE ---
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _open(self):
+        try:
+            pooled = _PooledConnection(self._connect())
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()   # The slot is free again: let a waiter try
+            raise
+        with self._cond:
+            self._opening -= 1
+            self.counters["created"] += 1
+        return pooled
+
+    def _close(self, pooled, reason=None):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self.counters["closed"] += 1
+            if reason:
+                self.counters[reason] += 1
+            self._cond.notify()
+
+    def _usable(self, pooled):
+        """Lifetime and health checks for an idle connection about to be handed out."""
+        now = time.monotonic()
+        if pooled.conn.closed or now - pooled.created_at > self.max_lifetime:
+            self._close(pooled, "recycled")
+            return False
+        if now - pooled.last_used > self.health_check_idle:
+            try:
+                with pooled.conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                pooled.conn.rollback()
+            except Exception:
+                self._close(pooled, "health_check_failures")
+                return False
+        return True
+
+    def _warm(self):
+        with self._cond:
+            if self._warmed:
+                return
+            self._warmed = True
+            missing = max(0, self.min_size - self._size())
+        for _ in range(missing):
+            with self._cond:
+                self._opening += 1
+            try:
+                pooled = self._open()
+            except Exception as e:
+                print(f"DB Pool warm-up failed: {e}")
+                return
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    # --- ACQUIRE / RELEASE ---
+
+    def acquire(self, timeout=None):
+        self._warm()
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            pooled = None
+            with self._cond:
+                self._waiting += 1
+                try:
+                    while not self._idle and self._size() >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.counters["timeouts"] += 1
+                            raise PoolTimeout(f"No DB connection free after {timeout:.1f}s "
+                                              f"({len(self._in_use)}/{self.max_size} in use)")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+                if self._idle:
+                    pooled = self._idle.pop()
+                    self._in_use[id(pooled.conn)] = pooled
+                else:
+                    self._opening += 1
+
+            if pooled is None:
+                pooled = self._open()
+                with self._cond:
+                    self._in_use[id(pooled.conn)] = pooled
+            elif not self._usable(pooled):
+                with self._cond:
+                    self._in_use.pop(id(pooled.conn), None)
+                continue
+
+            with self._cond:
+                self.counters["acquired"] += 1
+                self._acquire_ms.append((time.monotonic() - started) * 1000.0)
+            return pooled.conn
+
+    def release(self, conn, broken=False):
+        with self._cond:
+            pooled = self._in_use.pop(id(conn), None)
+        if pooled is None:
+            conn.close()
+            return
+
+        if not broken and not conn.closed:
+            try:
+                # Never hand out a connection with an open transaction
+                conn.rollback()
+            except Exception:
+                broken = True
+
+        if broken or conn.closed or time.monotonic() - pooled.created_at > self.max_lifetime:
+            self._close(pooled, None if broken or conn.closed else "recycled")
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def prepared_statements(self, conn):
+        """Names already PREPAREd on a checked-out connection (mutable)."""
+        return self._in_use[id(conn)].prepared
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            self._close(pooled)
+
+    # --- METRICS ---
+
+    def stats(self):
+        with self._cond:
+            samples = sorted(self._acquire_ms)
+            stats = dict(self.counters)
+            stats.update({
+                "size": self._size(),
+                "max_size": self.max_size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+            })
+        if samples:
+            stats["acquire_ms_avg"] = round(sum(samples) / len(samples), 3)
+            stats["acquire_ms_p95"] = round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3)
+            stats["acquire_ms_max"] = round(samples[-1], 3)
+        else:
+            stats["acquire_ms_avg"] = stats["acquire_ms_p95"] = stats["acquire_ms_max"] = 0.0
+        return stats
+
+
+pool = ConnectionPool()
+
+
+# --- QUERY STATS ---
+# Every statement is folded into a fingerprint (literals and placeholders
+# replaced by '?', whitespace collapsed), so the same query with different
+# parameters is one entry: calls, errors, rows, latency histogram.
+# Statements slower than SLOW_QUERY_MS also land in the slow-query log (and
+# get EXPLAIN output when SLOW_QUERY_EXPLAIN is on). Bound values are facility
+# and patient data, so the log only keeps their types, and literals are
+# stripped from the plan and the error text.
+
+query_stats = {}        # fingerprint -> counters
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_query_stats_lock = threading.Lock()
+_fingerprints = {}      # query text -> fingerprint (queries are mostly module constants)
+
+_REDACT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                             # String / array literals
+    (re.compile(r"(\s(?:=|<>|!=|<=|>=|<|>)\s)-?\d+(?:\.\d+)?\b"), r"\1?"),  # Compared numbers, not cost=/rows=
+]
+
+_FINGERPRINT_RULES = [
+    (re.compile(r"--[^\n]*"), ""),                                   # Comments
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                             # String literals
+    (re.compile(r"%s|%\(\w+\)s|\$\d+"), "?"),                         # Placeholders
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b"), "?"),                # Numbers
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?, ...)"),          # IN lists / VALUES rows
+    (re.compile(r"\(\?, \.\.\.\)(?:\s*,\s*\(\?, \.\.\.\))+"), "(?, ...), ..."),  # Multi-row VALUES
+    (re.compile(r"\s+"), " "),
+]
+
+def fingerprint(query):
+    """Normalized form of a statement, used as the stats key."""
+    fp = _fingerprints.get(query)
+    if fp is None:
+        fp = query
+        for pattern, replacement in _FINGERPRINT_RULES:
+            fp = pattern.sub(replacement, fp)
+        fp = fp.strip()
+        if len(_fingerprints) < 10000:
+            _fingerprints[query] = fp
+    return fp
+
+def wants_explain(elapsed_ms):
+    return SLOW_QUERY_EXPLAIN and elapsed_ms >= SLOW_QUERY_MS
+
+def explain(cur, query, params=None):
+    """EXPLAIN (no ANALYZE, so nothing is executed twice) on the caller's connection."""
+    try:
+        cur.execute("EXPLAIN " + query, params)
+        return [row["QUERY PLAN"] if isinstance(row, dict) else row[0] for row in cur.fetchall()]
+    except Exception as e:
+        cur.connection.rollback()
+        return [f"EXPLAIN failed: {e}"]
+
+def _redact(text):
+    for pattern, replacement in _REDACT_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+def _param_types(params):
+    """Shape of the bound parameters without their values."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [type(value).__name__ for value in params][:50]
+    return type(params).__name__
+
+def record_query(query, params, elapsed_ms, rows=0, error=None, plan=None):
+    fp = fingerprint(query)
+    bucket = bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)
+    with _query_stats_lock:
+        stats = query_stats.get(fp)
+        if stats is None:
+            stats = query_stats[fp] = {"calls": 0, "errors": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                       "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+        stats["calls"] += 1
+        stats["rows"] += rows
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["histogram"][bucket] += 1
+        if error is not None:
+            stats["errors"] += 1
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        entry = {
+            "at": time.time(),
+            "fingerprint": fp,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "rows": rows,
+            "param_types": _param_types(params),
+            # First line only: DETAIL / CONTEXT lines quote the offending row
+            "error": _redact(str(error).splitlines()[0]) if error is not None and str(error) else None,
+            "plan": [_redact(line) for line in plan] if plan else plan,
+        }
+        slow_queries.append(entry)
+        print(f"DB Slow Query ({elapsed_ms:.1f} ms, {rows} rows): {fp[:200]}")
+
+def query_report(order_by="total_ms", limit=50):
+    """Per-fingerprint stats, heaviest first; the histogram is keyed by bucket upper bound (ms)."""
+    with _query_stats_lock:
+        items = [(fp, dict(s, histogram=list(s["histogram"]))) for fp, s in query_stats.items()]
+    report = []
+    for fp, s in items:
+        s["avg_ms"] = round(s["total_ms"] / s["calls"], 3) if s["calls"] else 0.0
+        s["total_ms"] = round(s["total_ms"], 3)
+        s["max_ms"] = round(s["max_ms"], 3)
+        s["histogram"] = {f"le_{b}": n for b, n in zip(LATENCY_BUCKETS_MS, s["histogram"])} | \
+                         {"inf": s["histogram"][-1]}
+        report.append({"fingerprint": fp, **s})
+    report.sort(key=lambda r: r.get(order_by, 0), reverse=True)
+    return report[:limit]
+
+def slow_query_log(limit=50):
+    return list(slow_queries)[-limit:][::-1]
+
+def reset_query_stats():
+    with _query_stats_lock:
+        query_stats.clear()
+        slow_queries.clear()
+
+
+# --- PREPARED STATEMENTS ---
+# Hot queries the frontend polls constantly are registered once by name.
+# Each pooled connection PREPAREs a statement on its first use and then
+# only sends EXECUTE, so Postgres parses/plans it once per connection.
+
+HOT_QUERIES = {}        # name -> query text (%s placeholders)
+_PREPARE_SQL = {}       # name -> same text with $1..$n, for PREPARE
+statement_stats = {}    # name -> counters
+_stats_lock = threading.Lock()
+
+def register_query(name, query):
+    """Adds a query (written with %s placeholders) to the registry; returns its name."""
+    counter = iter(range(1, query.count("%s") + 1))
+    HOT_QUERIES[name] = query
+    _PREPARE_SQL[name] = re.sub(r"%s", lambda _: f"${next(counter)}", query)
+    statement_stats.setdefault(name, {"executions": 0, "prepares": 0, "errors": 0, "total_ms": 0.0})
+    return name
+
+def record_statement(name, elapsed_ms, prepared=False, error=False):
+    with _stats_lock:
+        stats = statement_stats[name]
+        stats["executions"] += 1
+        stats["total_ms"] += elapsed_ms
+        if prepared:
+            stats["prepares"] += 1
+        if error:
+            stats["errors"] += 1
+
+def execute_prepared(name, params=None, fetch_one=False):
+    """
+    execute_query() for a registered hot query (read-only).
+    Returns rows (or one row) like execute_query, None on error.
+    """
+    params = tuple(params or ())
+    started = time.perf_counter()
+    prepared_now = False
+    stmt_started = None
+    try:
+        with pool.connection() as conn:
+            prepared = pool.prepared_statements(conn)
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            try:
+                if name not in prepared:
+                    cur.execute(f"PREPARE {name} AS {_PREPARE_SQL[name]}")
+                    prepared.add(name)
+                    prepared_now = True
+                stmt_started = time.perf_counter()
+                if params:
+                    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+                else:
+                    cur.execute(f"EXECUTE {name}")
+                result = cur.fetchone() if fetch_one else cur.fetchall()
+                elapsed_ms = (time.perf_counter() - stmt_started) * 1000.0
+                plan = explain(cur, HOT_QUERIES[name], params) if wants_explain(elapsed_ms) else None
+                record_query(HOT_QUERIES[name], params, elapsed_ms,
+                             rows=(1 if result else 0) if fetch_one else len(result), plan=plan)
+            except psycopg2.DatabaseError as e:
+                if stmt_started is not None:
+                    record_query(HOT_QUERIES[name], params, (time.perf_counter() - stmt_started) * 1000.0, error=e)
+                # e.g. the plan went stale after a schema change: re-PREPARE next time
+                conn.rollback()
+                if name in prepared:
+                    prepared.discard(name)
+                    try:
+                        cur.execute(f"DEALLOCATE {name}")
+                    except psycopg2.DatabaseError:
+                        conn.rollback()
+                raise
+        record_statement(name, (time.perf_counter() - started) * 1000.0, prepared_now)
+        return result
+
+    except Exception as e:
+        record_statement(name, (time.perf_counter() - started) * 1000.0, prepared_now, error=True)
+        print(f"DB Error ({name}): {e}")
+        return None
+
+def statement_report():
+    with _stats_lock:
+        return {
+            name: dict(s, avg_ms=round(s["total_ms"] / s["executions"], 3) if s["executions"] else 0.0)
+            for name, s in statement_stats.items()
+        }
+
+
 def execute_query(query, params=None, fetch_one=False, commit=False):
     """
     Helper to run queries.
     Fix: Now supports 'INSERT ... RETURNING' by fetching BEFORE committing.
+    Connections come from the shared pool instead of a new connect per call.
+    Every call is timed into query_stats (see record_query).
     """
-    conn = get_db_connection()
+    started = None
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(query, params)
-        
-        result = None
-        
-        # 1. Fetch Data (if requested or available)
-        if fetch_one:
-            result = cur.fetchone()
-        elif cur.description: # If the query returns rows (like SELECT)
-            result = cur.fetchall()
-            
-        # 2. Commit (Save to Hard Drive)
-        # We check explicit 'commit' flag OR if it looks like a write operation
-        is_write = query.strip().upper().startswith(("INSERT", "UPDATE", "DELETE"))
-        if commit or is_write:
-            conn.commit()
-            
-        # 3. Return the captured result, or True if just a success signal
-        return result if result is not None else True
+        with pool.connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            started = time.perf_counter()
+            cur.execute(query, params)
+
+            result = None
+
+            # 1. Fetch Data (if requested or available)
+            if fetch_one:
+                result = cur.fetchone()
+            elif cur.description: # If the query returns rows (like SELECT)
+                result = cur.fetchall()
+
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            if cur.description:
+                rows = (1 if result else 0) if fetch_one else len(result or ())
+            else:
+                rows = max(cur.rowcount, 0)
+
+            # 2. Commit (Save to Hard Drive)
+            # We check explicit 'commit' flag OR if it looks like a write operation
+            is_write = query.strip().upper().startswith(("INSERT", "UPDATE", "DELETE"))
+            if commit or is_write:
+                conn.commit()
+
+            # After the commit, so a failing EXPLAIN can never roll back the write
+            plan = explain(cur, query, params) if wants_explain(elapsed_ms) else None
+            record_query(query, params, elapsed_ms, rows=rows, plan=plan)
+
+            # 3. Return the captured result, or True if just a success signal
+            return result if result is not None else True
 
     except Exception as e:
+        if started is not None:
+            record_query(query, params, (time.perf_counter() - started) * 1000.0, error=e)
         print(f"DB Error: {e}")
         return None
-    finally:
-        conn.close()
\ No newline at end of file
+
+
+# --- BULK WRITES ---
+# For writers with many rows: one multi-row statement per BULK_PAGE_SIZE rows
+# (or a single COPY) instead of one INSERT + commit per row. Each helper
+# takes an optional conn from transaction() so several writes commit
+# together; without one it runs in a transaction of its own. Unlike
+# execute_query they raise on failure, since a batch writer must know.
+
+@contextmanager
+def transaction():
+    """
+    A pooled connection in one explicit transaction: committed when the
+    block exits cleanly, rolled back if it raises.
+
+        with transaction() as conn:
+            bulk_insert("hospital_history", cols, rows, conn=conn)
+            bulk_upsert("hospital_state", cols, states, ["facility_id"], conn=conn)
+    """
+    with pool.connection() as conn:
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+@contextmanager
+def _scoped(conn):
+    if conn is not None:
+        yield conn
+    else:
+        with transaction() as conn:
+            yield conn
+
+def _table(table):
+    return sql.Identifier(*table.split("."))
+
+def _columns(columns):
+    return sql.SQL(", ").join(map(sql.Identifier, columns))
+
+def _pages(rows, page_size):
+    rows = iter(rows)
+    while True:
+        page = list(islice(rows, page_size))
+        if not page:
+            return
+        yield page
+
+def _execute_pages(statement, rows, page_size, conn):
+    """Runs a 'VALUES %s' statement once per page; returns the rows written."""
+    total = 0
+    with _scoped(conn) as conn:
+        query = statement.as_string(conn)
+        with conn.cursor() as cur:
+            for page in _pages(rows, page_size):
+                started = time.perf_counter()
+                try:
+                    execute_values(cur, query, page, page_size=len(page))
+                except Exception as e:
+                    record_query(query, None, (time.perf_counter() - started) * 1000.0, error=e)
+                    raise
+                record_query(query, None, (time.perf_counter() - started) * 1000.0, rows=max(cur.rowcount, 0))
+                total += max(cur.rowcount, 0)
+    return total
+
+def bulk_insert(table, columns, rows, page_size=BULK_PAGE_SIZE, conn=None):
+    """Multi-row INSERT of rows (sequences in column order); returns the number inserted."""
+    statement = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(_table(table), _columns(columns))
+    return _execute_pages(statement, rows, page_size, conn)
+
+def bulk_upsert(table, columns, rows, conflict_columns, update_columns=None,
+                page_size=BULK_PAGE_SIZE, conn=None):
+    """
+    Multi-row INSERT ... ON CONFLICT (conflict_columns) DO UPDATE of
+    update_columns (default: every non-conflict column), or DO NOTHING if
+    there is nothing to update. A page must not hit the same key twice.
+    Returns the number of rows inserted or updated.
+    """
+    if update_columns is None:
+        update_columns = [c for c in columns if c not in conflict_columns]
+    if update_columns:
+        action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(", ").join(
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in update_columns))
+    else:
+        action = sql.SQL("DO NOTHING")
+    statement = sql.SQL("INSERT INTO {} ({}) VALUES %s ON CONFLICT ({}) {}").format(
+        _table(table), _columns(columns), _columns(conflict_columns), action)
+    return _execute_pages(statement, rows, page_size, conn)
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)           # json / jsonb columns
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return (value.replace("\\", "\\\\").replace("\t", "\\t")
+                 .replace("\n", "\\n").replace("\r", "\\r"))
+
+class _CopyStream:
+    """Read-only file over an iterable of rows in COPY text format, produced as COPY reads it."""
+
+    def __init__(self, rows):
+        self._lines = ("\t".join(map(_copy_value, row)) + "\n" for row in rows)
+        self._buffer = ""
+        self.rows = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+            self.rows += 1
+        if size < 0:
+            chunk, self._buffer = self._buffer, ""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+def copy_rows(table, columns, rows, conn=None):
+    """
+    COPY rows into table in one streamed round trip: the fastest path for
+    large append-only batches (no ON CONFLICT). dict/list values are
+    written as JSON. Returns the number of rows copied.
+    """
+    stream = _CopyStream(rows)
+    with _scoped(conn) as conn:
+        query = sql.SQL("COPY {} ({}) FROM STDIN").format(_table(table), _columns(columns)).as_string(conn)
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            try:
+                cur.copy_expert(query, stream)
+            except Exception as e:
+                record_query(query, None, (time.perf_counter() - started) * 1000.0, error=e)
+                raise
+        record_query(query, None, (time.perf_counter() - started) * 1000.0, rows=stream.rows)
+    return stream.rows
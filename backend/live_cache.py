@@ -0,0 +1,278 @@
+"""
+In-process read-through cache of per-facility live state
+(hospital_live_dashboard rows, see migrations/004_live_dashboard).
+
+    live_cache.get(facility_id)   -> one row (dict) or None
+    live_cache.all_rows()         -> every facility's row
+
+A background thread LISTENs on LIVE_CHANNEL. The triggers from
+migrations/005_live_notify NOTIFY it with the facility id whenever the
+read model changes (i.e. hospital_state / hospital_capacity / hospitals
+were written), or with '*' for bulk changes, and only those entries are
+dropped. Entries also expire after LIVE_CACHE_TTL, and after the much
+shorter LIVE_CACHE_TTL_UNLISTENED while the listener is disconnected, so
+a missed notification only ever costs bounded staleness.
+
+Other in-process consumers (the push gateway) can share the listener's
+connection: add_listener(callback, channels) before start(), and callback
+(channel, payload) runs on the listener thread after the cache itself has
+been invalidated. After a (re)connect every listener gets (LIVE_CHANNEL, '*').
+
+Rows are shared between callers: treat them as read-only.
+"""
+import asyncio
+import select
+import threading
+import time
+
+from app.database import execute_prepared, get_db_connection, register_query
+
+# --- CACHE CONFIG ---
+LIVE_CHANNEL = "hospital_live"
+LIVE_CACHE_TTL = 30.0               # Seconds an entry is trusted while NOTIFYs are flowing
+LIVE_CACHE_TTL_UNLISTENED = 2.0     # ... and while the listener is down
+LISTEN_POLL_SECONDS = 5.0
+LISTEN_RETRY_SECONDS = 5.0
+ROW_LOCK_STRIPES = 64               # Single-flight row loads: facility ids hash onto this many locks
+
+LIVE_ROW_QUERY = register_query(
+    "live_dashboard_row",
+    "SELECT * FROM hospital_live_dashboard WHERE facility_id = %s"
+)
+LIVE_ROWS_QUERY = register_query(
+    "live_dashboard_rows",
+    "SELECT * FROM hospital_live_dashboard WHERE facility_id = ANY(%s)"
+)
+LIVE_ALL_QUERY = register_query(
+    "live_dashboard_all",
+    "SELECT * FROM hospital_live_dashboard"
+)
+
+
+class LiveStateCache:
+
+    def __init__(self, ttl=LIVE_CACHE_TTL, unlistened_ttl=LIVE_CACHE_TTL_UNLISTENED):
+        self.ttl = ttl
+        self.unlistened_ttl = unlistened_ttl
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # One full-snapshot load at a time; waiters re-check the cache
+        # Fixed set, so ids from request paths cannot grow it; facilities sharing a stripe load in turn
+        self._row_locks = [threading.Lock() for _ in range(ROW_LOCK_STRIPES)]
+        self._rows = {}                     # facility_id -> (row, loaded_at)
+        self._versions = {}                 # facility_id -> invalidation count
+        self._epoch = 0                     # Bumped by invalidate_all()
+        self._snapshot_at = None            # When every facility was last loaded
+        self._dirty = set()                 # Invalidated since the snapshot
+
+        self._listening = False
+        self._channels = [LIVE_CHANNEL]
+        self._listeners = []                # (callback, channels)
+        self._stop = threading.Event()
+        self._thread = None
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "invalidations": 0,
+                         "full_invalidations": 0, "loads": 0, "load_errors": 0,
+                         "notifications": 0, "listener_reconnects": 0}
+        self._load_ms = 0.0
+
+    # --- READS ---
+
+    def _current_ttl(self):
+        return self.ttl if self._listening else self.unlistened_ttl
+
+    def get(self, facility_id):
+        """The facility's live row, loading it on a miss. None if unknown (or the DB failed)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(facility_id)
+            if entry is not None:
+                if now - entry[1] < self._current_ttl():
+                    self.counters["hits"] += 1
+                    return entry[0]
+                self.counters["expired"] += 1
+            self.counters["misses"] += 1
+
+        # Concurrent misses for one facility share a load; other stripes load in parallel
+        with self._row_locks[hash(facility_id) % ROW_LOCK_STRIPES]:
+            with self._lock:
+                entry = self._rows.get(facility_id)
+                if entry is not None and time.monotonic() - entry[1] < self._current_ttl():
+                    return entry[0]   # Loaded by the request we waited for
+                version = (self._epoch, self._versions.get(facility_id, 0))
+
+            row = self._load(LIVE_ROW_QUERY, (facility_id,), fetch_one=True)
+            with self._lock:
+                # Not cached if the facility was invalidated while we were reading it
+                if row is not None and version == (self._epoch, self._versions.get(facility_id, 0)):
+                    self._rows[facility_id] = (row, time.monotonic())
+            return row
+
+    def all_rows(self):
+        """Every facility's live row; after an invalidation only the changed facilities are re-read."""
+        with self._lock:
+            if self._snapshot_fresh() and not self._dirty:
+                self.counters["hits"] += 1
+                return [row for row, _ in self._rows.values()]
+            self.counters["misses"] += 1
+
+        with self._load_lock:
+            with self._lock:
+                fresh = self._snapshot_fresh()
+                if fresh and not self._dirty:
+                    return [row for row, _ in self._rows.values()]
+                dirty = list(self._dirty) if fresh else None
+                epoch, versions = self._epoch, dict(self._versions)
+
+            rows = self._load(LIVE_ROWS_QUERY, (dirty,)) if dirty else self._load(LIVE_ALL_QUERY)
+
+            with self._lock:
+                if rows is not None and epoch == self._epoch:
+                    unchanged = lambda fid: self._versions.get(fid, 0) == versions.get(fid, 0)
+                    loaded = {row["facility_id"]: row for row in rows}
+                    now = time.monotonic()
+                    # Facilities the query no longer returns are gone (deleted / not joinable)
+                    for fid in (list(self._rows) if dirty is None else dirty):
+                        if fid not in loaded and unchanged(fid):
+                            self._rows.pop(fid, None)
+                    for fid, row in loaded.items():
+                        if unchanged(fid):
+                            self._rows[fid] = (row, now)
+                    # Whatever was invalidated while we were reading stays dirty
+                    self._dirty = {fid for fid in self._dirty if not unchanged(fid)}
+                    if dirty is None:
+                        self._snapshot_at = now
+                # On a DB error this serves what we have rather than nothing
+                return [row for row, _ in self._rows.values()]
+
+    async def all_rows_async(self):
+        """all_rows() for async routes: a hit returns inline, a miss loads in a worker thread."""
+        with self._lock:
+            if self._snapshot_fresh() and not self._dirty:
+                self.counters["hits"] += 1
+                return [row for row, _ in self._rows.values()]
+        return await asyncio.to_thread(self.all_rows)
+
+    def _snapshot_fresh(self):
+        return self._snapshot_at is not None and time.monotonic() - self._snapshot_at < self._current_ttl()
+
+    def _load(self, name, params=None, fetch_one=False):
+        started = time.perf_counter()
+        result = execute_prepared(name, params, fetch_one=fetch_one)
+        with self._lock:
+            self.counters["loads"] += 1
+            self._load_ms += (time.perf_counter() - started) * 1000.0
+            if result is None and not fetch_one:
+                self.counters["load_errors"] += 1
+        return result
+
+    # --- INVALIDATION ---
+
+    def invalidate(self, facility_id):
+        with self._lock:
+            self.counters["invalidations"] += 1
+            self._versions[facility_id] = self._versions.get(facility_id, 0) + 1
+            self._rows.pop(facility_id, None)
+            self._dirty.add(facility_id)
+
+    def invalidate_all(self):
+        with self._lock:
+            self.counters["full_invalidations"] += 1
+            self._epoch += 1
+            self._rows.clear()
+            self._dirty.clear()
+            self._snapshot_at = None
+
+    # --- LISTENER ---
+
+    def add_listener(self, callback, channels=(LIVE_CHANNEL,)):
+        """callback(channel, payload) for NOTIFYs on channels; register before start()."""
+        self._listeners.append((callback, set(channels)))
+        for channel in channels:
+            if channel not in self._channels:
+                self._channels.append(channel)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._listen_forever, name="live-cache-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(LISTEN_POLL_SECONDS + 1)
+            self._thread = None
+
+    def _listen_forever(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = get_db_connection()
+                conn.autocommit = True
+                cur = conn.cursor()
+                for channel in self._channels:
+                    cur.execute(f"LISTEN {channel}")
+                # Anything could have changed while we were not listening
+                self.invalidate_all()
+                self._forward(LIVE_CHANNEL, "*")
+                self._listening = True
+                print(f"Live cache: listening on {', '.join(self._channels)}")
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._on_notify(notify.channel, notify.payload)
+
+            except Exception as e:
+                if self._listening:
+                    print(f"Live cache: listener lost ({e}), retrying in {LISTEN_RETRY_SECONDS:.0f}s")
+                with self._lock:
+                    self.counters["listener_reconnects"] += 1
+            finally:
+                self._listening = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._stop.wait(LISTEN_RETRY_SECONDS)
+
+    def _on_notify(self, channel, payload):
+        with self._lock:
+            self.counters["notifications"] += 1
+        if channel == LIVE_CHANNEL:
+            if payload == "*":
+                self.invalidate_all()
+            else:
+                self.invalidate(payload)
+        self._forward(channel, payload)
+
+    def _forward(self, channel, payload):
+        for callback, channels in self._listeners:
+            if channel in channels:
+                try:
+                    callback(channel, payload)
+                except Exception as e:
+                    print(f"Live cache: listener callback failed: {e}")
+
+    # --- METRICS ---
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            lookups = stats["hits"] + stats["misses"]
+            stats.update({
+                "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._rows),
+                "dirty": len(self._dirty),
+                "listening": self._listening,
+                "ttl_seconds": self._current_ttl(),
+                "load_ms_avg": round(self._load_ms / stats["loads"], 3) if stats["loads"] else 0.0,
+            })
+        return stats
+
+
+live_cache = LiveStateCache()
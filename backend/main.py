@@ -1,10 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import referrals, auth, hospitals, chat, network  # <--- IMPORT CHAT
 from app.routers import referral
+from app.routers import admin
+from app.routers import live
+from app.async_database import open_pool, close_pool
+from app.live_cache import live_cache
+from app.push_gateway import push_gateway
 
 
-app = FastAPI(title="Hospital Backend API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Async DB pool for the async routers (see async_database.py)
+    await open_pool()
+    # LISTEN/NOTIFY invalidation for the live-state cache (see live_cache.py);
+    # the push gateway shares its listener, so it is hooked in first
+    push_gateway.install()
+    await push_gateway.start()
+    live_cache.start()
+    yield
+    live_cache.stop()
+    await push_gateway.stop()
+    await close_pool()
+
+
+app = FastAPI(title="Hospital Backend API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +41,8 @@ app.include_router(hospitals.router, prefix="/api/hospital", tags=["Hospital Das
 app.include_router(chat.router, prefix="/api/chat", tags=["AI Manager"]) # <--- ADD ROUTER
 app.include_router(referral.router, prefix="/api/referral", tags=["Ambulance Referral"])
 app.include_router(network.router, prefix="/api/network", tags=["Global Network"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+app.include_router(live.router, prefix="/api/live", tags=["Live Push"])
 
 
 @app.get("/")
@@ -0,0 +1,264 @@
+"""
+Real-time push gateway: WebSocket / SSE fan-out of live facility state.
+
+One upstream change feed, many sockets. The live cache's LISTEN connection
+forwards 'hospital_live' (facility changed) and 'hospital_network'
+(new network message) NOTIFYs here; changes are coalesced for
+PUSH_COALESCE_SECONDS, the changed rows are read once through the live
+cache, diffed against what was last pushed, and each diff is JSON-encoded
+once and queued to every subscriber of the facility's channel.
+
+Channels:
+    facility:<facility_id>   one facility's state + risk alerts
+    all                      every facility (commander / network views)
+    network                  new hospital_network_messages rows
+
+Who may read what mirrors the REST routes (see can_read): hospital users
+only their own facility, commanders/admins every facility and 'all', any
+signed-in user the network channel (like GET /api/network/messages).
+
+Server -> client messages:
+    {"type": "snapshot", "rows": [...]}                  on subscribe (facility / all)
+    {"type": "diff", "facility_id", "changes": {...}, "alerts"?: [...]}
+                                                          only changed columns; alerts when they changed
+    {"type": "removed", "facility_id"}
+    {"type": "message", "message": {...}}                 network channel
+    {"type": "error", "channel", "detail"}                subscribe refused
+    {"type": "ping"}
+
+Every subscriber has a bounded queue; one that falls PUSH_QUEUE_MAX messages
+behind is disconnected (the client reconnects and gets a fresh snapshot)
+rather than buffering without limit or slowing the others down.
+"""
+import asyncio
+import json
+import time
+
+from app.async_database import fetch_all
+from app.live_cache import LIVE_CHANNEL, live_cache
+from app.services.risk_alerts import generate_risk_alerts
+
+# --- PUSH CONFIG ---
+NETWORK_CHANNEL = "hospital_network"
+PUSH_COALESCE_SECONDS = 0.25    # Changes within this window go out as one round of diffs
+PUSH_RESYNC_SECONDS = 30.0      # Full diff pass, in case a NOTIFY was missed
+PUSH_QUEUE_MAX = 500            # Pending messages per subscriber before it is dropped
+PUSH_PING_SECONDS = 20.0
+
+NETWORK_MESSAGES_QUERY = "SELECT * FROM hospital_network_messages WHERE id = ANY(%s) ORDER BY id"
+
+# --- ACCESS ---
+CITYWIDE_ROLES = {"admin", "commander"}
+HOSPITAL_ROLES = {"hospital", "hospital_admin"}
+
+
+def can_read(user, channel):
+    role = user.get("role")
+    if channel == "network":
+        return True
+    if role in CITYWIDE_ROLES:
+        return channel == "all" or channel.startswith("facility:")
+    if role in HOSPITAL_ROLES and user.get("facility_id"):
+        return channel == f"facility:{user['facility_id']}"
+    return False
+
+
+def _encode(message):
+    return json.dumps(message, default=str)
+
+
+class Subscriber:
+
+    def __init__(self, user):
+        self.user = user
+        self.channels = set()
+        self.queue = asyncio.Queue(maxsize=PUSH_QUEUE_MAX)
+        self.dropped = False
+
+    def send(self, text):
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            # Too slow to keep up: the connection handler closes it
+            self.dropped = True
+
+    def wants(self, facility_id):
+        return "all" in self.channels or f"facility:{facility_id}" in self.channels
+
+
+class PushGateway:
+
+    def __init__(self):
+        self._subscribers = set()
+        self._last = {}          # facility_id -> row as last pushed
+        self._alerts = {}        # facility_id -> alerts as last pushed
+        self._changes = None     # asyncio.Queue of (channel, payload), fed from the listener thread
+        self._loop = None
+        self._task = None
+        self.counters = {"changes": 0, "rounds": 0, "diffs": 0, "sent": 0, "dropped_subscribers": 0}
+
+    # --- LIFECYCLE ---
+
+    def install(self):
+        """Hooks into the live cache's listener; call before live_cache.start()."""
+        live_cache.add_listener(self._on_notify, channels=(LIVE_CHANNEL, NETWORK_CHANNEL))
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._changes = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, channel, payload):
+        # Listener thread -> event loop
+        if self._loop is not None and self._changes is not None:
+            self._loop.call_soon_threadsafe(self._changes.put_nowait, (channel, payload))
+
+    # --- SUBSCRIPTIONS ---
+
+    def connect(self, user):
+        subscriber = Subscriber(user)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    def subscribe(self, subscriber, channels):
+        """
+        Adds the channels subscriber.user may read and queues their snapshot from
+        the last-pushed state, so no diff can overtake it. Returns the refused channels.
+        """
+        refused = []
+        for channel in channels:
+            if not can_read(subscriber.user, channel):
+                refused.append(channel)
+                subscriber.send(_encode({"type": "error", "channel": channel, "detail": "Not authorized"}))
+                continue
+            if channel in subscriber.channels:
+                continue
+            subscriber.channels.add(channel)
+            if channel == "all":
+                rows = list(self._last.values())
+            elif channel.startswith("facility:"):
+                row = self._last.get(channel.split(":", 1)[1])
+                rows = [row] if row else []
+            else:
+                continue
+            subscriber.send(_encode({"type": "snapshot", "channel": channel, "rows": rows,
+                                     "alerts": {fid: self._alerts.get(fid, []) for fid in
+                                                (r["facility_id"] for r in rows)}}))
+        return refused
+
+    def unsubscribe(self, subscriber, channels):
+        subscriber.channels.difference_update(channels)
+
+    # --- FAN-OUT ---
+
+    def _fan_out(self, message, accept):
+        text = _encode(message)   # Encoded once, whatever the number of sockets
+        for subscriber in list(self._subscribers):
+            if accept(subscriber):
+                subscriber.send(text)
+                self.counters["sent"] += 1
+                if subscriber.dropped:
+                    self.counters["dropped_subscribers"] += 1
+                    self._subscribers.discard(subscriber)
+
+    async def _run(self):
+        last_resync = 0.0   # First round is a full pass, which seeds the last-pushed state
+
+        while True:
+            try:
+                timeout = max(0.0, PUSH_RESYNC_SECONDS - (time.monotonic() - last_resync))
+                try:
+                    first = await asyncio.wait_for(self._changes.get(), timeout)
+                    batch = [first]
+                except asyncio.TimeoutError:
+                    batch = [(LIVE_CHANNEL, "*")]
+
+                # Coalesce: a burst of writes becomes one round of diffs
+                await asyncio.sleep(PUSH_COALESCE_SECONDS)
+                while not self._changes.empty():
+                    batch.append(self._changes.get_nowait())
+                self.counters["changes"] += len(batch)
+
+                facilities = {payload for channel, payload in batch if channel == LIVE_CHANNEL}
+                messages = [payload for channel, payload in batch if channel == NETWORK_CHANNEL]
+
+                if facilities:
+                    full = "*" in facilities
+                    await self._publish_state(None if full else facilities)
+                    if full:
+                        last_resync = time.monotonic()
+                if messages:
+                    await self._publish_messages(messages)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Push gateway: round failed: {e}")
+                await asyncio.sleep(1.0)
+
+    async def _publish_state(self, facility_ids):
+        """Diffs the live rows for facility_ids (None = all) against the last push and fans out."""
+        self.counters["rounds"] += 1
+        rows = {row["facility_id"]: row for row in await live_cache.all_rows_async()}
+        if not rows and self._last:
+            return   # Cache and DB both unavailable: keep clients on what they have
+
+        for fid in (set(rows) | set(self._last)) if facility_ids is None else facility_ids:
+            row = rows.get(fid)
+            if row is None:
+                if self._last.pop(fid, None) is not None:
+                    self._alerts.pop(fid, None)
+                    self._fan_out({"type": "removed", "facility_id": fid}, lambda s: s.wants(fid))
+                continue
+
+            old = self._last.get(fid) or {}
+            changes = {k: v for k, v in row.items() if k not in old or old[k] != v}
+            alerts = generate_risk_alerts(row)
+            alerts_changed = alerts != self._alerts.get(fid)
+            if not changes and not alerts_changed:
+                continue
+
+            self._last[fid] = dict(row)
+            self._alerts[fid] = alerts
+            message = {"type": "diff", "facility_id": fid, "changes": changes}
+            if alerts_changed:
+                message["alerts"] = alerts
+            self.counters["diffs"] += 1
+            self._fan_out(message, lambda s: s.wants(fid))
+
+    async def _publish_messages(self, ids):
+        try:
+            rows = await fetch_all(NETWORK_MESSAGES_QUERY, ([int(i) for i in ids],))
+        except Exception as e:
+            print(f"Push gateway: could not load network messages: {e}")
+            return
+        for row in rows:
+            self._fan_out({"type": "message", "message": row}, lambda s: "network" in s.channels)
+
+    # --- METRICS ---
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats.update({
+            "subscribers": len(self._subscribers),
+            "facilities": len(self._last),
+            "queued_max": max((s.queue.qsize() for s in self._subscribers), default=0),
+        })
+        return stats
+
+
+push_gateway = PushGateway()
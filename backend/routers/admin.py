@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends
+from app import async_database
+from app.database import pool, query_report, reset_query_stats, slow_query_log, statement_report
+from app.live_cache import live_cache
+from app.push_gateway import push_gateway
+from app.services.auth_dependency import get_admin_user
+
+router = APIRouter()
+
+@router.get("/db/pool")
+def get_pool_stats(current_user: dict = Depends(get_admin_user)):
+    """
+    Connection pool health: size, in-use, waiting requests and acquire latency (ms).
+    """
+    return pool.stats()
+
+@router.get("/db/async-pool")
+def get_async_pool_stats(current_user: dict = Depends(get_admin_user)):
+    """
+    Async (psycopg 3) pool used by the async routers.
+    """
+    return async_database.stats()
+
+@router.get("/db/statements")
+def get_statement_stats(current_user: dict = Depends(get_admin_user)):
+    """
+    Registered hot queries: executions, PREPAREs, errors and average time (ms).
+    """
+    return statement_report()
+
+@router.get("/db/queries")
+def get_query_stats(order_by: str = "total_ms", limit: int = 50,
+                    current_user: dict = Depends(get_admin_user)):
+    """
+    Per-fingerprint SQL stats: calls, errors, rows, total/avg/max ms and a latency histogram.
+    order_by: total_ms | avg_ms | max_ms | calls | errors | rows
+    """
+    return query_report(order_by=order_by, limit=limit)
+
+@router.get("/db/slow-queries")
+def get_slow_queries(limit: int = 50, current_user: dict = Depends(get_admin_user)):
+    """
+    Most recent statements over SLOW_QUERY_MS, with their parameter types (values are never
+    recorded) and EXPLAIN if SLOW_QUERY_EXPLAIN=1.
+    """
+    return slow_query_log(limit)
+
+@router.delete("/db/queries")
+def reset_query_stats_endpoint(current_user: dict = Depends(get_admin_user)):
+    """
+    Clears the query stats and the slow-query log (e.g. before a load test).
+    """
+    reset_query_stats()
+    return {"status": "success"}
+
+@router.get("/cache/live")
+def get_live_cache_stats(current_user: dict = Depends(get_admin_user)):
+    """
+    Live-state cache: hits, misses, invalidations (NOTIFY) and listener status.
+    """
+    return live_cache.stats()
+
+@router.get("/push")
+def get_push_stats(current_user: dict = Depends(get_admin_user)):
+    """
+    Push gateway: subscribers, change rounds, diffs fanned out and dropped slow clients.
+    """
+    return push_gateway.stats()
\ No newline at end of file
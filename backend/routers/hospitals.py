@@ -1,37 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.database import execute_query
+from app.database import execute_query, execute_prepared, register_query
+from app.live_cache import live_cache
 from app.services.auth_dependency import get_current_user
+from app.services.risk_alerts import generate_risk_alerts
 from app.services.triage_engine import evaluate_hospital_risk 
 import datetime
 
 router = APIRouter()
 
-# --- EXISTING HELPER (Keep this) ---
-def generate_risk_alerts(stats):
-    alerts = []
-    
-    # 1. Bed Logic
-    bed_util = stats["beds_utilization_percent"]
-    if bed_util >= 90:
-        alerts.append({"level": "CRITICAL", "message": "Hospital is at MAX CAPACITY. Divert ambulances immediately."})
-    elif bed_util >= 80:
-        alerts.append({"level": "WARNING", "message": "High Bed Occupancy (>80%). Prepare overflow protocols."})
-        
-    # 2. Ventilator Logic
-    vent_util = stats["vent_utilization_percent"]
-    if vent_util >= 90:
-        alerts.append({"level": "CRITICAL", "message": "Ventilators critically low. Request external supply."})
-    elif vent_util >= 80:
-        alerts.append({"level": "WARNING", "message": "Ventilator usage high. Monitor critical patients closely."})
-        
-    # 3. Oxygen Logic
-    oxy_level = stats["oxygen_percent"]
-    if oxy_level < 20:
-        alerts.append({"level": "CRITICAL", "message": "OXYGEN CRITICAL (<20%). IMMEDIATE REFILL NEEDED."})
-    elif oxy_level < 50:
-        alerts.append({"level": "WARNING", "message": "Oxygen reserves low. Schedule refill."})
-        
-    return alerts
+# --- HOT QUERIES (server-side prepared, see database.register_query) ---
+HISTORY_QUERY = register_query("history_last_50", """
+        SELECT recorded_at, beds_occupied, oxygen_percent 
+        FROM hospital_history 
+        WHERE facility_id = %s 
+        ORDER BY recorded_at DESC 
+        LIMIT 50
+    """)
+TRIAGE_HISTORY_QUERY = register_query("triage_history_last_20", """
+        SELECT recorded_at, beds_occupied, oxygen_percent
+        FROM hospital_history
+        WHERE facility_id = %s
+        ORDER BY recorded_at DESC
+        LIMIT 20
+    """)
 
 # --- ENDPOINTS ---
 
@@ -43,8 +34,8 @@ def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
     if user_role != "hospital_admin":
         raise HTTPException(status_code=403, detail="Not authorized to view hospital dashboard")
     
-    query = "SELECT * FROM hospital_live_dashboard WHERE facility_id = %s"
-    result = execute_query(query, (facility_id,), fetch_one=True)
+    # Served from the in-process live cache (LISTEN/NOTIFY invalidated)
+    result = live_cache.get(facility_id)
     
     if not result:
         raise HTTPException(status_code=404, detail="Hospital data not found")
@@ -104,14 +95,7 @@ def get_hospital_resources(current_user: dict = Depends(get_current_user)):
 @router.get("/history")
 def get_hospital_history(current_user: dict = Depends(get_current_user)):
     facility_id = current_user["facility_id"]
-    query = """
-        SELECT recorded_at, beds_occupied, oxygen_percent 
-        FROM hospital_history 
-        WHERE facility_id = %s 
-        ORDER BY recorded_at DESC 
-        LIMIT 50
-    """
-    history = execute_query(query, (facility_id,))
+    history = execute_prepared(HISTORY_QUERY, (facility_id,))
     return {"history": history[::-1] if history else []}
 
 @router.get("/{hospital_id}/triage")
@@ -120,26 +104,14 @@ def get_triage_status(hospital_id: str):
     Calculates Triage Status based on REAL DB HISTORY.
     """
     # 1. Fetch Static Capacities & Current Vents
-    cap_query = """
-        SELECT beds_total, ventilators_total, ventilators_in_use
-        FROM hospital_live_dashboard 
-        WHERE facility_id = %s
-    """
-    capacity_data = execute_query(cap_query, (hospital_id,), fetch_one=True)
+    capacity_data = live_cache.get(hospital_id)
     
     if not capacity_data:
         return {"status": "ERROR", "message": "Hospital ID not found"}
 
     # 2. Fetch Historical Trends (Last 20 records)
     # FIX: Fetch DESC (Newest) then reverse list
-    hist_query = """
-        SELECT recorded_at, beds_occupied, oxygen_percent
-        FROM hospital_history
-        WHERE facility_id = %s
-        ORDER BY recorded_at DESC
-        LIMIT 20
-    """
-    history_rows = execute_query(hist_query, (hospital_id,))
+    history_rows = execute_prepared(TRIAGE_HISTORY_QUERY, (hospital_id,))
     
     # REVERSE HERE so the Engine processes Oldest -> Newest
     if history_rows:
@@ -0,0 +1,126 @@
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.push_gateway import PUSH_PING_SECONDS, can_read, push_gateway
+from app.services.auth_dependency import get_current_user
+
+router = APIRouter()
+
+def authenticate(token):
+    """Browsers cannot set headers on a WebSocket / EventSource, so the JWT comes as ?token=."""
+    try:
+        return get_current_user(token)
+    except HTTPException:
+        return None
+
+def channel_list(value):
+    """A subscribe / unsubscribe value as a list of channel names; None if it is not one."""
+    if isinstance(value, list) and all(isinstance(channel, str) for channel in value):
+        return value
+    return None
+
+def client_error(subscriber, detail):
+    subscriber.send(json.dumps({"type": "error", "detail": detail}))
+
+async def next_message(subscriber):
+    """Next queued message, {"type": "ping"} after PUSH_PING_SECONDS of silence, None once dropped."""
+    if subscriber.dropped:
+        return None
+    try:
+        return await asyncio.wait_for(subscriber.queue.get(), PUSH_PING_SECONDS)
+    except asyncio.TimeoutError:
+        return None if subscriber.dropped else json.dumps({"type": "ping"})
+
+@router.websocket("/ws")
+async def live_socket(websocket: WebSocket, token: str = Query(...)):
+    """
+    Push channel. Client sends {"subscribe": [...]} / {"unsubscribe": [...]}
+    with channel names ("facility:H001", "all", "network"); see push_gateway.py.
+    """
+    user = authenticate(token)
+    if user is None:
+        await websocket.close(code=4401)
+        return
+
+    await websocket.accept()
+    subscriber = push_gateway.connect(user)
+
+    async def reader():
+        """Applies subscribe / unsubscribe requests; returns once the client disconnects."""
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("text") is None:
+                client_error(subscriber, "Expected a text frame")   # receive_text() would raise KeyError
+                continue
+            try:
+                request = json.loads(message["text"])
+            except ValueError:
+                client_error(subscriber, "Invalid JSON")
+                continue
+            if not isinstance(request, dict):
+                client_error(subscriber, "Expected an object")
+                continue
+            for key, action in (("subscribe", push_gateway.subscribe), ("unsubscribe", push_gateway.unsubscribe)):
+                if key not in request:
+                    continue
+                channels = channel_list(request[key])
+                if channels is None:
+                    client_error(subscriber, f"'{key}' must be a list of channel names")
+                else:
+                    action(subscriber, channels)
+
+    async def writer():
+        """Sends queued messages; returns once the client is dropped or gone."""
+        try:
+            while True:
+                text = await next_message(subscriber)
+                if text is None:
+                    await websocket.close(code=4408)   # Fell too far behind; client resubscribes
+                    return
+                await websocket.send_text(text)
+        except WebSocketDisconnect:
+            return
+
+    tasks = [asyncio.create_task(reader()), asyncio.create_task(writer())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()   # Surfaces anything unexpected instead of leaving it unretrieved
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        push_gateway.disconnect(subscriber)
+
+@router.get("/stream")
+async def live_stream(token: str, channels: str):
+    """
+    Server-Sent Events fallback of /ws for clients that cannot open a WebSocket.
+    channels: comma-separated, e.g. ?channels=facility:H001,network
+    """
+    user = authenticate(token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    requested = [c for c in channels.split(",") if c]
+    refused = [c for c in requested if not can_read(user, c)]
+    if refused:
+        raise HTTPException(status_code=403, detail=f"Not authorized for: {', '.join(refused)}")
+
+    subscriber = push_gateway.connect(user)
+    push_gateway.subscribe(subscriber, requested)
+
+    async def events():
+        try:
+            while True:
+                text = await next_message(subscriber)
+                if text is None:
+                    return
+                yield f"data: {text}\n\n"
+        finally:
+            push_gateway.disconnect(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
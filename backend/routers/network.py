@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from app.database import execute_query
+from app.live_cache import live_cache
 from app.services.auth_dependency import get_current_user
 
 router = APIRouter()
@@ -54,14 +55,19 @@ def post_network_message(msg: NetworkMessage, current_user: dict = Depends(get_c
     text = msg.message.lower()
     auto_reply = None
 
+    # Network scans read the in-process live cache instead of querying per message
+    def best(column, minimum):
+        rows = [r for r in live_cache.all_rows() if r[column] is not None and r[column] > minimum]
+        return max(rows, key=lambda r: r[column]) if rows else None
+
     if "vent" in text:
-        res = execute_query("SELECT name, ventilators_available FROM hospital_live_dashboard WHERE ventilators_available > 0 ORDER BY ventilators_available DESC LIMIT 1", fetch_one=True)
+        res = best("ventilators_available", 0)
         if res: auto_reply = f"System: Network Scan indicates {res['name']} has {res['ventilators_available']} ventilators available."
     elif "bed" in text or "icu" in text or "capacity" in text:
-        res = execute_query("SELECT name, beds_available FROM hospital_live_dashboard WHERE beds_available > 0 ORDER BY beds_available DESC LIMIT 1", fetch_one=True)
+        res = best("beds_available", 0)
         if res: auto_reply = f"System: Capacity Check - {res['name']} reports {res['beds_available']} open beds."
     elif "oxygen" in text or "o2" in text:
-        res = execute_query("SELECT name, oxygen_percent FROM hospital_live_dashboard WHERE oxygen_percent > 90 ORDER BY oxygen_percent DESC LIMIT 1", fetch_one=True)
+        res = best("oxygen_percent", 90)
         if res: auto_reply = f"System: {res['name']} reports optimal oxygen reserves ({res['oxygen_percent']}%)."
 
     if auto_reply:
@@ -5,7 +5,8 @@ import json
 import os
 import uuid
 from groq import Groq
-from app.database import execute_query
+from app.async_database import execute
+from app.live_cache import live_cache
 import httpx # You might need to pip install httpx
 from datetime import datetime
 from dotenv import load_dotenv
@@ -80,7 +81,7 @@ def haversine(lat1, lon1, lat2, lon2):
     a = math.sin(d_lat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lon/2)**2
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-def save_decision_log(data):
+async def save_decision_log(data):
     # Format Postgres Array
     alts = "{" + ",".join(data['alternatives']) + "}"
     
@@ -97,7 +98,7 @@ def save_decision_log(data):
         RETURNING id;
     """
     
-    execute_query(query, (
+    await execute(query, (
         data['request_id'], data['patient']['patient_id'], 
         data['calculated_severity'], # Use the calculated one
         data['patient']['required_resource'],
@@ -106,13 +107,13 @@ def save_decision_log(data):
         data['recommended'], alts, 
         data['confidence'], data['reasoning'],
         vitals_json # Save raw numbers for audit
-    ), fetch_one=True)
+    ), returning=True)
 
 # backend/routers/referral.py
 
 # backend/routers/referral.py
 
-def log_incoming_admission(data):
+async def log_incoming_admission(data):
     # Convert vitals dict to JSON string if needed, or rely on psycopg2 to handle JSONB
     # We pass data.vitals directly
     import json
@@ -125,10 +126,10 @@ def log_incoming_admission(data):
         RETURNING id;
     """
     try:
-        execute_query(query, (
+        await execute(query, (
             data.ambulance_id, data.facility_id, data.patient_id, 
             data.severity, data.required_resource, vitals_json
-        ), fetch_one=True, commit=True) # Ensure commit=True is passed/handled
+        ), returning=True) # Commits when the pooled connection is returned
     except Exception as e:
         print(f"CRITICAL DB ERROR: {e}")
 
@@ -142,29 +143,16 @@ async def optimize_referral(request: ReferralRequest):
     severity_status = calculate_severity(vitals_dict)
     
     # 2. FETCH CANDIDATES
-    sql = """
-        SELECT 
-            h.facility_id, h.name, h.latitude, h.longitude,
-            (c.beds_total - s.beds_occupied) as beds_avail,
-            (c.ventilators_total - s.ventilators_in_use) as vents_avail,
-            CASE 
-                WHEN (s.beds_occupied::float / NULLIF(c.beds_total,0)) > 0.9 THEN 'CRITICAL'
-                WHEN (s.beds_occupied::float / NULLIF(c.beds_total,0)) > 0.8 THEN 'WARNING'
-                ELSE 'NORMAL'
-            END as risk_level
-        FROM hospitals h
-        JOIN hospital_state s ON h.facility_id = s.facility_id
-        JOIN hospital_capacity c ON h.facility_id = c.facility_id
-    """
-    rows = execute_query(sql)
+    # Candidate scan runs on every ambulance request: served from the live cache
+    rows = await live_cache.all_rows_async()
     
     candidates = []
     p_lat = request.ambulance_location.lat
     p_lon = request.ambulance_location.lon
     
     for row in rows:
-        if request.required_resource == "VENTILATOR" and row['vents_avail'] <= 0: continue
-        if row['beds_avail'] <= 0: continue
+        if request.required_resource == "VENTILATOR" and row['ventilators_available'] <= 0: continue
+        if row['beds_available'] <= 0: continue
             
         dist = haversine(p_lat, p_lon, row['latitude'], row['longitude'])
         candidates.append({
@@ -173,9 +161,9 @@ async def optimize_referral(request: ReferralRequest):
             "latitude": row['latitude'],
             "longitude": row['longitude'],
             "distance_km": round(dist, 2),
-            "beds_available": row['beds_avail'],
-            "vents_available": row['vents_avail'],
-            "risk_level": row['risk_level']
+            "beds_available": row['beds_available'],
+            "vents_available": row['ventilators_available'],
+            "risk_level": row['bed_status']
         })
 
     if not candidates:
@@ -230,7 +218,10 @@ async def optimize_referral(request: ReferralRequest):
         "confidence": ai_dec.get('confidence', 0.8),
         "reasoning": ai_dec.get('reasoning', "Algorithmic")
     }
-    save_decision_log(log_data)
+    try:
+        await save_decision_log(log_data)
+    except Exception as e:
+        print(f"DB Error: {e}")
 
     return {
         "status": "success",
@@ -250,7 +241,7 @@ async def notify_hospital_webhook(data: NotificationRequest):
     
     # 1. SAVE TO DB (The New Part)
     try:
-        log_incoming_admission(data)
+        await log_incoming_admission(data)
         db_status = "Saved to Dashboard"
     except Exception as e:
         print(f"DB Log Error: {e}")
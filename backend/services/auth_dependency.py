@@ -29,4 +29,12 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         return {"username": username, "role": role, "facility_id": facility_id}
         
     except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+
+def get_admin_user(current_user: dict = Depends(get_current_user)):
+    """
+    Like get_current_user, but only lets the 'admin' role through (ops / diagnostics routes).
+    """
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view admin diagnostics")
+    return current_user
\ No newline at end of file
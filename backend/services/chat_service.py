@@ -1,6 +1,6 @@
 import os
 from groq import Groq
-from app.database import execute_query
+from app.live_cache import live_cache
 import json
 from dotenv import load_dotenv
 
@@ -13,8 +13,7 @@ client = Groq(api_key=api_key)
 
 def get_live_data(facility_id):
     """Fetches real-time dashboard data for context.""" 
-    query = "SELECT * FROM hospital_live_dashboard WHERE facility_id = %s"
-    return execute_query(query, (facility_id,), fetch_one=True)
+    return live_cache.get(facility_id)
 
 def process_chat_message(user_message, facility_id, mode="NORMAL", triage_context=None):
     # 1. Fetch Real Context
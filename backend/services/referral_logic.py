@@ -1,5 +1,5 @@
 import math
-from app.database import execute_query
+from app.live_cache import live_cache
 
 def haversine(lat1, lon1, lat2, lon2):
     """Calculates distance between two GPS points in km."""
@@ -18,18 +18,8 @@ def find_best_hospitals(user_lat: float, user_lon: float, severity: str):
     3. Returns sorted list.
     """
     
-    # 1. Fetch Live Data
-    query = """
-        SELECT 
-            h.facility_id, h.name, h.latitude, h.longitude,
-            s.beds_occupied, c.beds_total,
-            s.ventilators_in_use, c.ventilators_total,
-            s.oxygen_percent
-        FROM hospitals h
-        JOIN hospital_state s ON h.facility_id = s.facility_id
-        JOIN hospital_capacity c ON h.facility_id = c.facility_id
-    """
-    hospitals = execute_query(query)
+    # 1. Fetch Live Data (in-process live cache, see app.live_cache)
+    hospitals = live_cache.all_rows()
     
     ranked_results = []
     
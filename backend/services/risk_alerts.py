@@ -0,0 +1,31 @@
+"""
+Threshold alerts for one facility's live state (a hospital_live_dashboard row).
+Used by the hospital dashboard and the push gateway.
+"""
+
+
+def generate_risk_alerts(stats):
+    alerts = []
+    
+    # 1. Bed Logic
+    bed_util = stats["beds_utilization_percent"]
+    if bed_util >= 90:
+        alerts.append({"level": "CRITICAL", "message": "Hospital is at MAX CAPACITY. Divert ambulances immediately."})
+    elif bed_util >= 80:
+        alerts.append({"level": "WARNING", "message": "High Bed Occupancy (>80%). Prepare overflow protocols."})
+        
+    # 2. Ventilator Logic
+    vent_util = stats["vent_utilization_percent"]
+    if vent_util >= 90:
+        alerts.append({"level": "CRITICAL", "message": "Ventilators critically low. Request external supply."})
+    elif vent_util >= 80:
+        alerts.append({"level": "WARNING", "message": "Ventilator usage high. Monitor critical patients closely."})
+        
+    # 3. Oxygen Logic
+    oxy_level = stats["oxygen_percent"]
+    if oxy_level < 20:
+        alerts.append({"level": "CRITICAL", "message": "OXYGEN CRITICAL (<20%). IMMEDIATE REFILL NEEDED."})
+    elif oxy_level < 50:
+        alerts.append({"level": "WARNING", "message": "Oxygen reserves low. Schedule refill."})
+        
+    return alerts
@@ -4,37 +4,53 @@ Converts raw pressure readings to occupancy events.
 Publishes to events/bed_occupancy
 """
 
-import json
-import paho.mqtt.client as mqtt
+import time
+
+import tracing
+import transport
+import wire_format
+from change_detection import Debouncer, bed_occupied
 
 BROKER = "localhost"
-PRESSURE_THRESHOLD = 10  # Above this = occupied
+DEBOUNCE_SAMPLES = 2         # Consecutive readings needed to flip
+
+bed_last_state = Debouncer(DEBOUNCE_SAMPLES)
+latency = tracing.LatencyRecorder("bed_preprocessor")
+
+
+def process_reading(data):
+    """Maps one raw pressure reading to (topic, event) pairs — empty unless the bed flipped."""
+    fid = data["facility_id"]
+    bed_id = data["resource_id"]
+    pressure = data["raw_value"]
 
-bed_last_state = {}
+    key = (fid, bed_id)
+    # Same band as the state updater's occupied-bed tally (facility_aggregates)
+    current_occupied = bed_occupied(pressure, bed_last_state.get(key))
+
+    # Only emit on a debounced state change
+    if not bed_last_state.update(key, current_occupied):
+        return []
+
+    event = {
+        "facility_id": fid,
+        "event_type": "BED_OCCUPANCY",
+        "occupancy_state": "OCCUPIED" if current_occupied else "FREE",
+        "bed_id": bed_id,
+    }
+    tracing.carry(data, event)
+    return [("events/bed_occupancy", event)]
 
 
 def on_message(client, userdata, msg):
+    started = time.perf_counter()
     try:
-        data = json.loads(msg.payload.decode())
-        fid = data["facility_id"]
-        bed_id = data["resource_id"]
-        pressure = data["raw_value"]
-
-        current_occupied = pressure > PRESSURE_THRESHOLD
-        key = (fid, bed_id)
-        prev_occupied = bed_last_state.get(key, None)
-
-        # Only emit on state change
-        if prev_occupied != current_occupied:
-            bed_last_state[key] = current_occupied
-            event = {
-                "facility_id": fid,
-                "event_type": "BED_OCCUPANCY",
-                "occupancy_state": "OCCUPIED" if current_occupied else "FREE",
-                "bed_id": bed_id,
-            }
-            client.publish("events/bed_occupancy", json.dumps(event))
-            print(f"  Bed {bed_id} at {fid}: {'OCCUPIED' if current_occupied else 'FREE'}")
+        data = wire_format.decode(msg.payload)
+        for topic, event in process_reading(data):
+            client.publish(topic, wire_format.encode_event(event))
+            print(f"  Bed {event['bed_id']} at {event['facility_id']}: {event['occupancy_state']}")
+
+        latency.record(data.get("trace"), started)
 
     except Exception as e:
         print(f"Preprocessor error: {e}")
@@ -46,10 +62,11 @@ def on_connect(client, userdata, flags, rc):
 
 
 if __name__ == "__main__":
-    client = mqtt.Client()
+    client = transport.create_client()
     client.on_connect = on_connect
     client.on_message = on_message
     client.connect(BROKER, 1883, 60)
+    latency.start_exporter()
 
     try:
         client.loop_forever()
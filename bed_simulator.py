@@ -4,10 +4,12 @@ Full pressure sensor simulation with per-bed IDs.
 Publishes to hospital/{facility_id}/bed/raw
 """
 
-import json
 import time
 import random
-import paho.mqtt.client as mqtt
+
+import tracing
+import transport
+import wire_format
 
 BROKER = "localhost"
 
@@ -26,7 +28,7 @@ for fid, cfg in HOSPITALS.items():
 
 
 def main():
-    client = mqtt.Client()
+    client = transport.create_client()
     client.connect(BROKER, 1883, 60)
     print("Bed Simulator started — publishing to hospital/+/bed/raw")
 
@@ -46,8 +48,9 @@ def main():
                 "resource_id": bed_id,
                 "raw_value": round(pressure, 2),
             }
+            tracing.stamp(payload)
             topic = f"hospital/{fid}/bed/raw"
-            client.publish(topic, json.dumps(payload))
+            client.publish(topic, wire_format.encode_reading(payload))
 
         time.sleep(3)
 
@@ -0,0 +1,70 @@
+"""
+Change Detection — Phase 4
+Shared noise filters for the sensor preprocessors:
+hysteresis bands, N-consecutive-sample debounce and deadbands.
+"""
+
+# Bed pressure pads: one definition for the preprocessor's events and the
+# state updater's occupied-bed tally, so both count the same beds
+BED_OCCUPIED_ABOVE = 12   # Pressure above this = occupied
+BED_FREE_BELOW = 8        # Below this = free; in between keeps the last state
+
+
+def hysteresis_state(value, current, on_above, off_below):
+    """
+    Two-threshold on/off classification.
+    Turns on above on_above, off below off_below, and holds the current
+    state inside the band. With no current state, the band midpoint decides.
+    """
+    if value > on_above:
+        return True
+    if value < off_below:
+        return False
+    if current is None:
+        return value > (on_above + off_below) / 2.0
+    return current
+
+
+def bed_occupied(pressure, current=None):
+    """Occupancy of one bed from its pad pressure and its last state (None if unknown)."""
+    return hysteresis_state(pressure, current, BED_OCCUPIED_ABOVE, BED_FREE_BELOW)
+
+
+def deadband_exceeded(value, last, deadband):
+    """True if value moved at least deadband away from the last emitted value."""
+    return last is None or abs(value - last) >= deadband
+
+
+class Debouncer:
+    """
+    Per-key state that only changes after `samples` consecutive readings agree.
+    The first reading for a key is accepted immediately.
+    """
+
+    def __init__(self, samples=1):
+        self.samples = max(1, samples)
+        self.state = {}     # key -> accepted state
+        self.pending = {}   # key -> (candidate, consecutive count)
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def update(self, key, candidate):
+        """Feeds one classified reading; returns True if the accepted state changed."""
+        if key not in self.state:
+            self.state[key] = candidate
+            return True
+
+        if candidate == self.state[key]:
+            self.pending.pop(key, None)
+            return False
+
+        pending, count = self.pending.get(key, (candidate, 0))
+        count = count + 1 if pending == candidate else 1
+        if count >= self.samples:
+            self.state[key] = candidate
+            self.pending.pop(key, None)
+            return True
+
+        self.pending[key] = (candidate, count)
+        return False
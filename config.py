@@ -17,3 +17,16 @@ HOSPITAL_CONFIGS = {
 
 # Speed multiplier — higher = faster simulation
 SIMULATION_SPEED_FACTOR = 1.0
+
+# Pub/sub transport — "mqtt" (broker at BROKER) or "local" (in-process bus,
+# for components composed in one process; see transport.py / run_pipeline.py)
+TRANSPORT = "mqtt"
+
+# Payload encoding for hospital/+/+/raw and events/* — "json" or "binary"
+# Consumers accept both; see wire_format.py
+WIRE_FORMAT = "json"
+
+# End-to-end latency tracing (see tracing.py)
+TRACE_ENABLED = True
+TRACE_EXPORT_DIR = "traces"
+TRACE_EXPORT_SECONDS = 10
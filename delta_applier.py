@@ -0,0 +1,293 @@
+"""
+Delta Applier — Phase 4
+Consumes hospital_delta/updates from hospital_aggregator and persists them.
+Deltas are batched (BATCH_MAX_DELTAS or BATCH_MAX_LATENCY_MS, whichever
+comes first); each batch is one transaction with a single multi-row
+UPDATE of hospital_state (one row per facility) and one multi-row
+INSERT into hospital_state_audit (one row per delta).
+
+Deltas are relative, so applying one twice (or not at all) drifts
+hospital_state. Each carries its facility's seq within the aggregator
+run (source); delta_applier_progress (migrations/007_delta_progress)
+records the last applied seq in the same transaction, and a facility
+whose batch range was already applied is skipped. A failed batch is
+retried unchanged after RETRY_BACKOFF_MS (doubling); after MAX_RETRIES
+it is dropped and counted.
+
+Note: this is the delta-driven alternative to the raw-reading path in
+state_updator_agent.py — run one of them against a given hospital_state.
+"""
+
+import json
+import queue
+import threading
+import time
+from psycopg2.extras import execute_values
+
+import tracing
+import transport
+from hospital_aggregator import merge_delta
+from write_behind import create_pool
+
+# -------- CONFIG --------
+BROKER = "localhost"
+TOPIC = "hospital_delta/updates"
+
+DB_PARAMS = {
+    "dbname": "hospitaldb",
+    "user": "postgres",
+    "password": "posthack",
+    "host": "localhost",
+    "port": 5432
+}
+
+BATCH_MAX_DELTAS = 500
+BATCH_MAX_LATENCY_MS = 500
+QUEUE_MAX_SIZE = 20000
+STATS_INTERVAL_SECONDS = 30
+MAX_RETRIES = 5
+RETRY_BACKOFF_MS = 500
+RETRY_BACKOFF_MAX_MS = 8000
+
+
+class DeltaApplier:
+    def __init__(self, pool, batch_max=BATCH_MAX_DELTAS, max_latency_ms=BATCH_MAX_LATENCY_MS,
+                 max_queue=QUEUE_MAX_SIZE):
+        self.pool = pool
+        self.batch_max = batch_max
+        self.max_latency = max_latency_ms / 1000.0
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.counters = {"received": 0, "applied": 0, "skipped": 0, "batches": 0, "errors": 0,
+                         "retries": 0, "dropped": 0, "batch_ms_max": 0.0}
+        self._stats_lock = threading.Lock()   # counters: MQTT thread (put) and applier thread
+        self._stop = threading.Event()
+        self._thread = None
+        self._retry = []    # Batch that failed, applied again before anything new
+        # Source -> DB commit ages for traced deltas
+        self.latency = tracing.LatencyRecorder("delta_applier_commit")
+
+    def put(self, message):
+        self.queue.put(message)
+        with self._stats_lock:
+            self.counters["received"] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="delta-applier", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        for batch in (self._retry, self._collect(block=False)):
+            if not self.apply(batch):
+                self._drop(batch)
+        self._retry = []
+
+    def _collect(self, block=True):
+        """Waits for the first delta, then gathers more until the batch is full or too old."""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_max:
+            try:
+                if not block:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                if deadline is None:
+                    batch.append(self.queue.get(timeout=self.max_latency))
+                    deadline = time.monotonic() + self.max_latency
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        attempts = 0
+        while not self._stop.is_set():
+            # A failed batch is retried as it was, so its seq ranges stay all-or-nothing
+            batch = self._retry or self._collect()
+            self._retry = []
+            if not batch or self.apply(batch):
+                attempts = 0
+                continue
+
+            attempts += 1
+            if attempts > MAX_RETRIES:
+                self._drop(batch)
+                attempts = 0
+                continue
+            self._retry = batch
+            with self._stats_lock:
+                self.counters["retries"] += 1
+            self._stop.wait(min(RETRY_BACKOFF_MS * 2 ** (attempts - 1), RETRY_BACKOFF_MAX_MS) / 1000.0)
+
+    def _drop(self, batch):
+        if not batch:
+            return
+        facilities = sorted({m["facility_id"] for m in batch})
+        with self._stats_lock:
+            self.counters["dropped"] += len(batch)
+        print(f"❌ Dropped {len(batch)} deltas after {MAX_RETRIES + 1} failed attempts; "
+              f"hospital_state may have drifted for {', '.join(facilities)}")
+
+    def apply(self, batch):
+        """Applies one batch in a single transaction; False if it was rolled back."""
+        if not batch:
+            return True
+
+        # One merged delta per facility, with the seq range it covers
+        merged = {}
+        for message in batch:
+            entry = merged.setdefault(message["facility_id"], {"delta": {}, "source": None,
+                                                               "first": None, "last": None})
+            merge_delta(entry["delta"], message["delta"])
+            source, seq = message.get("source"), message.get("seq")
+            if source is None or seq is None:
+                continue   # Unnumbered (older aggregator): applied unguarded
+            if source != entry["source"]:
+                # Aggregator restarted mid-batch: only the new run's range is tracked
+                entry.update(source=source, first=seq, last=seq)
+            else:
+                entry["first"], entry["last"] = min(entry["first"], seq), max(entry["last"], seq)
+
+        state_rows = [
+            (fid, e["source"], e["first"], e["last"], e["delta"].get("beds_occupied", 0),
+             e["delta"].get("ventilators_in_use", 0), e["delta"].get("oxygen_percent"),
+             e["delta"].get("oxygen_status"))
+            for fid, e in merged.items()
+        ]
+
+        started = time.perf_counter()
+        conn = None
+        broken = False
+        try:
+            conn = self.pool.getconn()
+            with conn.cursor() as cursor:
+                # Skip facilities whose range is already recorded, record the rest, update those
+                applied = execute_values(cursor, """
+                    WITH v (facility_id, source, first_seq, last_seq,
+                            beds_delta, vents_delta, oxygen_percent, oxygen_status) AS (VALUES %s),
+                    fresh AS (
+                        SELECT v.* FROM v
+                        LEFT JOIN delta_applier_progress p ON p.facility_id = v.facility_id
+                        WHERE v.source IS NULL OR p.facility_id IS NULL
+                           OR p.source <> v.source OR p.seq < v.first_seq
+                    ),
+                    progress AS (
+                        INSERT INTO delta_applier_progress (facility_id, source, seq, applied_at)
+                        SELECT facility_id, source, last_seq, now() FROM fresh WHERE source IS NOT NULL
+                        ON CONFLICT (facility_id) DO UPDATE
+                        SET source = EXCLUDED.source, seq = EXCLUDED.seq, applied_at = EXCLUDED.applied_at
+                    )
+                    UPDATE hospital_state AS s
+                    SET beds_occupied = GREATEST(0, s.beds_occupied + fresh.beds_delta),
+                        ventilators_in_use = GREATEST(0, s.ventilators_in_use + fresh.vents_delta),
+                        oxygen_percent = COALESCE(fresh.oxygen_percent, s.oxygen_percent),
+                        oxygen_status = COALESCE(fresh.oxygen_status, s.oxygen_status),
+                        last_updated = now()
+                    FROM fresh
+                    WHERE s.facility_id = fresh.facility_id
+                    RETURNING s.facility_id
+                """, state_rows, template="(%s, %s::text, %s::bigint, %s::bigint, %s::integer, %s::integer, "
+                                          "%s::double precision, %s::text)",
+                    page_size=len(state_rows), fetch=True)
+                applied = {row[0] for row in applied}
+
+                audit_rows = [(m["facility_id"], json.dumps(m["delta"])) for m in batch
+                              if m["facility_id"] in applied]
+                if audit_rows:
+                    execute_values(cursor, """
+                        INSERT INTO hospital_state_audit (facility_id, delta, applied_at) VALUES %s
+                    """, audit_rows, template="(%s, %s::jsonb, now())", page_size=len(audit_rows))
+            conn.commit()
+        except Exception as e:
+            if conn and not conn.closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            with self._stats_lock:
+                self.counters["errors"] += 1
+            print(f"❌ Delta batch failed ({len(batch)} deltas): {e}")
+            return False
+        finally:
+            if conn:
+                # A dropped connection must not be handed to the retry
+                self.pool.putconn(conn, close=broken or bool(conn.closed))
+
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.latency.record_ages([m["trace"]["ts"] for m in batch if m.get("trace")])
+        with self._stats_lock:
+            self.counters["applied"] += len(audit_rows)
+            self.counters["skipped"] += len(batch) - len(audit_rows)
+            self.counters["batches"] += 1
+            self.counters["batch_ms_max"] = max(self.counters["batch_ms_max"], elapsed_ms)
+        return True
+
+    def stats(self):
+        """Snapshot of the counters."""
+        with self._stats_lock:
+            return dict(self.counters)
+
+
+applier = None
+
+# -------- MQTT HANDLERS --------
+
+def on_message(client, userdata, msg):
+    try:
+        message = json.loads(msg.payload)
+        if "facility_id" in message and message.get("delta"):
+            applier.put(message)
+    except Exception as e:
+        print(f"❌ Invalid delta: {e}")
+
+def on_connect(client, userdata, flags, rc):
+    if rc == 0:
+        print(f"✓ Delta Applier connected. Listening on {TOPIC}")
+        client.subscribe(TOPIC)
+    else:
+        print(f"❌ Connection failed with code {rc}")
+
+def stats_loop():
+    while True:
+        time.sleep(STATS_INTERVAL_SECONDS)
+        c = applier.stats()
+        avg = c["applied"] / c["batches"] if c["batches"] else 0
+        print(f"📈 Applier: {c['received']} received, {c['applied']} applied in {c['batches']} batches "
+              f"(avg {avg:.1f}/batch, max {c['batch_ms_max']:.1f} ms), queue={applier.queue.qsize()}, "
+              f"errors={c['errors']}, retries={c['retries']}, skipped={c['skipped']}, dropped={c['dropped']}")
+
+# -------- MAIN --------
+
+if __name__ == "__main__":
+    try:
+        db_pool = create_pool(DB_PARAMS, max_conn=2)
+    except Exception as e:
+        print(f"❌ Database pool failed: {e}")
+        exit(1)
+
+    applier = DeltaApplier(db_pool)
+    applier.start()
+    applier.latency.start_exporter()
+    threading.Thread(target=stats_loop, daemon=True).start()
+
+    client = transport.create_client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.reconnect_delay_set(min_delay=1, max_delay=120)
+
+    try:
+        client.connect(BROKER, 1883, 60)
+        client.loop_forever()
+    except KeyboardInterrupt:
+        print("\n✓ Delta Applier stopped")
+    except Exception as e:
+        print(f"❌ MQTT Error: {e}")
+    finally:
+        applier.stop()
+        db_pool.closeall()
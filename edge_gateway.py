@@ -0,0 +1,158 @@
+"""
+Edge Gateway — Phase 4
+Runs at one facility, next to its sensors.
+Subscribes to the local hospital/{facility_id}/+/raw traffic, applies the
+same preprocessing rules as the central preprocessors, and uplinks one
+compact FACILITY_SUMMARY frame per SUMMARY_INTERVAL_SECONDS to the
+central broker on events/facility_summary.
+
+Usage:
+    python edge_gateway.py --facility H001 --local-broker localhost --central-broker central.example
+"""
+
+import argparse
+import json
+import threading
+import time
+import paho.mqtt.client as mqtt
+
+import bed_preprocessor
+import oxygen_preprocessing
+import ventilator_preprocessing
+import wire_format
+
+SUMMARY_INTERVAL_SECONDS = 5
+SUMMARY_TOPIC = "events/facility_summary"
+
+# Per-resource rules, shared with the central preprocessors
+RULES = {
+    "bed": bed_preprocessor.process_reading,
+    "ventilator": ventilator_preprocessing.process_reading,
+    "oxygen": oxygen_preprocessing.process_reading,
+}
+
+
+class FacilitySummary:
+    """Per-facility resource state, folded from preprocessor events between uplinks."""
+
+    def __init__(self, facility_id):
+        self.facility_id = facility_id
+        self.lock = threading.Lock()
+        self.beds = {}        # bed_id -> occupied
+        self.ventilators = {} # ventilator_id -> in use
+        self.oxygen = {}      # cylinder_id -> level percent
+        self.oxygen_status = None
+        self.changed = {"beds": set(), "ventilators": set(), "oxygen": set()}
+        self.readings = 0
+
+    def apply(self, event):
+        event_type = event["event_type"]
+        if event_type == "BED_OCCUPANCY":
+            self.beds[event["bed_id"]] = event["occupancy_state"] == "OCCUPIED"
+            self.changed["beds"].add(event["bed_id"])
+        elif event_type == "VENTILATOR_STATUS":
+            self.ventilators[event["ventilator_id"]] = event["status"] == "IN_USE"
+            self.changed["ventilators"].add(event["ventilator_id"])
+        elif event_type == "OXYGEN_LEVEL":
+            self.oxygen[event["cylinder_id"]] = event["estimated_level_percent"]
+            self.changed["oxygen"].add(event["cylinder_id"])
+
+    def frame(self):
+        """Builds the uplink frame and resets the per-window change tracking."""
+        oxygen_percent = round(sum(self.oxygen.values()) / len(self.oxygen), 1) if self.oxygen else None
+        if oxygen_percent is not None:
+            self.oxygen_status = oxygen_preprocessing.classify(oxygen_percent, self.oxygen_status)
+
+        frame = {
+            "facility_id": self.facility_id,
+            "event_type": "FACILITY_SUMMARY",
+            "beds_occupied": sum(self.beds.values()),
+            "beds_reporting": len(self.beds),
+            "ventilators_in_use": sum(self.ventilators.values()),
+            "ventilators_reporting": len(self.ventilators),
+            "oxygen_percent": oxygen_percent,
+            "oxygen_status": self.oxygen_status,
+            "changed": {k: sorted(v) for k, v in self.changed.items()},
+            "readings": self.readings,
+            "window_seconds": SUMMARY_INTERVAL_SECONDS,
+        }
+        self.changed = {k: set() for k in self.changed}
+        self.readings = 0
+        return frame
+
+
+class EdgeGateway:
+    def __init__(self, facility_id, local_broker, central_broker):
+        self.facility_id = facility_id
+        self.summary = FacilitySummary(facility_id)
+        self.local_broker = local_broker
+        self.central_broker = central_broker
+        self.local = None
+        self.uplink = None
+        self.frames_sent = 0
+
+    # -------- LOCAL SENSOR TRAFFIC --------
+
+    def on_message(self, client, userdata, msg):
+        kind = msg.topic.split("/")[2]
+        rule = RULES.get(kind)
+        if rule is None:
+            return
+        try:
+            data = wire_format.decode(msg.payload)
+            events = rule(data)
+            with self.summary.lock:
+                self.summary.readings += 1
+                for _, event in events:
+                    self.summary.apply(event)
+        except Exception as e:
+            print(f"Edge gateway error: {e}")
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            print(f"❌ Local broker connection failed with code {rc}")
+            return
+        print(f"✓ Edge Gateway {self.facility_id} connected to local sensors")
+        client.subscribe(f"hospital/{self.facility_id}/+/raw")
+
+    # -------- UPLINK --------
+
+    def uplink_loop(self):
+        while True:
+            time.sleep(SUMMARY_INTERVAL_SECONDS)
+            with self.summary.lock:
+                frame = self.summary.frame()
+            self.uplink.publish(SUMMARY_TOPIC, json.dumps(frame, separators=(",", ":")))
+            self.frames_sent += 1
+            if self.frames_sent % 12 == 0:
+                print(f"  {self.facility_id}: {self.frames_sent} frames uplinked "
+                      f"(last window folded {frame['readings']} readings)")
+
+    def run(self):
+        self.uplink = mqtt.Client(client_id=f"edge-uplink-{self.facility_id}")
+        self.uplink.reconnect_delay_set(min_delay=1, max_delay=120)
+        self.uplink.connect(self.central_broker, 1883, 60)
+        self.uplink.loop_start()
+
+        self.local = mqtt.Client(client_id=f"edge-local-{self.facility_id}")
+        self.local.on_connect = self.on_connect
+        self.local.on_message = self.on_message
+        self.local.connect(self.local_broker, 1883, 60)
+
+        threading.Thread(target=self.uplink_loop, daemon=True).start()
+        try:
+            self.local.loop_forever()
+        except KeyboardInterrupt:
+            print(f"Edge Gateway {self.facility_id} stopped.")
+        finally:
+            self.uplink.loop_stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-facility edge gateway")
+    parser.add_argument("--facility", required=True, help="Facility id, e.g. H001")
+    parser.add_argument("--local-broker", default="localhost", help="Broker the sensors publish to")
+    parser.add_argument("--central-broker", default="localhost", help="Central broker for summary frames")
+    args = parser.parse_args()
+
+    EdgeGateway(args.facility, args.local_broker, args.central_broker).run()
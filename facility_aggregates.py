@@ -0,0 +1,141 @@
+"""
+Facility Aggregates — Phase 4
+Running per-facility sums and tallies for the state updater.
+Each reading updates the aggregates in O(1) from the resource's
+old and new value, replacing the AVG/COUNT scans over hospital_resources.
+"""
+
+import threading
+
+from change_detection import bed_occupied
+
+# Same rules the DB scans used
+MAX_PRESSURE = 2000.0     # Full cylinder PSI
+
+
+def oxygen_status(percent):
+    return 'NORMAL' if percent > 30 else 'CRITICAL' if percent < 30 else 'WARNING'
+
+
+class FacilityAggregates:
+    """
+    In-memory mirror of hospital_resources plus the derived hospital_state columns.
+    apply() returns only the hospital_state columns whose value actually changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {}          # (facility_id, resource_type, resource_id) -> current_value
+        self.oxygen_sum = {}      # facility_id -> sum of cylinder pressures
+        self.oxygen_count = {}    # facility_id -> number of cylinders seen
+        self.beds_occupied = {}   # facility_id -> occupied bed tally
+        self.bed_state = {}       # (facility_id, 'BED', resource_id) -> occupied, with the preprocessor's hysteresis
+        self.written = {}         # facility_id -> hospital_state columns handed to the writer and not dropped by it
+
+    def seed(self, cursor, facility_ids=None):
+        """
+        Loads known resources so the first readings produce correct deltas.
+        With facility_ids, only those facilities are loaded (shard hand-over),
+        replacing whatever is held for them: an ingest worker racing a
+        rebalance can re-create keys for a facility after drop(), and those
+        would be stale by the time the facility comes back. Readings for
+        facilities being taken over are held until seeding is done, so there
+        is nothing newer to keep.
+        """
+        if facility_ids is None:
+            cursor.execute("""
+                SELECT facility_id, resource_type, resource_id, current_value
+                FROM hospital_resources
+                WHERE current_value IS NOT NULL
+            """)
+        else:
+            cursor.execute("""
+                SELECT facility_id, resource_type, resource_id, current_value
+                FROM hospital_resources
+                WHERE current_value IS NOT NULL AND facility_id = ANY(%s)
+            """, (list(facility_ids),))
+        rows = cursor.fetchall()
+        with self._lock:
+            if facility_ids is not None:
+                self._forget(set(facility_ids))
+            for facility_id, resource_type, resource_id, value in rows:
+                self._update(facility_id, resource_type, resource_id, float(value))
+        return len(rows)
+
+    def drop(self, facility_ids):
+        """Forgets facilities this process no longer owns."""
+        with self._lock:
+            self._forget(set(facility_ids))
+
+    def _forget(self, facility_ids):
+        for key in [k for k in self.values if k[0] in facility_ids]:
+            del self.values[key]
+            self.bed_state.pop(key, None)
+        for table in (self.oxygen_sum, self.oxygen_count, self.beds_occupied, self.written):
+            for facility_id in facility_ids:
+                table.pop(facility_id, None)
+
+    def forget_written(self, facility_ids):
+        """
+        The writer dropped these facilities' hospital_state rows: forget what was
+        sent, so the next reading writes its columns again instead of skipping them
+        as unchanged.
+        """
+        with self._lock:
+            for facility_id in facility_ids:
+                self.written.pop(facility_id, None)
+
+    def facilities(self):
+        with self._lock:
+            return {key[0] for key in self.values}
+
+    def apply(self, facility_id, resource_type, resource_id, value):
+        """Folds one reading in and returns the changed hospital_state columns."""
+        with self._lock:
+            self._update(facility_id, resource_type, resource_id, value)
+
+            if resource_type == 'OXYGEN':
+                percent = self.oxygen_percent(facility_id)
+                columns = {"oxygen_percent": percent, "oxygen_status": oxygen_status(percent)}
+            elif resource_type == 'BED':
+                columns = {"beds_occupied": self.beds_occupied.get(facility_id, 0)}
+            else:
+                return {}
+
+            last = self.written.setdefault(facility_id, {})
+            changed = {k: v for k, v in columns.items() if last.get(k) != v}
+            last.update(changed)
+            return changed
+
+    def oxygen_percent(self, facility_id):
+        count = self.oxygen_count.get(facility_id, 0)
+        if not count:
+            return 0.0
+        avg_pressure = self.oxygen_sum[facility_id] / count
+        return min(100.0, max(0.0, (avg_pressure / MAX_PRESSURE) * 100.0))
+
+    def snapshot(self, facility_id):
+        """Current derived state for a facility (beds_occupied, oxygen_percent)."""
+        with self._lock:
+            return {
+                "beds_occupied": self.beds_occupied.get(facility_id, 0),
+                "oxygen_percent": self.oxygen_percent(facility_id),
+            }
+
+    def _update(self, facility_id, resource_type, resource_id, value):
+        key = (facility_id, resource_type, resource_id)
+        old = self.values.get(key)
+        self.values[key] = value
+
+        if resource_type == 'OXYGEN':
+            if old is None:
+                self.oxygen_count[facility_id] = self.oxygen_count.get(facility_id, 0) + 1
+                old = 0.0
+            self.oxygen_sum[facility_id] = self.oxygen_sum.get(facility_id, 0.0) + value - old
+
+        elif resource_type == 'BED':
+            was_occupied = self.bed_state.get(key)
+            is_occupied = self.bed_state[key] = bed_occupied(value, was_occupied)
+            if bool(was_occupied) != is_occupied:
+                step = 1 if is_occupied else -1
+                self.beds_occupied[facility_id] = self.beds_occupied.get(facility_id, 0) + step
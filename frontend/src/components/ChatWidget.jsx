@@ -1,9 +1,23 @@
 import { useState, useEffect } from 'react';
 import api from '../services/api';
+import { subscribeLive, onLiveStatus } from '../services/live';
 
 export default function ChatWidget() {
     const [messages, setMessages] = useState([]);
     const [newMsg, setNewMsg] = useState('');
+    const [connected, setConnected] = useState(false);
+
+    // New messages are pushed on the 'network' channel; polling only while the socket is down
+    useEffect(() => {
+        const unsubscribe = subscribeLive('network', (msg) => {
+            setMessages(prev => prev.some(m => m.id === msg.message.id) ? prev : [...prev, msg.message]);
+        });
+        const unwatch = onLiveStatus(setConnected);
+        return () => {
+            unsubscribe();
+            unwatch();
+        };
+    }, []);
 
     useEffect(() => {
         const fetchMsgs = async () => {
@@ -15,9 +29,10 @@ export default function ChatWidget() {
             }
         };
         fetchMsgs();
+        if (connected) return;
         const interval = setInterval(fetchMsgs, 3000);
         return () => clearInterval(interval);
-    }, []);
+    }, [connected]);
 
     const sendMessage = async () => {
         if (!newMsg.trim()) return;
@@ -1,11 +1,22 @@
 import { useState, useEffect } from 'react';
 import api from '../services/api';
+import { useLiveFacilities } from '../services/live';
 
 export default function CommanderDashboard() {
     const [hospitals, setHospitals] = useState([]);
     const [loading, setLoading] = useState(true);
+    const { rows: liveRows, connected } = useLiveFacilities('all');
 
+    // Pushed snapshots/diffs replace polling while the live socket is up
     useEffect(() => {
+        if (liveRows) {
+            setHospitals(Object.values(liveRows));
+            setLoading(false);
+        }
+    }, [liveRows]);
+
+    useEffect(() => {
+        if (connected) return;
         const fetchData = async () => {
             try {
                 const res = await api.get('/api/hospital/dashboard');
@@ -20,7 +31,7 @@ export default function CommanderDashboard() {
         fetchData();
         const interval = setInterval(fetchData, 5000);
         return () => clearInterval(interval);
-    }, []);
+    }, [connected]);
 
     const getStatusColor = (h) => {
         const bedRatio = h.beds_occupied / h.beds_total;
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import api from '../services/api';
+import { useLiveFacilities } from '../services/live';
 import ResourceGrid from '../components/ResourceGrid';
 
 export default function HospitalDashboard_FINAL() {
@@ -8,8 +9,23 @@ export default function HospitalDashboard_FINAL() {
     const [loading, setLoading] = useState(true);
     const [crisisMode, setCrisisMode] = useState(false);
     const facilityId = localStorage.getItem('facility_id');
+    // Hospital users may only subscribe to their own facility (see push_gateway.can_read)
+    const { rows: liveRows, connected } = useLiveFacilities(`facility:${facilityId}`);
 
+    // Pushed snapshots/diffs replace polling while the live socket is up
     useEffect(() => {
+        if (liveRows) {
+            const mine = liveRows[facilityId];
+            if (mine) {
+                setHospitals(prev => [...prev.filter(h => h.facility_id !== facilityId), mine]);
+                setMyHospital(mine);
+            }
+            setLoading(false);
+        }
+    }, [liveRows, facilityId]);
+
+    useEffect(() => {
+        if (connected) return;
         const fetchData = async () => {
             try {
                 const res = await api.get('/api/hospital/dashboard');
@@ -26,7 +42,7 @@ export default function HospitalDashboard_FINAL() {
         fetchData();
         const interval = setInterval(fetchData, 5000);
         return () => clearInterval(interval);
-    }, [facilityId]);
+    }, [facilityId, connected]);
 
     const toggleCrisis = async () => {
         try {
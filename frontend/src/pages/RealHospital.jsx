@@ -1,11 +1,20 @@
 import { useState, useEffect } from 'react';
 import api from '../services/api';
+import { useLiveFacilities } from '../services/live';
 
 export default function RealHospital() {
     const [hospital, setHospital] = useState(null);
     const facilityId = localStorage.getItem('facility_id') || 'H001';
+    const { rows: liveRows, connected } = useLiveFacilities(`facility:${facilityId}`);
 
+    // Pushed diffs replace polling while the live socket is up
     useEffect(() => {
+        const live = liveRows?.[facilityId];
+        if (live) setHospital(prev => ({ ...(prev || {}), ...live }));
+    }, [liveRows, facilityId]);
+
+    useEffect(() => {
+        if (connected) return;
         const fetchData = async () => {
             try {
                 const res = await api.get(`/api/hospital/state/${facilityId}`);
@@ -17,7 +26,7 @@ export default function RealHospital() {
         fetchData();
         const interval = setInterval(fetchData, 3000);
         return () => clearInterval(interval);
-    }, [facilityId]);
+    }, [facilityId, connected]);
 
     if (!hospital) return <div style={{ minHeight: '100vh', background: '#0f172a', color: '#fff', display: 'flex', alignItems: 'center', justifyContent: 'center' }}>Loading...</div>;
 
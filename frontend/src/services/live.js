@@ -0,0 +1,132 @@
+// Live push client for /api/live/ws (see backend/push_gateway.py).
+// One shared WebSocket per tab; components subscribe to channels
+// ('all', 'facility:<id>', 'network') and get snapshots + diffs instead of polling.
+// Reconnects with backoff and resubscribes — the server answers with fresh snapshots.
+
+import { useState, useEffect } from 'react';
+
+const listeners = new Map();        // channel -> Set(callback)
+const statusListeners = new Set();  // callback(connected)
+let socket = null;
+let connected = false;
+let retryMs = 1000;
+let retryTimer = null;
+
+function socketUrl() {
+    const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const token = encodeURIComponent(localStorage.getItem('token') || '');
+    return `${proto}://${window.location.host}/api/live/ws?token=${token}`;
+}
+
+function setConnected(value) {
+    connected = value;
+    statusListeners.forEach(cb => cb(value));
+}
+
+function send(message) {
+    if (socket?.readyState === WebSocket.OPEN) socket.send(JSON.stringify(message));
+}
+
+function dispatch(msg) {
+    let channels;
+    if (msg.type === 'snapshot') channels = [msg.channel];
+    else if (msg.type === 'diff' || msg.type === 'removed') channels = ['all', `facility:${msg.facility_id}`];
+    else if (msg.type === 'message') channels = ['network'];
+    else return;  // ping
+    channels.forEach(ch => listeners.get(ch)?.forEach(cb => cb(msg)));
+}
+
+function connect() {
+    if (socket || listeners.size === 0) return;
+    const ws = new WebSocket(socketUrl());
+    socket = ws;
+
+    ws.onopen = () => {
+        retryMs = 1000;
+        setConnected(true);
+        send({ subscribe: [...listeners.keys()] });
+    };
+    ws.onmessage = (e) => dispatch(JSON.parse(e.data));
+    ws.onclose = (e) => {
+        if (socket !== ws) return;
+        socket = null;
+        setConnected(false);
+        if (e.code === 4401) return;  // Bad/expired token: the next REST call sends the user to /login
+        if (listeners.size) {
+            retryTimer = setTimeout(connect, retryMs);
+            retryMs = Math.min(retryMs * 2, 30000);
+        }
+    };
+}
+
+export function subscribeLive(channel, callback) {
+    if (!listeners.has(channel)) {
+        listeners.set(channel, new Set());
+        send({ subscribe: [channel] });
+    } else {
+        // Already subscribed by another component: ask again so this one gets a snapshot too
+        send({ unsubscribe: [channel] });
+        send({ subscribe: [channel] });
+    }
+    listeners.get(channel).add(callback);
+    connect();
+
+    return () => {
+        const set = listeners.get(channel);
+        set.delete(callback);
+        if (!set.size) {
+            listeners.delete(channel);
+            send({ unsubscribe: [channel] });
+        }
+        if (!listeners.size) {
+            clearTimeout(retryTimer);
+            const ws = socket;
+            socket = null;
+            ws?.close();
+            setConnected(false);
+        }
+    };
+}
+
+export function onLiveStatus(callback) {
+    statusListeners.add(callback);
+    callback(connected);
+    return () => statusListeners.delete(callback);
+}
+
+// Facility rows for a channel, kept current from snapshots + diffs.
+// rows is null until the first snapshot; connected is false while the socket is down
+// (callers fall back to polling then).
+export function useLiveFacilities(channel) {
+    const [rows, setRows] = useState(null);      // facility_id -> row
+    const [alerts, setAlerts] = useState({});    // facility_id -> alerts
+    const [isConnected, setIsConnected] = useState(connected);
+
+    useEffect(() => {
+        const unsubscribe = subscribeLive(channel, (msg) => {
+            if (msg.type === 'snapshot') {
+                setRows(Object.fromEntries(msg.rows.map(r => [r.facility_id, r])));
+                setAlerts(msg.alerts || {});
+            } else if (msg.type === 'diff') {
+                setRows(prev => ({
+                    ...(prev || {}),
+                    [msg.facility_id]: { ...(prev?.[msg.facility_id] || {}), ...msg.changes },
+                }));
+                if (msg.alerts) setAlerts(prev => ({ ...prev, [msg.facility_id]: msg.alerts }));
+            } else if (msg.type === 'removed') {
+                setRows(prev => {
+                    const next = { ...(prev || {}) };
+                    delete next[msg.facility_id];
+                    return next;
+                });
+            }
+        });
+        const unwatch = onLiveStatus(setIsConnected);
+        return () => {
+            unsubscribe();
+            unwatch();
+        };
+    }, [channel]);
+
+    return { rows, alerts, connected: isConnected };
+}
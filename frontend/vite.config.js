@@ -13,6 +13,7 @@ export default defineConfig({
             '/api': {
                 target: 'http://localhost:8000',
                 changeOrigin: true,
+                ws: true,   // /api/live/ws push socket
             },
         },
     },
@@ -0,0 +1,169 @@
+"""
+History Retention — Phase 4
+Keeps the daily partitions of hospital_history (migrations/003_partition_history)
+in shape:
+  - creates partitions PARTITIONS_AHEAD_DAYS ahead, so inserts never land in
+    the default partition; rows that did land there (the job was down) are
+    moved into their day's partition when it is created, back to the
+    retention cutoff
+  - partitions entirely older than the retention window are detached and
+    dropped — optionally archived first as gzipped CSV via COPY
+
+Dropping a partition is a catalog operation, so retention never runs a
+DELETE over millions of rows or leaves bloat behind for VACUUM.
+
+Runs every RUN_INTERVAL_SECONDS by default; keep it running next to the
+pipeline. With --once it exits after one pass and must be scheduled (at
+least daily, e.g. cron "0 */6 * * *"), or today's rows fill the default
+partition.
+
+Usage:
+    python history_retention.py                       # every RUN_INTERVAL_SECONDS, drop without archiving
+    python history_retention.py --archive-dir archive --keep-days 90
+    python history_retention.py --once                # one pass, for cron
+    python history_retention.py --dry-run
+"""
+
+import argparse
+import gzip
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+import psycopg2
+from psycopg2 import sql
+
+# -------- CONFIG --------
+DB_PARAMS = {
+    "dbname": "hospitaldb",
+    "user": "postgres",
+    "password": "posthack",
+    "host": "localhost",
+    "port": 5432
+}
+
+RETENTION_DAYS = 30
+PARTITIONS_AHEAD_DAYS = 7
+RUN_INTERVAL_SECONDS = 6 * 3600
+
+PARENT_TABLE = "hospital_history"
+DEFAULT_PARTITION = "hospital_history_default"
+PARTITION_NAME = re.compile(r"^hospital_history_p(\d{8})$")
+
+
+# -------- PARTITIONS --------
+
+def list_partitions(cursor):
+    """Daily partitions as [(day, name)], oldest first. The default partition is left out."""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (f"public.{PARENT_TABLE}",))
+
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((datetime.strptime(match.group(1), "%Y%m%d").date(), name))
+    return sorted(partitions)
+
+
+def ensure_future_partitions(cursor, days_ahead, cutoff):
+    """
+    Creates partitions up to days_ahead. Starts at the oldest day still in the
+    default partition (not before cutoff), so rows that landed there while the
+    job was down are moved into their own partitions.
+    """
+    cursor.execute(sql.SQL("SELECT min(recorded_at)::date FROM public.{}").format(
+        sql.Identifier(DEFAULT_PARTITION)))
+    oldest = cursor.fetchone()[0]
+    from_day = max(min(oldest or date.today(), date.today()), cutoff)
+    cursor.execute("SELECT public.hospital_history_ensure_partitions(%s, current_date + %s)",
+                   (from_day, days_ahead))
+    return cursor.fetchone()[0]
+
+
+def archive_partition(cursor, name, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    copy = sql.SQL("COPY public.{} TO STDOUT WITH (FORMAT csv, HEADER)").format(sql.Identifier(name))
+    with gzip.open(path + ".part", "wt") as f:
+        cursor.copy_expert(copy.as_string(cursor.connection), f)
+    os.replace(path + ".part", path)   # Only a complete archive gets the final name
+    return path
+
+
+def drop_partition(cursor, name):
+    cursor.execute(sql.SQL("ALTER TABLE public.{} DETACH PARTITION public.{}").format(
+        sql.Identifier(PARENT_TABLE), sql.Identifier(name)))
+    cursor.execute(sql.SQL("DROP TABLE public.{}").format(sql.Identifier(name)))
+
+
+# -------- MAIN --------
+
+def run_once(conn, keep_days, archive_dir=None, dry_run=False):
+    cutoff = date.today() - timedelta(days=keep_days)
+    cursor = conn.cursor()
+
+    if dry_run:
+        conn.rollback()
+    else:
+        try:
+            created = ensure_future_partitions(cursor, PARTITIONS_AHEAD_DAYS, cutoff)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Creating partitions failed: {e}")
+            return 1
+        if created:
+            print(f"➕ Created {created} partition(s) up to {date.today() + timedelta(days=PARTITIONS_AHEAD_DAYS)}")
+
+    # A partition covers [day, day + 1); it is expired once all of it is before the cutoff
+    expired = [(day, name) for day, name in list_partitions(cursor) if day + timedelta(days=1) <= cutoff]
+    conn.rollback()
+    if not expired:
+        print(f"✓ Nothing older than {cutoff} (keeping {keep_days} days)")
+        return 0
+
+    for day, name in expired:
+        if dry_run:
+            print(f"  would {'archive and ' if archive_dir else ''}drop {name}")
+            continue
+        try:
+            if archive_dir:
+                path = archive_partition(cursor, name, archive_dir)
+                print(f"📦 Archived {name} -> {path}")
+            drop_partition(cursor, name)
+            conn.commit()
+            print(f"🗑  Dropped {name}")
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Retention failed for {name}: {e}")
+            return 1
+    return 0
+
+
+def main(args):
+    conn = psycopg2.connect(**DB_PARAMS)
+    try:
+        while True:
+            run_once(conn, args.keep_days, args.archive_dir, args.dry_run)
+            if args.once or args.dry_run:
+                break
+            time.sleep(RUN_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        print("Stopping retention job...")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and retire hospital_history partitions")
+    parser.add_argument("--keep-days", type=int, default=RETENTION_DAYS, help="Days of history to keep")
+    parser.add_argument("--archive-dir", help="COPY expired partitions here (gzipped CSV) before dropping")
+    parser.add_argument("--once", action="store_true",
+                        help=f"Run one pass and exit (default: every {RUN_INTERVAL_SECONDS}s)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be done")
+    main(parser.parse_args())
@@ -0,0 +1,83 @@
+"""
+History Bucket Writer — Phase 4
+Collapses per-reading facility snapshots into at most one
+hospital_history row per facility per time bucket, keeping
+min/max/last for beds and oxygen within the bucket.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+HISTORY_BUCKET_SECONDS = 10
+
+
+class HistoryBucketWriter:
+    """
+    observe() folds a snapshot into the facility's open bucket. Closed buckets
+    are returned as rows ready for hospital_history:
+        (facility_id, recorded_at, beds_occupied, beds_min, beds_max,
+         oxygen_percent, oxygen_min, oxygen_max)
+    where beds_occupied / oxygen_percent are the last values seen and
+    recorded_at is the bucket start.
+    """
+
+    def __init__(self, bucket_seconds=HISTORY_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self._lock = threading.Lock()
+        self._open = {}   # facility_id -> bucket dict
+
+    def _bucket_start(self, ts):
+        return int(ts // self.bucket_seconds) * self.bucket_seconds
+
+    def observe(self, facility_id, beds_occupied, oxygen_percent, now=None):
+        now = time.time() if now is None else now
+        start = self._bucket_start(now)
+        closed = []
+
+        with self._lock:
+            bucket = self._open.get(facility_id)
+            if bucket and bucket["start"] != start:
+                closed.append(self._to_row(facility_id, bucket))
+                bucket = None
+
+            if bucket is None:
+                self._open[facility_id] = {
+                    "start": start,
+                    "beds_last": beds_occupied, "beds_min": beds_occupied, "beds_max": beds_occupied,
+                    "oxy_last": oxygen_percent, "oxy_min": oxygen_percent, "oxy_max": oxygen_percent,
+                }
+            else:
+                bucket["beds_last"] = beds_occupied
+                bucket["beds_min"] = min(bucket["beds_min"], beds_occupied)
+                bucket["beds_max"] = max(bucket["beds_max"], beds_occupied)
+                bucket["oxy_last"] = oxygen_percent
+                bucket["oxy_min"] = min(bucket["oxy_min"], oxygen_percent)
+                bucket["oxy_max"] = max(bucket["oxy_max"], oxygen_percent)
+
+        return closed
+
+    def flush_expired(self, now=None, force=False, facility_ids=None):
+        """Closes buckets whose window has passed (or all of them, if force), optionally only for facility_ids."""
+        now = time.time() if now is None else now
+        current = self._bucket_start(now)
+        closed = []
+
+        with self._lock:
+            for facility_id in list(self._open) if facility_ids is None else \
+                    [f for f in facility_ids if f in self._open]:
+                bucket = self._open[facility_id]
+                if force or bucket["start"] < current:
+                    closed.append(self._to_row(facility_id, bucket))
+                    del self._open[facility_id]
+
+        return closed
+
+    @staticmethod
+    def _to_row(facility_id, bucket):
+        return (
+            facility_id,
+            datetime.fromtimestamp(bucket["start"]),
+            bucket["beds_last"], bucket["beds_min"], bucket["beds_max"],
+            bucket["oxy_last"], bucket["oxy_min"], bucket["oxy_max"],
+        )
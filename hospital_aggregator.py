@@ -1,11 +1,28 @@
 import json
+import os
+import socket
+import threading
+import time
 from datetime import datetime
 from collections import defaultdict
-import paho.mqtt.client as mqtt
+
+import tracing
+import transport
+import wire_format
 
 BROKER = "localhost"
 TOPIC = "events/#"
 
+# Deltas for a facility are merged for this long before one combined
+# delta is published (0 = publish every delta immediately)
+COALESCE_WINDOW_MS = 1000
+# Print every event and the full delta JSON (slow under load); otherwise one line per delta
+VERBOSE_DELTAS = False
+SHUTDOWN_PUBLISH_TIMEOUT = 2.0   # Seconds to wait for the final deltas to go out
+
+# Counters merge by addition; everything else keeps the latest value
+ADDITIVE_FIELDS = ("beds_occupied", "ventilators_in_use")
+
 hospital_state = defaultdict(lambda: {
     "beds_occupied": 0,
     "ventilators_in_use": 0,
@@ -15,26 +32,94 @@ hospital_state = defaultdict(lambda: {
 
 message_count = defaultdict(int)
 
-def emit_hospital_delta(facility_id, delta):
-    """Emit state changes to the database updater"""
+# facility_id -> {"delta": merged delta, "events": folded count, "opened": monotonic time,
+#                 "trace": oldest source stamp in the window}
+pending_deltas = {}
+pending_lock = threading.Lock()
+
+latency = tracing.LatencyRecorder("hospital_aggregator")
+
+# Deltas are numbered per facility within one run, so delta_applier.py can
+# skip the ones it has already applied when it retries a batch
+DELTA_SOURCE = f"{socket.gethostname()}-{os.getpid()}-{int(time.time())}"
+delta_seq = defaultdict(int)
+
+def emit_hospital_delta(facility_id, delta, events_folded=1, trace=None):
+    """Emit state changes to the database updater; returns the publish info"""
     if not delta:
-        return
+        return None
     
+    with pending_lock:
+        delta_seq[facility_id] += 1
+        seq = delta_seq[facility_id]
     output = {
         "facility_id": facility_id,
         "delta": delta,
+        "events_folded": events_folded,
+        "source": DELTA_SOURCE,
+        "seq": seq,
         "timestamp": datetime.utcnow().isoformat() + "Z"
     }
-    print(f"\n{'='*60}")
-    print(f"📊 HOSPITAL DELTA: {facility_id}")
-    print(f"{'='*60}")
-    print(json.dumps(output, indent=2))
-    print(f"{'='*60}\n")
+    if trace:
+        output["trace"] = trace
+    if VERBOSE_DELTAS:
+        print(f"\n{'='*60}")
+        print(f"📊 HOSPITAL DELTA: {facility_id}")
+        print(f"{'='*60}")
+        print(json.dumps(output, indent=2))
+        print(f"{'='*60}\n")
+    else:
+        print(f"📊 {facility_id} delta {delta} ({events_folded} events)")
     
     try:
-        client.publish("hospital_delta/updates", json.dumps(output))
+        return client.publish("hospital_delta/updates", json.dumps(output))
     except Exception as e:
         print(f"❌ Failed to publish delta: {e}")
+        return None
+
+def merge_delta(target, delta):
+    """Fold one delta into a pending one: counters add up, latest value wins otherwise"""
+    for field, value in delta.items():
+        if field in ADDITIVE_FIELDS:
+            target[field] = target.get(field, 0) + value
+        else:
+            target[field] = value
+
+def queue_delta(facility_id, delta, trace=None):
+    """Add a delta to the facility's open coalescing window"""
+    if COALESCE_WINDOW_MS <= 0:
+        emit_hospital_delta(facility_id, delta, trace=trace)
+        return
+    with pending_lock:
+        window = pending_deltas.get(facility_id)
+        if window is None:
+            window = pending_deltas[facility_id] = {"delta": {}, "events": 0, "opened": time.monotonic(),
+                                                    "trace": None}
+        merge_delta(window["delta"], delta)
+        window["events"] += 1
+        # Keep the oldest stamp, so the delta reports worst-case freshness
+        window["trace"] = tracing.oldest(window["trace"], trace)
+
+def flush_deltas(force=False):
+    """Publish every window older than COALESCE_WINDOW_MS (or all of them, if force); returns the publish infos"""
+    cutoff = time.monotonic() - COALESCE_WINDOW_MS / 1000.0
+    with pending_lock:
+        due = [f for f, w in pending_deltas.items() if force or w["opened"] <= cutoff]
+        windows = [(f, pending_deltas.pop(f)) for f in due]
+
+    infos = []
+    for facility_id, window in windows:
+        # Drop counters that netted out (e.g. +1 then -1)
+        delta = {k: v for k, v in window["delta"].items() if not (k in ADDITIVE_FIELDS and v == 0)}
+        info = emit_hospital_delta(facility_id, delta, window["events"], window["trace"])
+        if info is not None:
+            infos.append(info)
+    return infos
+
+def coalesce_loop():
+    while True:
+        time.sleep(max(COALESCE_WINDOW_MS / 4000.0, 0.05))
+        flush_deltas()
 
 def handle_event(event):
     """Process incoming events and generate deltas"""
@@ -62,14 +147,16 @@ def handle_event(event):
             if occupancy_state == "OCCUPIED":
                 state["beds_occupied"] += 1
                 delta["beds_occupied"] = +1
-                print(f"  🛏️  Bed occupied at {facility} (Total: {state['beds_occupied']})")
+                if VERBOSE_DELTAS:
+                    print(f"  🛏️  Bed occupied at {facility} (Total: {state['beds_occupied']})")
                 
             elif occupancy_state == "FREE":
                 if state["beds_occupied"] > 0:
                     state["beds_occupied"] -= 1
                     delta["beds_occupied"] = -1
-                    print(f"  🛏️  Bed freed at {facility} (Total: {state['beds_occupied']})")
-                else:
+                    if VERBOSE_DELTAS:
+                        print(f"  🛏️  Bed freed at {facility} (Total: {state['beds_occupied']})")
+                elif VERBOSE_DELTAS:
                     print(f"  ⚠️  Bed free event ignored - already at 0")
 
         # -------- VENTILATOR STATUS --------
@@ -79,14 +166,16 @@ def handle_event(event):
             if status == "IN_USE":
                 state["ventilators_in_use"] += 1
                 delta["ventilators_in_use"] = +1
-                print(f"  🫁 Ventilator in use at {facility} (Total: {state['ventilators_in_use']})")
+                if VERBOSE_DELTAS:
+                    print(f"  🫁 Ventilator in use at {facility} (Total: {state['ventilators_in_use']})")
                 
             elif status == "FREE":
                 if state["ventilators_in_use"] > 0:
                     state["ventilators_in_use"] -= 1
                     delta["ventilators_in_use"] = -1
-                    print(f"  🫁 Ventilator freed at {facility} (Total: {state['ventilators_in_use']})")
-                else:
+                    if VERBOSE_DELTAS:
+                        print(f"  🫁 Ventilator freed at {facility} (Total: {state['ventilators_in_use']})")
+                elif VERBOSE_DELTAS:
                     print(f"  ⚠️  Ventilator free event ignored - already at 0")
 
         # -------- OXYGEN LEVEL --------
@@ -99,20 +188,44 @@ def handle_event(event):
                 old_percent = state["oxygen_percent"]
                 state["oxygen_percent"] = new_percent
                 delta["oxygen_percent"] = new_percent
-                print(f"  💨 Oxygen level changed at {facility}: {old_percent:.1f}% → {new_percent:.1f}%")
+                if VERBOSE_DELTAS:
+                    print(f"  💨 Oxygen level changed at {facility}: {old_percent:.1f}% → {new_percent:.1f}%")
             
             if new_status and state["oxygen_status"] != new_status:
                 old_status = state["oxygen_status"]
                 state["oxygen_status"] = new_status
                 delta["oxygen_status"] = new_status
-                print(f"  💨 Oxygen status changed at {facility}: {old_status} → {new_status}")
+                if VERBOSE_DELTAS:
+                    print(f"  💨 Oxygen status changed at {facility}: {old_status} → {new_status}")
+        
+        # -------- EDGE GATEWAY SUMMARY --------
+        # Absolute per-facility counts from edge_gateway.py; emit the difference
+        elif event["event_type"] == "FACILITY_SUMMARY":
+            for field in ("beds_occupied", "ventilators_in_use"):
+                new_value = event.get(field)
+                if new_value is not None and new_value != state[field]:
+                    delta[field] = new_value - state[field]
+                    state[field] = new_value
+
+            new_percent = event.get("oxygen_percent")
+            if new_percent is not None and state["oxygen_percent"] != new_percent:
+                state["oxygen_percent"] = new_percent
+                delta["oxygen_percent"] = new_percent
+
+            new_status = event.get("oxygen_status")
+            if new_status and state["oxygen_status"] != new_status:
+                state["oxygen_status"] = new_status
+                delta["oxygen_status"] = new_status
+
+            if delta and VERBOSE_DELTAS:
+                print(f"  🏥 Edge summary from {facility}: {event.get('readings', 0)} readings folded")
         
         else:
             print(f"  ⚠️  Unknown event type: {event['event_type']}")
 
         # Emit delta if there were changes
         if delta:
-            emit_hospital_delta(facility, delta)
+            queue_delta(facility, delta, event.get("trace"))
             
     except Exception as e:
         print(f"❌ Error handling event for {facility}: {e}")
@@ -120,10 +233,11 @@ def handle_event(event):
         traceback.print_exc()
 
 def on_message(client, userdata, msg):
+    started = time.perf_counter()
     try:
-        payload = msg.payload.decode()
-        event = json.loads(payload)
+        event = wire_format.decode(msg.payload)
         handle_event(event)
+        latency.record(event.get("trace") if isinstance(event, dict) else None, started)
     except json.JSONDecodeError as e:
         print(f"❌ Invalid JSON received: {e}")
     except Exception as e:
@@ -157,32 +271,60 @@ def print_stats():
     print("="*60 + "\n")
 
 # -------- MAIN --------
-if __name__ == "__main__":
-    print("="*60)
-    print("🏥 HOSPITAL AGGREGATOR")
-    print("="*60 + "\n")
-    
-    client = mqtt.Client()
+def start():
+    """Creates the (unconnected) client and starts the background loops"""
+    global client
+    client = transport.create_client()
     client.on_connect = on_connect
     client.on_message = on_message
     client.on_disconnect = on_disconnect
     
     # Enable automatic reconnection
     client.reconnect_delay_set(min_delay=1, max_delay=120)
+
+    # Publish coalesced deltas as their windows close
+    if COALESCE_WINDOW_MS > 0:
+        threading.Thread(target=coalesce_loop, daemon=True).start()
+    latency.start_exporter()
+    return client
+
+def stop(client):
+    """Publishes whatever is still coalescing and waits for it to go out; needs the network loop running"""
+    deadline = time.monotonic() + SHUTDOWN_PUBLISH_TIMEOUT
+    for info in flush_deltas(force=True):
+        remaining = deadline - time.monotonic()
+        if info.rc != 0 or remaining <= 0:
+            continue
+        try:
+            info.wait_for_publish(remaining)
+        except (ValueError, RuntimeError) as e:
+            print(f"⚠️  Final delta not published: {e}")
+    client.loop_stop()
+    client.disconnect()
+
+if __name__ == "__main__":
+    print("="*60)
+    print("🏥 HOSPITAL AGGREGATOR")
+    print("="*60 + "\n")
+    
+    client = start()
     
     try:
         client.connect(BROKER, 1883, 60)
         
         # Optional: Print stats periodically
-        # import threading
         # def stats_loop():
         #     while True:
         #         time.sleep(30)
         #         print_stats()
         # threading.Thread(target=stats_loop, daemon=True).start()
         
-        client.loop_forever()
+        # Network loop in the background, so it is still running while stop() flushes
+        client.loop_start()
+        while True:
+            time.sleep(1)
     except KeyboardInterrupt:
+        stop(client)
         print("\n✓ Aggregator stopped")
     except Exception as e:
         print(f"❌ Error: {e}")
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""
+Ingest Queue — Phase 4
+Bounded hand-off between the MQTT network thread and worker threads.
+paho's on_message only decodes and enqueues; the actual work (DB
+writes, preprocessing) runs on INGEST_WORKERS threads, so a slow
+Postgres no longer stalls keepalives or backs up the broker.
+
+Each facility hashes to one lane, and each lane has exactly one worker,
+so readings for a facility are always handled in arrival order.
+
+Overload policies, applied when a lane is full:
+    block            the producer waits for room (backpressure to the broker)
+    drop_oldest      the oldest pending reading of the same resource is dropped
+                     (or the lane's oldest, if that resource has none pending)
+    coalesce_latest  a pending reading of the same resource is always replaced
+                     in place by the newer one; blocks only if the lane is
+                     full of distinct resources
+"""
+
+import threading
+import time
+import zlib
+from collections import deque
+
+# -------- CONFIG --------
+INGEST_WORKERS = 4
+INGEST_QUEUE_MAX = 20000   # Pending items across all lanes
+BLOCK_POLL_SECONDS = 0.5   # How often a blocked producer re-checks for shutdown
+
+POLICIES = ("block", "drop_oldest", "coalesce_latest")
+
+
+class _Lane:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.entries = deque()   # [key, item, alive] in arrival order
+        self.pending = {}        # key -> deque of live entries for that resource
+        self.depth = 0           # Live entries (dropped ones stay in `entries` as tombstones)
+
+
+class IngestQueue:
+    """
+    put(facility_id, key, item) from the network thread; handler(item) runs
+    on the worker that owns the facility's lane. key identifies the resource
+    for the per-resource policies, e.g. (facility_id, resource_type, resource_id).
+    """
+
+    def __init__(self, handler, workers=INGEST_WORKERS, max_depth=INGEST_QUEUE_MAX,
+                 policy="block", name="ingest"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown ingest policy {policy!r}, expected one of {POLICIES}")
+        self.handler = handler
+        self.policy = policy
+        self.name = name
+        self.lane_capacity = max(1, max_depth // workers)
+        self.lanes = [_Lane() for _ in range(workers)]
+
+        self._stop = threading.Event()
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self.counters = {
+            "enqueued": 0,
+            "processed": 0,
+            "dropped": 0,
+            "coalesced": 0,
+            "blocked": 0,     # put() calls that had to wait for room
+            "errors": 0,
+            "high_water": 0,  # Deepest a single lane has been
+        }
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self.counters[name] += n
+
+    # -------- PRODUCER --------
+
+    def lane_of(self, facility_id):
+        return zlib.crc32(facility_id.encode()) % len(self.lanes)
+
+    def put(self, facility_id, key, item):
+        lane = self.lanes[self.lane_of(facility_id)]
+        with lane.cond:
+            if self.policy == "coalesce_latest":
+                pending = lane.pending.get(key)
+                if pending:
+                    pending[-1][1] = item
+                    self._count("coalesced")
+                    return
+
+            if lane.depth >= self.lane_capacity:
+                if self.policy == "drop_oldest":
+                    self._drop_one(lane, key)
+                else:
+                    self._count("blocked")
+                    while lane.depth >= self.lane_capacity and not self._stop.is_set():
+                        lane.cond.wait(BLOCK_POLL_SECONDS)
+
+            entry = [key, item, True]
+            lane.entries.append(entry)
+            lane.pending.setdefault(key, deque()).append(entry)
+            lane.depth += 1
+            depth = lane.depth
+            lane.cond.notify_all()
+
+        with self._stats_lock:
+            self.counters["enqueued"] += 1
+            if depth > self.counters["high_water"]:
+                self.counters["high_water"] = depth
+
+    def _drop_one(self, lane, key):
+        """Tombstones the oldest pending entry for key, or the lane's oldest live entry."""
+        pending = lane.pending.get(key)
+        if pending:
+            victim = pending[0]
+        else:
+            victim = next(e for e in lane.entries if e[2])
+        victim[2] = False
+        self._forget(lane, victim)
+        self._count("dropped")
+        # A stalled worker never pops tombstones, so compact them away here
+        if len(lane.entries) > 2 * self.lane_capacity:
+            lane.entries = deque(e for e in lane.entries if e[2])
+
+    @staticmethod
+    def _forget(lane, entry):
+        # entry is always the oldest live one for its resource
+        pending = lane.pending[entry[0]]
+        pending.popleft()
+        if not pending:
+            del lane.pending[entry[0]]
+        lane.depth -= 1
+
+    # -------- WORKERS --------
+
+    def _take(self, lane):
+        """Next live entry's item, or None once stopped and drained."""
+        with lane.cond:
+            while True:
+                while lane.entries:
+                    entry = lane.entries.popleft()
+                    if entry[2]:
+                        self._forget(lane, entry)
+                        lane.cond.notify_all()
+                        return entry[1]
+                if self._stop.is_set():
+                    return None
+                lane.cond.wait(BLOCK_POLL_SECONDS)
+
+    def _work(self, lane):
+        while True:
+            item = self._take(lane)
+            if item is None:
+                return
+            try:
+                self.handler(item)
+                self._count("processed")
+            except Exception as e:
+                self._count("errors")
+                print(f"❌ {self.name} worker error: {e}")
+
+    def start(self):
+        for i, lane in enumerate(self.lanes):
+            thread = threading.Thread(target=self._work, args=(lane,), name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        """Stops accepting waits, lets workers drain their lanes, then joins them."""
+        self._stop.set()
+        for lane in self.lanes:
+            with lane.cond:
+                lane.cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    # -------- METRICS --------
+
+    def depth(self):
+        return sum(lane.depth for lane in self.lanes)
+
+    def stats(self):
+        with self._stats_lock:
+            counters = dict(self.counters)
+        counters["depth"] = self.depth()
+        counters["lane_depths"] = [lane.depth for lane in self.lanes]
+        counters["policy"] = self.policy
+        return counters
@@ -0,0 +1,240 @@
+"""
+Load Generator — Phase 4
+Unified, seedable simulator for beds, ventilators and oxygen cylinders.
+Per-resource state lives in NumPy arrays, so thousands of facilities and
+hundreds of thousands of sensors can be simulated from one process.
+
+Uses config.HOSPITAL_CONFIGS and SIMULATION_SPEED_FACTOR by default.
+Publishes the same payloads as the single-type simulators to
+hospital/{facility_id}/{bed|ventilator|oxygen}/raw, in config.WIRE_FORMAT,
+with tracing stamps when config.TRACE_ENABLED.
+
+Usage:
+    python load_generator.py                                   # config.py facilities
+    python load_generator.py --facilities 2000 --beds 200 --rate 50000 --seed 7
+"""
+
+import argparse
+import time
+import numpy as np
+
+import config
+import tracing
+import transport
+import wire_format
+
+# Base cadence per sensor type (seconds), same as the single-type simulators
+BASE_INTERVALS = {"bed": 3.0, "ventilator": 4.0, "oxygen": 5.0}
+
+TICK_SECONDS = 0.05          # Publishing is spread over the cadence in ticks this long
+REPORT_INTERVAL_SECONDS = 5
+
+BED_FLIP_PROBABILITY = 0.10
+VENT_FLIP_PROBABILITY = 0.10
+OXY_REFILL_PROBABILITY = 0.10
+
+
+class SensorGroup:
+    """All sensors of one type, with vectorized state and pre-built payload prefixes."""
+
+    def __init__(self, kind, resource_type, id_prefix, facilities, counts, interval, binary=False,
+                 traced=False):
+        self.kind = kind
+        self.interval = interval
+        self.binary = binary
+        self.traced = traced
+        self.topics = []
+        self.prefixes = []
+        for fid, count in zip(facilities, counts):
+            topic = f"hospital/{fid}/{kind}/raw"
+            for i in range(count):
+                resource_id = f"{id_prefix}_{i:02d}"
+                self.topics.append(topic)
+                if binary:
+                    self.prefixes.append(wire_format.reading_header(fid, resource_type, resource_id, traced))
+                else:
+                    self.prefixes.append(
+                        f'{{"facility_id": "{fid}", "resource_type": "{resource_type}", '
+                        f'"resource_id": "{resource_id}", "raw_value": '
+                    )
+        self.size = len(self.topics)
+        self.values = []   # Python floats for the current cycle
+        self.cursor = 0    # Next sensor to publish in this cycle
+        self.carry = 0.0   # Fractional sensors owed from previous ticks
+
+    def due(self, elapsed):
+        """How many sensors to publish for a tick of `elapsed` simulated seconds."""
+        if not self.size:
+            return 0
+        self.carry += self.size * elapsed / self.interval
+        n = int(self.carry)
+        self.carry -= n
+        return n
+
+
+class LoadGenerator:
+    def __init__(self, facilities, speed=1.0, target_rate=None, seed=None, wire=None):
+        self.rng = np.random.default_rng(seed)
+        binary = (wire or config.WIRE_FORMAT) == "binary"
+        traced = config.TRACE_ENABLED
+        self.facilities = list(facilities)
+
+        intervals = {k: v / speed for k, v in BASE_INTERVALS.items()}
+        counts = {
+            "bed": [facilities[f]["beds"] for f in self.facilities],
+            "ventilator": [facilities[f]["ventilators"] for f in self.facilities],
+            "oxygen": [facilities[f]["oxygen_cylinders"] for f in self.facilities],
+        }
+
+        # A target rate overrides the natural cadence, keeping the per-type ratio
+        if target_rate:
+            natural = sum(sum(counts[k]) / intervals[k] for k in intervals)
+            if natural > 0:
+                scale = natural / target_rate
+                intervals = {k: v * scale for k, v in intervals.items()}
+
+        self.beds = SensorGroup("bed", "BED", "BED", self.facilities, counts["bed"],
+                                intervals["bed"], binary, traced)
+        self.vents = SensorGroup("ventilator", "VENTILATOR", "VENT", self.facilities,
+                                 counts["ventilator"], intervals["ventilator"], binary, traced)
+        self.oxygen = SensorGroup("oxygen", "OXYGEN", "OXY", self.facilities,
+                                  counts["oxygen"], intervals["oxygen"], binary, traced)
+        self.groups = [self.beds, self.vents, self.oxygen]
+
+        # Vectorized state
+        self.bed_occupied = self.rng.random(self.beds.size) < 0.5
+        self.vent_in_use = self.rng.random(self.vents.size) < 0.4
+        self.oxy_pressure = self.rng.uniform(1500, 2000, self.oxygen.size)
+
+        self.expected_rate = sum(g.size / g.interval for g in self.groups)
+
+    # -------- STATE MODEL --------
+
+    def step_beds(self):
+        n = self.beds.size
+        self.bed_occupied ^= self.rng.random(n) < BED_FLIP_PROBABILITY
+        # Occupied beds have high pressure, empty beds low
+        pressure = np.where(self.bed_occupied, self.rng.uniform(30, 80, n), self.rng.uniform(0, 5, n))
+        self.beds.values = np.round(pressure, 2).tolist()
+
+    def step_vents(self):
+        n = self.vents.size
+        self.vent_in_use ^= self.rng.random(n) < VENT_FLIP_PROBABILITY
+        # >2A = in use, <0.5A = off
+        current = np.where(self.vent_in_use, self.rng.uniform(2.0, 5.0, n), self.rng.uniform(0.0, 0.3, n))
+        self.vents.values = np.round(current, 2).tolist()
+
+    def step_oxygen(self):
+        n = self.oxygen.size
+        # Slowly drain pressure, occasionally refill when low
+        self.oxy_pressure = np.maximum(0, self.oxy_pressure - self.rng.uniform(5, 30, n))
+        refill = (self.oxy_pressure < 200) & (self.rng.random(n) < OXY_REFILL_PROBABILITY)
+        self.oxy_pressure[refill] = self.rng.uniform(1800, 2000, int(refill.sum()))
+        self.oxygen.values = np.round(self.oxy_pressure, 2).tolist()
+
+    # -------- PUBLISHING --------
+
+    def publish_due(self, client, group, step, elapsed):
+        """Publishes the next slice of a group, stepping its state at each new cycle."""
+        remaining = group.due(elapsed)
+        published = 0
+        while remaining > 0:
+            if group.cursor == 0:
+                step()
+            end = min(group.size, group.cursor + remaining)
+            topics, prefixes, values = group.topics, group.prefixes, group.values
+            if group.traced:
+                # One source timestamp per slice; the slice goes out within one tick
+                ts = time.time()
+                seq = tracing.next_seq(end - group.cursor) - group.cursor
+                if group.binary:
+                    pack, trailer = wire_format.F64.pack, wire_format.TRACE.pack
+                    for i in range(group.cursor, end):
+                        client.publish(topics[i], prefixes[i] + pack(values[i]) + trailer(ts, (seq + i) & 0xFFFFFFFF))
+                else:
+                    for i in range(group.cursor, end):
+                        client.publish(topics[i], f'{prefixes[i]}{values[i]}, "trace": {{"ts": {ts}, "seq": {seq + i}}}}}')
+            elif group.binary:
+                pack = wire_format.F64.pack
+                for i in range(group.cursor, end):
+                    client.publish(topics[i], prefixes[i] + pack(values[i]))
+            else:
+                for i in range(group.cursor, end):
+                    client.publish(topics[i], f"{prefixes[i]}{values[i]}}}")
+            published += end - group.cursor
+            remaining -= end - group.cursor
+            group.cursor = 0 if end == group.size else end
+        return published
+
+    def run(self, client, duration=None):
+        steps = {self.beds: self.step_beds, self.vents: self.step_vents, self.oxygen: self.step_oxygen}
+        started = last_tick = last_report = time.monotonic()
+        total = window = 0
+
+        while duration is None or time.monotonic() - started < duration:
+            now = time.monotonic()
+            elapsed, last_tick = now - last_tick, now
+            for group in self.groups:
+                window += self.publish_due(client, group, steps[group], elapsed)
+
+            if now - last_report >= REPORT_INTERVAL_SECONDS:
+                total += window
+                rate = window / (now - last_report)
+                print(f"📈 {rate:10.0f} msg/s achieved (target {self.expected_rate:.0f}), "
+                      f"{total} published")
+                window, last_report = 0, now
+
+            time.sleep(max(0.0, TICK_SECONDS - (time.monotonic() - now)))
+
+
+def build_facilities(count=None, beds=None, ventilators=None, cylinders=None):
+    """config.HOSPITAL_CONFIGS, or `count` synthetic facilities shaped like its first entry."""
+    if not count:
+        facilities = {f: dict(cfg) for f, cfg in config.HOSPITAL_CONFIGS.items()}
+    else:
+        template = next(iter(config.HOSPITAL_CONFIGS.values()))
+        width = max(3, len(str(count)))
+        facilities = {f"H{i:0{width}d}": dict(template) for i in range(1, count + 1)}
+
+    for cfg in facilities.values():
+        if beds is not None:
+            cfg["beds"] = beds
+        if ventilators is not None:
+            cfg["ventilators"] = ventilators
+        if cylinders is not None:
+            cfg["oxygen_cylinders"] = cylinders
+    return facilities
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="High-scale sensor load generator")
+    parser.add_argument("--facilities", type=int, help="Synthesize this many facilities instead of config.py")
+    parser.add_argument("--beds", type=int, help="Beds per facility")
+    parser.add_argument("--ventilators", type=int, help="Ventilators per facility")
+    parser.add_argument("--cylinders", type=int, help="Oxygen cylinders per facility")
+    parser.add_argument("--rate", type=float, help="Target messages/sec across all sensors")
+    parser.add_argument("--speed", type=float, default=config.SIMULATION_SPEED_FACTOR,
+                        help="Time compression (default: SIMULATION_SPEED_FACTOR)")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--seed", type=int, help="RNG seed for reproducible runs")
+    parser.add_argument("--wire", choices=["json", "binary"], default=config.WIRE_FORMAT,
+                        help="Payload encoding (default: WIRE_FORMAT)")
+    args = parser.parse_args()
+
+    facilities = build_facilities(args.facilities, args.beds, args.ventilators, args.cylinders)
+    generator = LoadGenerator(facilities, speed=args.speed, target_rate=args.rate,
+                              seed=args.seed, wire=args.wire)
+
+    client = transport.create_client()
+    client.connect(config.BROKER, config.MQTT_PORT, 60)
+    client.loop_start()
+    print(f"Load Generator started — {len(facilities)} facilities, "
+          f"{sum(g.size for g in generator.groups)} sensors, ~{generator.expected_rate:.0f} msg/s")
+
+    try:
+        generator.run(client, duration=args.duration)
+    except KeyboardInterrupt:
+        print("Load Generator stopped.")
+    finally:
+        client.loop_stop()
+        client.disconnect()
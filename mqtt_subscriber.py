@@ -1,13 +1,33 @@
 """
-MQTT Debug Subscriber — Phase 2
-Prints all MQTT messages for debugging.
+MQTT Debug Subscriber — Phase 4
+Prints all MQTT messages for debugging, or with --profile runs a traffic
+profiler: per-topic rate, payload sizes, bursts, per-resource
+inter-arrival jitter and top-N facilities, as a refreshing terminal
+table plus an optional periodic JSON/CSV dump.
+
+Usage:
+    python mqtt_subscriber.py                                  # debug print
+    python mqtt_subscriber.py --profile --top 10 --dump traffic.csv
 """
 
+import argparse
+import csv
 import json
+import math
+import threading
+import time
+from collections import defaultdict, deque
 import paho.mqtt.client as mqtt
 
+import wire_format
+
 BROKER = "localhost"
 
+REFRESH_SECONDS = 2
+BURST_FACTOR = 3.0        # A second this many times the average rate is a burst
+BURST_MIN_MESSAGES = 20   # ...and has at least this many messages
+SIZE_SAMPLES = 1000       # Recent payload sizes kept per topic
+
 
 def on_message(client, userdata, msg):
     try:
@@ -22,13 +42,215 @@ def on_connect(client, userdata, flags, rc):
     client.subscribe("#")
 
 
+# -------- PROFILER --------
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(pct / 100.0 * len(ordered))) - 1)]
+
+
+class TopicStats:
+    def __init__(self, now):
+        self.total = 0
+        self.bytes = 0
+        self.window = 0              # Messages since the last render
+        self.sizes = deque(maxlen=SIZE_SAMPLES)
+        self.second = int(now)       # Current 1 s bucket
+        self.second_count = 0
+        self.avg_per_second = None   # EWMA of per-second counts
+        self.bursts = 0
+        self.peak_per_second = 0
+
+
+class ArrivalStats:
+    """Welford running mean/variance of inter-arrival times for one resource."""
+
+    def __init__(self):
+        self.last = None
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, now):
+        if self.last is not None:
+            gap = now - self.last
+            self.count += 1
+            d = gap - self.mean
+            self.mean += d / self.count
+            self.m2 += d * (gap - self.mean)
+        self.last = now
+
+    @property
+    def jitter(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class TrafficProfiler:
+    def __init__(self, top=10):
+        self.top = top
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_render = self.started
+        self.topics = {}
+        self.facilities = defaultdict(int)
+        self.arrivals = defaultdict(ArrivalStats)
+
+    def on_message(self, client, userdata, msg):
+        now = time.monotonic()
+        size = len(msg.payload)
+        parts = msg.topic.split("/")
+
+        facility_id = resource_id = None
+        if parts[0] == "hospital" and len(parts) > 1:
+            facility_id = parts[1]
+        if parts[-1] == "raw" or parts[0] == "events":
+            try:
+                data = wire_format.decode(msg.payload)
+                facility_id = data.get("facility_id", facility_id)
+                resource_id = data.get("resource_id")
+            except Exception:
+                pass
+
+        with self.lock:
+            stats = self.topics.get(msg.topic)
+            if stats is None:
+                stats = self.topics[msg.topic] = TopicStats(now)
+            stats.total += 1
+            stats.bytes += size
+            stats.window += 1
+            stats.sizes.append(size)
+
+            # Burst detection on 1 s buckets against the topic's running average
+            second = int(now)
+            if second != stats.second:
+                self._close_second(stats)
+                stats.second, stats.second_count = second, 0
+            stats.second_count += 1
+
+            if facility_id:
+                self.facilities[facility_id] += 1
+            if facility_id and resource_id is not None:
+                self.arrivals[(facility_id, resource_id)].add(now)
+
+    @staticmethod
+    def _close_second(stats):
+        count = stats.second_count
+        stats.peak_per_second = max(stats.peak_per_second, count)
+        if stats.avg_per_second is not None and count >= BURST_MIN_MESSAGES \
+                and count > BURST_FACTOR * stats.avg_per_second:
+            stats.bursts += 1
+        stats.avg_per_second = count if stats.avg_per_second is None else \
+            0.9 * stats.avg_per_second + 0.1 * count
+
+    def snapshot(self):
+        """Current profile as plain data (also used for the JSON dump)."""
+        now = time.monotonic()
+        with self.lock:
+            elapsed = max(now - self.last_render, 1e-9)
+            uptime = max(now - self.started, 1e-9)
+            topics = []
+            for topic, s in self.topics.items():
+                sizes = list(s.sizes)
+                topics.append({
+                    "topic": topic,
+                    "rate": round(s.window / elapsed, 1),
+                    "avg_rate": round(s.total / uptime, 1),
+                    "total": s.total,
+                    "size_min": min(sizes) if sizes else 0,
+                    "size_avg": round(sum(sizes) / len(sizes), 1) if sizes else 0,
+                    "size_p95": percentile(sizes, 95),
+                    "size_max": max(sizes) if sizes else 0,
+                    "peak_per_second": s.peak_per_second,
+                    "bursts": s.bursts,
+                })
+                s.window = 0
+            self.last_render = now
+
+            facilities = sorted(self.facilities.items(), key=lambda x: x[1], reverse=True)[:self.top]
+            jitter = sorted(
+                ((key, a) for key, a in self.arrivals.items() if a.count > 1),
+                key=lambda x: x[1].jitter, reverse=True,
+            )[:self.top]
+
+            return {
+                "uptime_seconds": round(uptime, 1),
+                "topics": sorted(topics, key=lambda t: t["rate"], reverse=True),
+                "top_facilities": [{"facility_id": f, "messages": n, "rate": round(n / uptime, 1)}
+                                   for f, n in facilities],
+                "jitter": [{"facility_id": k[0], "resource_id": k[1],
+                            "mean_interval_ms": round(a.mean * 1000, 1),
+                            "jitter_ms": round(a.jitter * 1000, 1)} for k, a in jitter],
+            }
+
+    def render(self, snap):
+        lines = ["\033[2J\033[H" + "=" * 96,
+                 f"📡 MQTT TRAFFIC PROFILE — up {snap['uptime_seconds']:.0f}s, {len(snap['topics'])} topics",
+                 "=" * 96,
+                 f"{'TOPIC':<40}{'MSG/S':>9}{'AVG':>9}{'SIZE avg/p95/max':>20}{'PEAK/S':>8}{'BURSTS':>8}"]
+        for t in snap["topics"][:self.top]:
+            sizes = f"{t['size_avg']:.0f}/{t['size_p95']}/{t['size_max']}"
+            lines.append(f"{t['topic'][:39]:<40}{t['rate']:>9.1f}{t['avg_rate']:>9.1f}{sizes:>20}"
+                         f"{t['peak_per_second']:>8}{t['bursts']:>8}")
+
+        lines += ["", f"{'TOP FACILITIES':<20}{'MESSAGES':>12}{'MSG/S':>10}"]
+        for f in snap["top_facilities"]:
+            lines.append(f"{f['facility_id']:<20}{f['messages']:>12}{f['rate']:>10.1f}")
+
+        lines += ["", f"{'HIGHEST JITTER':<30}{'MEAN INTERVAL ms':>18}{'JITTER ms':>12}"]
+        for j in snap["jitter"]:
+            lines.append(f"{(j['facility_id'] + '/' + str(j['resource_id']))[:29]:<30}"
+                         f"{j['mean_interval_ms']:>18.1f}{j['jitter_ms']:>12.1f}")
+        print("\n".join(lines), flush=True)
+
+    @staticmethod
+    def dump(snap, path):
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(snap["topics"][0].keys()) if snap["topics"] else ["topic"])
+                writer.writeheader()
+                writer.writerows(snap["topics"])
+        else:
+            with open(path, "w") as f:
+                json.dump(snap, f, indent=2)
+
+
+def run_profiler(client, top, dump_path, dump_interval):
+    profiler = TrafficProfiler(top)
+    client.on_message = profiler.on_message
+    client.loop_start()
+
+    last_dump = time.monotonic()
+    try:
+        while True:
+            time.sleep(REFRESH_SECONDS)
+            snap = profiler.snapshot()
+            profiler.render(snap)
+            if dump_path and time.monotonic() - last_dump >= dump_interval:
+                profiler.dump(snap, dump_path)
+                last_dump = time.monotonic()
+    finally:
+        client.loop_stop()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MQTT debug subscriber / traffic profiler")
+    parser.add_argument("--profile", action="store_true", help="Show a traffic profile instead of messages")
+    parser.add_argument("--top", type=int, default=10, help="Rows per table in profile mode")
+    parser.add_argument("--dump", help="Write the profile to this .json or .csv file periodically")
+    parser.add_argument("--dump-interval", type=float, default=30, help="Seconds between dumps")
+    args = parser.parse_args()
+
     client = mqtt.Client()
     client.on_connect = on_connect
     client.on_message = on_message
     client.connect(BROKER, 1883, 60)
 
     try:
-        client.loop_forever()
+        if args.profile:
+            run_profiler(client, args.top, args.dump, args.dump_interval)
+        else:
+            client.loop_forever()
     except KeyboardInterrupt:
         print("Stopped.")
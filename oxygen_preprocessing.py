@@ -3,47 +3,88 @@ Oxygen Preprocessor — Phase 3
 Converts cylinder pressure to oxygen level percentage + status.
 """
 
-import json
-import paho.mqtt.client as mqtt
+import time
+
+import tracing
+import transport
+import wire_format
+from change_detection import Debouncer, deadband_exceeded
 
 BROKER = "localhost"
 MAX_PRESSURE = 2000.0  # Full cylinder PSI
 
+CRITICAL_AT = 20.0              # Level (%) at or below = CRITICAL
+WARNING_AT = 40.0               # Level (%) at or below = WARNING
+STATUS_HYSTERESIS_PERCENT = 2.0 # Must clear a threshold by this much to recover
+LEVEL_DEADBAND_PERCENT = 1.0    # Minimum level change worth publishing
+DEBOUNCE_SAMPLES = 2            # Consecutive readings needed to change status
+
 oxy_last_state = {}
+oxy_status = Debouncer(DEBOUNCE_SAMPLES)
+oxy_last_level = {}
+latency = tracing.LatencyRecorder("oxygen_preprocessor")
+
+
+def classify(level_percent, prev_status):
+    """Status bands with hysteresis: dropping is immediate, recovering needs a margin."""
+    if level_percent <= CRITICAL_AT:
+        status = "CRITICAL"
+    elif level_percent <= WARNING_AT:
+        status = "WARNING"
+    else:
+        status = "NORMAL"
+
+    if prev_status == "CRITICAL" and level_percent <= CRITICAL_AT + STATUS_HYSTERESIS_PERCENT:
+        return "CRITICAL"
+    if prev_status in ("CRITICAL", "WARNING") and status == "NORMAL" \
+            and level_percent <= WARNING_AT + STATUS_HYSTERESIS_PERCENT:
+        return "WARNING"
+    return status
+
+
+def process_reading(data):
+    """Maps one raw cylinder pressure reading to (topic, event) pairs — empty if nothing meaningful moved."""
+    fid = data["facility_id"]
+    oxy_id = data["resource_id"]
+    pressure = data["raw_value"]
+
+    level_percent = min(100.0, max(0.0, (pressure / MAX_PRESSURE) * 100.0))
+
+    key = (fid, oxy_id)
+    status_changed = oxy_status.update(key, classify(level_percent, oxy_status.get(key)))
+    status = oxy_status.get(key)
+
+    # Emit on a debounced status change or a level move outside the deadband
+    if not status_changed and not deadband_exceeded(level_percent, oxy_last_level.get(key), LEVEL_DEADBAND_PERCENT):
+        return []
+
+    oxy_last_level[key] = level_percent
+    event = {
+        "facility_id": fid,
+        "event_type": "OXYGEN_LEVEL",
+        "estimated_level_percent": round(level_percent, 1),
+        "status": status,
+        "cylinder_id": oxy_id,
+    }
+    tracing.carry(data, event)
+    return [("events/oxygen_level", event)]
 
 
 def on_message(client, userdata, msg):
+    started = time.perf_counter()
     try:
-        data = json.loads(msg.payload.decode())
-        fid = data["facility_id"]
-        oxy_id = data["resource_id"]
-        pressure = data["raw_value"]
-
-        level_percent = min(100.0, max(0.0, (pressure / MAX_PRESSURE) * 100.0))
-
-        if level_percent <= 20:
-            status = "CRITICAL"
-        elif level_percent <= 40:
-            status = "WARNING"
-        else:
-            status = "NORMAL"
-
-        key = (fid, oxy_id)
-        prev_status = oxy_last_state.get(key, None)
-
-        # Always emit level, but only log on status change
-        event = {
-            "facility_id": fid,
-            "event_type": "OXYGEN_LEVEL",
-            "estimated_level_percent": round(level_percent, 1),
-            "status": status,
-            "cylinder_id": oxy_id,
-        }
-        client.publish("events/oxygen_level", json.dumps(event))
-
-        if prev_status != status:
-            oxy_last_state[key] = status
-            print(f"  O₂ {oxy_id} at {fid}: {level_percent:.1f}% ({status})")
+        data = wire_format.decode(msg.payload)
+        for topic, event in process_reading(data):
+            client.publish(topic, wire_format.encode_event(event))
+
+            # Only log on status change
+            key = (event["facility_id"], event["cylinder_id"])
+            if oxy_last_state.get(key) != event["status"]:
+                oxy_last_state[key] = event["status"]
+                print(f"  O₂ {event['cylinder_id']} at {event['facility_id']}: "
+                      f"{event['estimated_level_percent']:.1f}% ({event['status']})")
+
+        latency.record(data.get("trace"), started)
 
     except Exception as e:
         print(f"Preprocessor error: {e}")
@@ -55,10 +96,11 @@ def on_connect(client, userdata, flags, rc):
 
 
 if __name__ == "__main__":
-    client = mqtt.Client()
+    client = transport.create_client()
     client.on_connect = on_connect
     client.on_message = on_message
     client.connect(BROKER, 1883, 60)
+    latency.start_exporter()
 
     try:
         client.loop_forever()
@@ -3,10 +3,12 @@ Oxygen Simulator — Phase 2
 Simulates oxygen cylinder pressure readings.
 """
 
-import json
 import time
 import random
-import paho.mqtt.client as mqtt
+
+import tracing
+import transport
+import wire_format
 
 BROKER = "localhost"
 
@@ -25,7 +27,7 @@ for fid, cfg in HOSPITALS.items():
 
 
 def main():
-    client = mqtt.Client()
+    client = transport.create_client()
     client.connect(BROKER, 1883, 60)
     print("Oxygen Simulator started")
 
@@ -47,8 +49,9 @@ def main():
                 "resource_id": oxy_id,
                 "raw_value": round(pressure, 2),
             }
+            tracing.stamp(payload)
             topic = f"hospital/{fid}/oxygen/raw"
-            client.publish(topic, json.dumps(payload))
+            client.publish(topic, wire_format.encode_reading(payload))
 
         time.sleep(5)
 
@@ -0,0 +1,123 @@
+"""
+Pipeline Runner — Phase 4
+Composes the whole sensor pipeline in one process:
+
+    simulators (or load_generator) -> stream_processor -> hospital_aggregator
+                                   -> state_updator_agent (--with-db)
+
+By default the components talk over the in-process bus (transport.py),
+so no broker is needed and no message touches a socket — for edge boxes,
+tests and benchmarks. --transport mqtt runs the same composition over
+the broker instead.
+
+Usage:
+    python run_pipeline.py                          # simulators, no DB
+    python run_pipeline.py --rate 5000 --duration 60
+    python run_pipeline.py --with-db
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import config
+import transport
+
+STATS_INTERVAL_SECONDS = 10
+
+
+class DeltaTap:
+    """Counts what comes out of the aggregator."""
+
+    def __init__(self):
+        self.deltas = 0
+
+    def on_message(self, client, userdata, msg):
+        self.deltas += 1
+
+
+def start_thread(target, name, *args):
+    thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+def main(args):
+    # Components create their clients through transport.create_client(),
+    # so this must be set before any of them is started
+    config.TRANSPORT = args.transport
+
+    import hospital_aggregator
+    import stream_processor
+
+    # 1. Sinks first, so nothing published at startup is missed
+    updater = None
+    if args.with_db:
+        import state_updator_agent
+        updater = state_updator_agent.start(f"pipeline-{os.getpid()}")
+        updater.connect(config.BROKER, config.MQTT_PORT, 60)
+        updater.loop_start()
+
+    aggregator = hospital_aggregator.start()
+    aggregator.connect(config.BROKER, config.MQTT_PORT, 60)
+    aggregator.loop_start()
+
+    tap = DeltaTap()
+    tap_client = transport.create_client("pipeline-tap")
+    tap_client.on_connect = lambda c, u, f, rc: c.subscribe("hospital_delta/updates")
+    tap_client.on_message = tap.on_message
+    tap_client.connect(config.BROKER, config.MQTT_PORT, 60)
+    tap_client.loop_start()
+
+    processor = stream_processor.StreamProcessor(0, 1, args.workers)
+    start_thread(processor.run, "stream-processor")
+    time.sleep(0.5)   # Let subscriptions land
+
+    # 2. Sources
+    if args.rate:
+        import load_generator
+        generator = load_generator.LoadGenerator(load_generator.build_facilities(args.facilities),
+                                                 target_rate=args.rate, seed=args.seed)
+        source = transport.create_client("pipeline-load-generator")
+        source.connect(config.BROKER, config.MQTT_PORT, 60)
+        source.loop_start()
+        start_thread(generator.run, "load-generator", source)
+        print(f"▶  Pipeline running ({args.transport}) — load generator at ~{generator.expected_rate:.0f} msg/s")
+    else:
+        import bed_simulator
+        import oxygen_simulator
+        import ventilator_simulator
+        for module in (bed_simulator, ventilator_simulator, oxygen_simulator):
+            start_thread(module.main, module.__name__)
+        print(f"▶  Pipeline running ({args.transport}) — simulators")
+
+    started = time.monotonic()
+    try:
+        while args.duration is None or time.monotonic() - started < args.duration:
+            time.sleep(min(STATS_INTERVAL_SECONDS, args.duration or STATS_INTERVAL_SECONDS))
+            uptime = time.monotonic() - started
+            bus = transport.local_bus
+            print(f"📈 {uptime:.0f}s: {tap.deltas} deltas out"
+                  + (f", bus {bus.published / uptime:.0f} msg/s published, {bus.delivered / uptime:.0f} msg/s delivered, {bus.dropped} dropped"
+                     if args.transport == "local" else ""))
+    except KeyboardInterrupt:
+        print("\nStopping pipeline...")
+    finally:
+        hospital_aggregator.flush_deltas(force=True)
+        processor.print_stats()
+        if updater is not None:
+            state_updator_agent.stop(updater)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the sensor pipeline in one process")
+    parser.add_argument("--transport", choices=["local", "mqtt"], default="local",
+                        help="In-process bus (default) or the MQTT broker")
+    parser.add_argument("--with-db", action="store_true", help="Also run state_updator_agent (needs Postgres)")
+    parser.add_argument("--rate", type=float, help="Use the load generator at this many msg/s instead of the simulators")
+    parser.add_argument("--facilities", type=int, help="Facilities for the load generator")
+    parser.add_argument("--seed", type=int, help="Load generator RNG seed")
+    parser.add_argument("--workers", type=int, default=4, help="Stream processor worker threads")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    main(parser.parse_args())
@@ -35,13 +35,260 @@ CREATE TABLE IF NOT EXISTS public.hospital_state_audit (
     applied_at timestamp without time zone DEFAULT now()
 );
 
+-- Last delta applied per facility (see migrations/007_delta_progress)
+CREATE TABLE IF NOT EXISTS public.delta_applier_progress (
+    facility_id text PRIMARY KEY,
+    source text NOT NULL,
+    seq bigint NOT NULL,
+    applied_at timestamp without time zone DEFAULT now()
+);
+
+-- Read model for dashboard / triage / chat / referral reads (see migrations/004_live_dashboard)
+-- One row per facility that has hospitals + hospital_capacity + hospital_state rows.
+-- fillfactor leaves room for HOT updates: only the primary key is indexed.
+CREATE TABLE IF NOT EXISTS public.hospital_live_dashboard (
+    facility_id text PRIMARY KEY,
+    name text NOT NULL,
+    city text,
+    latitude double precision,
+    longitude double precision,
+    beds_total integer,
+    beds_occupied integer,
+    beds_available integer,
+    beds_utilization_percent double precision,
+    bed_status text,
+    ventilators_total integer,
+    ventilators_in_use integer,
+    ventilators_available integer,
+    vent_utilization_percent double precision,
+    oxygen_percent double precision,
+    oxygen_status text,
+    last_updated timestamp without time zone
+) WITH (fillfactor = 70);
+
+-- Recomputes the derived row for each facility in ids (upsert, or delete if it no longer joins)
+CREATE OR REPLACE FUNCTION public.hospital_live_dashboard_refresh(ids text[])
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO public.hospital_live_dashboard AS d (
+        facility_id, name, city, latitude, longitude,
+        beds_total, beds_occupied, beds_available, beds_utilization_percent, bed_status,
+        ventilators_total, ventilators_in_use, ventilators_available, vent_utilization_percent,
+        oxygen_percent, oxygen_status, last_updated
+    )
+    SELECT
+        h.facility_id, h.name, h.city, h.latitude, h.longitude,
+        c.beds_total,
+        s.beds_occupied,
+        GREATEST(c.beds_total - s.beds_occupied, 0),
+        COALESCE(round((100.0 * s.beds_occupied / NULLIF(c.beds_total, 0))::numeric, 1), 0)::double precision,
+        CASE
+            WHEN s.beds_occupied::float / NULLIF(c.beds_total, 0) > 0.9 THEN 'CRITICAL'
+            WHEN s.beds_occupied::float / NULLIF(c.beds_total, 0) > 0.8 THEN 'WARNING'
+            ELSE 'NORMAL'
+        END,
+        c.ventilators_total,
+        s.ventilators_in_use,
+        GREATEST(c.ventilators_total - s.ventilators_in_use, 0),
+        COALESCE(round((100.0 * s.ventilators_in_use / NULLIF(c.ventilators_total, 0))::numeric, 1), 0)::double precision,
+        s.oxygen_percent,
+        s.oxygen_status,
+        s.last_updated
+    FROM public.hospitals h
+    JOIN public.hospital_capacity c ON c.facility_id = h.facility_id
+    JOIN public.hospital_state s ON s.facility_id = h.facility_id
+    WHERE h.facility_id = ANY(ids)
+    ON CONFLICT (facility_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        city = EXCLUDED.city,
+        latitude = EXCLUDED.latitude,
+        longitude = EXCLUDED.longitude,
+        beds_total = EXCLUDED.beds_total,
+        beds_occupied = EXCLUDED.beds_occupied,
+        beds_available = EXCLUDED.beds_available,
+        beds_utilization_percent = EXCLUDED.beds_utilization_percent,
+        bed_status = EXCLUDED.bed_status,
+        ventilators_total = EXCLUDED.ventilators_total,
+        ventilators_in_use = EXCLUDED.ventilators_in_use,
+        ventilators_available = EXCLUDED.ventilators_available,
+        vent_utilization_percent = EXCLUDED.vent_utilization_percent,
+        oxygen_percent = EXCLUDED.oxygen_percent,
+        oxygen_status = EXCLUDED.oxygen_status,
+        last_updated = EXCLUDED.last_updated
+    WHERE d IS DISTINCT FROM EXCLUDED;
+
+    DELETE FROM public.hospital_live_dashboard d
+    WHERE d.facility_id = ANY(ids)
+      AND NOT EXISTS (
+          SELECT 1
+          FROM public.hospitals h
+          JOIN public.hospital_capacity c ON c.facility_id = h.facility_id
+          JOIN public.hospital_state s ON s.facility_id = h.facility_id
+          WHERE h.facility_id = d.facility_id
+      );
+$$;
+
+-- Statement-level: a multi-row UPDATE from the write-behind flush refreshes each touched facility once
+CREATE OR REPLACE FUNCTION public.hospital_live_dashboard_sync()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM public.hospital_live_dashboard;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- old_rows too, in case facility_id itself changed
+        PERFORM public.hospital_live_dashboard_refresh(ARRAY(
+            SELECT facility_id FROM changed UNION SELECT facility_id FROM old_rows
+        ));
+    ELSE
+        PERFORM public.hospital_live_dashboard_refresh(ARRAY(SELECT DISTINCT facility_id FROM changed));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+    source text;
+BEGIN
+    FOREACH source IN ARRAY ARRAY['hospitals', 'hospital_capacity', 'hospital_state'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS live_dashboard_ins ON public.%I', source);
+        EXECUTE format('DROP TRIGGER IF EXISTS live_dashboard_upd ON public.%I', source);
+        EXECUTE format('DROP TRIGGER IF EXISTS live_dashboard_del ON public.%I', source);
+        EXECUTE format('DROP TRIGGER IF EXISTS live_dashboard_trunc ON public.%I', source);
+
+        EXECUTE format('CREATE TRIGGER live_dashboard_ins AFTER INSERT ON public.%I '
+                       'REFERENCING NEW TABLE AS changed FOR EACH STATEMENT '
+                       'EXECUTE FUNCTION public.hospital_live_dashboard_sync()', source);
+        EXECUTE format('CREATE TRIGGER live_dashboard_upd AFTER UPDATE ON public.%I '
+                       'REFERENCING OLD TABLE AS old_rows NEW TABLE AS changed FOR EACH STATEMENT '
+                       'EXECUTE FUNCTION public.hospital_live_dashboard_sync()', source);
+        EXECUTE format('CREATE TRIGGER live_dashboard_del AFTER DELETE ON public.%I '
+                       'REFERENCING OLD TABLE AS changed FOR EACH STATEMENT '
+                       'EXECUTE FUNCTION public.hospital_live_dashboard_sync()', source);
+        EXECUTE format('CREATE TRIGGER live_dashboard_trunc AFTER TRUNCATE ON public.%I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION public.hospital_live_dashboard_sync()', source);
+    END LOOP;
+END;
+$$;
+
+-- NOTIFY 'hospital_live' <facility_id | '*'> for the API's live cache (see migrations/005_live_notify)
+CREATE OR REPLACE FUNCTION public.hospital_live_notify()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    ids text[];
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('hospital_live', '*');
+        RETURN NULL;
+    END IF;
+
+    ids := ARRAY(SELECT DISTINCT facility_id FROM changed);
+    IF cardinality(ids) > 100 THEN
+        PERFORM pg_notify('hospital_live', '*');
+    ELSE
+        -- Delivered on commit; duplicates within a transaction are folded by Postgres
+        PERFORM pg_notify('hospital_live', id) FROM unnest(ids) AS id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS live_notify_ins ON public.hospital_live_dashboard;
+DROP TRIGGER IF EXISTS live_notify_upd ON public.hospital_live_dashboard;
+DROP TRIGGER IF EXISTS live_notify_del ON public.hospital_live_dashboard;
+DROP TRIGGER IF EXISTS live_notify_trunc ON public.hospital_live_dashboard;
+
+CREATE TRIGGER live_notify_ins AFTER INSERT ON public.hospital_live_dashboard
+    REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+    EXECUTE FUNCTION public.hospital_live_notify();
+CREATE TRIGGER live_notify_upd AFTER UPDATE ON public.hospital_live_dashboard
+    REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+    EXECUTE FUNCTION public.hospital_live_notify();
+CREATE TRIGGER live_notify_del AFTER DELETE ON public.hospital_live_dashboard
+    REFERENCING OLD TABLE AS changed FOR EACH STATEMENT
+    EXECUTE FUNCTION public.hospital_live_notify();
+CREATE TRIGGER live_notify_trunc AFTER TRUNCATE ON public.hospital_live_dashboard
+    FOR EACH STATEMENT EXECUTE FUNCTION public.hospital_live_notify();
+
+-- One row per facility per time bucket; beds_occupied / oxygen_percent are the last values seen
+-- Daily RANGE partitions on recorded_at (created ahead / retired by history_retention.py)
 CREATE TABLE IF NOT EXISTS public.hospital_history (
-    id serial PRIMARY KEY,
+    id bigserial,
     facility_id text NOT NULL,
     beds_occupied integer,
+    beds_min integer,
+    beds_max integer,
     oxygen_percent double precision,
-    recorded_at timestamp without time zone DEFAULT now()
-);
+    oxygen_min double precision,
+    oxygen_max double precision,
+    recorded_at timestamp without time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (recorded_at, id)
+) PARTITION BY RANGE (recorded_at);
+
+CREATE TABLE IF NOT EXISTS public.hospital_history_default PARTITION OF public.hospital_history DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_history_facility_time
+    ON public.hospital_history (facility_id, recorded_at DESC)
+    INCLUDE (beds_occupied, oxygen_percent);
+
+-- Creates one partition per day in [from_day, to_day]; returns how many were new.
+-- Rows that already landed in the default partition for such a day would make
+-- CREATE ... PARTITION OF fail, so the default is detached, the day is created,
+-- its rows are moved over, and the default is reattached (all in the caller's
+-- transaction, which holds writers off until it commits).
+CREATE OR REPLACE FUNCTION public.hospital_history_ensure_partitions(from_day date, to_day date)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    day date := from_day;
+    created integer := 0;
+    part text;
+    default_detached boolean := false;
+BEGIN
+    WHILE day <= to_day LOOP
+        part := 'hospital_history_p' || to_char(day, 'YYYYMMDD');
+        IF to_regclass('public.' || part) IS NULL THEN
+            IF NOT default_detached AND EXISTS (
+                SELECT 1 FROM public.hospital_history_default
+                WHERE recorded_at >= day AND recorded_at < day + 1
+            ) THEN
+                ALTER TABLE public.hospital_history DETACH PARTITION public.hospital_history_default;
+                default_detached := true;
+            END IF;
+
+            EXECUTE format(
+                'CREATE TABLE public.%I PARTITION OF public.hospital_history FOR VALUES FROM (%L) TO (%L)',
+                part, day, day + 1
+            );
+            created := created + 1;
+
+            IF default_detached THEN
+                WITH moved AS (
+                    DELETE FROM public.hospital_history_default
+                    WHERE recorded_at >= day AND recorded_at < day + 1
+                    RETURNING id, facility_id, beds_occupied, beds_min, beds_max,
+                              oxygen_percent, oxygen_min, oxygen_max, recorded_at
+                )
+                INSERT INTO public.hospital_history (
+                    id, facility_id, beds_occupied, beds_min, beds_max,
+                    oxygen_percent, oxygen_min, oxygen_max, recorded_at
+                )
+                SELECT * FROM moved;
+            END IF;
+        END IF;
+        day := day + 1;
+    END LOOP;
+
+    IF default_detached THEN
+        ALTER TABLE public.hospital_history ATTACH PARTITION public.hospital_history_default DEFAULT;
+    END IF;
+    RETURN created;
+END;
+$$;
+
+SELECT public.hospital_history_ensure_partitions(current_date, current_date + 7);
 
 CREATE TABLE IF NOT EXISTS public.hospital_resources (
     facility_id text NOT NULL,
@@ -61,6 +308,21 @@ CREATE TABLE IF NOT EXISTS public.hospital_network_messages (
     created_at timestamp without time zone DEFAULT now()
 );
 
+-- NOTIFY 'hospital_network' <id> for the API's push gateway (see migrations/006_network_notify)
+CREATE OR REPLACE FUNCTION public.hospital_network_notify()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('hospital_network', NEW.id::text);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS network_notify_ins ON public.hospital_network_messages;
+
+CREATE TRIGGER network_notify_ins AFTER INSERT ON public.hospital_network_messages
+    FOR EACH ROW EXECUTE FUNCTION public.hospital_network_notify();
+
 CREATE TABLE IF NOT EXISTS public.incoming_admissions (
     id serial PRIMARY KEY,
     ambulance_id varchar(50),
@@ -0,0 +1,162 @@
+"""
+Shard Ring — Phase 4
+Splits facilities across several state updater instances.
+
+Every instance subscribes to the same raw topics and keeps only the
+facilities it owns on a consistent hash ring, so all readings for a
+facility go through exactly one instance and stay in order. When an
+instance joins or leaves, only ~1/N of the facilities move.
+
+Membership is tracked over MQTT itself: each instance publishes a
+retained presence message on {group}/members/{member_id}, with a Last
+Will that clears it, so a crashed instance drops out once the broker
+notices. Changes settle for REBALANCE_SETTLE_SECONDS before the ring
+is rebuilt, so a burst of joins causes one rebalance.
+
+After a rebalance each member commits what it still had buffered for the
+facilities it lost and then announces it on {group}/handoff/{member_id};
+a member taking facilities over waits for their previous owners'
+announcements (wait_for_handoff) before reading their rows.
+
+MQTT shared subscriptions ($share/...) were not used: they balance
+per message, not per facility, which would break per-facility ordering.
+"""
+
+import bisect
+import hashlib
+import json
+import threading
+import time
+
+VNODES = 128                  # Points per member on the ring
+REBALANCE_SETTLE_SECONDS = 1.0
+HANDOFF_TIMEOUT_SECONDS = 10.0  # Give up on a peer that never announces (e.g. an older version)
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Immutable consistent hash ring; build a new one when membership changes."""
+
+    def __init__(self, members=(), vnodes=VNODES):
+        self.members = frozenset(members)
+        points = sorted((_hash(f"{m}#{i}"), m) for m in self.members for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [m for _, m in points]
+        self._cache = {}   # facility_id -> member
+
+    def owner(self, key):
+        member = self._cache.get(key)
+        if member is None and self._hashes:
+            i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+            member = self._cache[key] = self._owners[i]
+        return member
+
+
+class ShardMembership:
+    """
+    Tracks live members of a group over MQTT and keeps a HashRing of them.
+    Call install() before client.connect(); route the client's on_connect
+    and membership messages to on_connect() / on_message().
+    on_change(old_ring, new_ring) runs on a timer thread after each rebalance.
+    """
+
+    def __init__(self, group, member_id, on_change=None, settle_seconds=REBALANCE_SETTLE_SECONDS):
+        self.group = group
+        self.member_id = member_id
+        self.topic = f"{group}/members/{member_id}"
+        self.on_change = on_change
+        self.settle_seconds = settle_seconds
+        self.members = {member_id}
+        self.ring = HashRing(self.members)
+        self.rebalances = 0
+        self._lock = threading.Lock()
+        self._handoff_cond = threading.Condition(self._lock)
+        self._handoffs = {}     # member_id -> ring members it last handed off for
+        self._timer = None
+        self._client = None
+
+    def owns(self, facility_id):
+        return self.ring.owner(facility_id) == self.member_id
+
+    def is_membership_topic(self, topic):
+        return topic.startswith((f"{self.group}/members/", f"{self.group}/handoff/"))
+
+    # -------- MQTT --------
+
+    def install(self, client):
+        # Retained empty payload = "member gone"; the broker publishes it if we vanish
+        client.will_set(self.topic, payload=b"", qos=1, retain=True)
+        self._client = client
+
+    def on_connect(self, client):
+        client.subscribe(f"{self.group}/members/+", qos=1)
+        client.subscribe(f"{self.group}/handoff/+", qos=1)
+        client.publish(self.topic, json.dumps({"member_id": self.member_id, "joined_at": time.time()}),
+                       qos=1, retain=True)
+
+    def leave(self, client, timeout=2.0):
+        """
+        Graceful shutdown: clear our presence so peers rebalance right away.
+        Drives the network loop itself, since it is usually called after loop_forever() returned.
+        """
+        info = client.publish(self.topic, b"", qos=1, retain=True)
+        if info.rc != 0:
+            return
+        deadline = time.monotonic() + timeout
+        while not info.is_published() and time.monotonic() < deadline:
+            client.loop(0.1)
+
+    def announce_handoff(self, ring):
+        """Tells peers that everything we buffered under the previous ring is committed."""
+        if self._client is not None:
+            self._client.publish(f"{self.group}/handoff/{self.member_id}",
+                                 json.dumps({"members": sorted(ring.members)}), qos=1)
+
+    def wait_for_handoff(self, members, ring, timeout=HANDOFF_TIMEOUT_SECONDS):
+        """
+        Blocks until each of members has announced its hand-off for ring.
+        Members that left the ring are not waited for: a graceful leaver commits
+        before clearing its presence, and a crashed one has nothing left to commit.
+        Returns the members that did not announce in time.
+        """
+        expected = frozenset(ring.members)
+        waiting = {m for m in members if m in expected and m != self.member_id}
+        deadline = time.monotonic() + timeout
+        with self._handoff_cond:
+            while True:
+                waiting = {m for m in waiting if self._handoffs.get(m) != expected}
+                remaining = deadline - time.monotonic()
+                if not waiting or remaining <= 0:
+                    return waiting
+                self._handoff_cond.wait(remaining)
+
+    def on_message(self, msg):
+        member_id = msg.topic.rsplit("/", 1)[1]
+        if msg.topic.startswith(f"{self.group}/handoff/"):
+            with self._handoff_cond:
+                self._handoffs[member_id] = frozenset(json.loads(msg.payload)["members"])
+                self._handoff_cond.notify_all()
+            return
+        with self._lock:
+            if msg.payload:
+                self.members.add(member_id)
+            elif member_id != self.member_id:
+                self.members.discard(member_id)
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.settle_seconds, self._rebalance)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _rebalance(self):
+        with self._lock:
+            if self.members == self.ring.members:
+                return
+            old, self.ring = self.ring, HashRing(self.members)
+            self.rebalances += 1
+        print(f"🔀 Rebalanced: {len(self.ring.members)} members {sorted(self.ring.members)}")
+        if self.on_change:
+            self.on_change(old, self.ring)
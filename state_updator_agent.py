@@ -1,7 +1,30 @@
-import json
+"""
+State Updater — Phase 4
+Applies raw sensor readings to hospital_resources / hospital_state / hospital_history.
+
+Several instances can run side by side: facilities are split between them
+on a consistent hash ring (see shard_ring.py) and rebalance when an
+instance joins or leaves.
+
+Usage:
+    python state_updator_agent.py                       # single instance
+    python state_updator_agent.py --member-id updater-2 # one of N instances
+"""
+
+import argparse
+import os
+import socket
 import time
-import psycopg2
-import paho.mqtt.client as mqtt
+import threading
+
+import tracing
+import transport
+import wire_format
+from facility_aggregates import FacilityAggregates
+from history_writer import HistoryBucketWriter
+from ingest_queue import IngestQueue
+from shard_ring import HANDOFF_TIMEOUT_SECONDS, ShardMembership
+from write_behind import WriteBehindBuffer, create_pool
 
 # -------- CONFIG --------
 BROKER = "localhost"
@@ -18,95 +41,164 @@ DB_PARAMS = {
 }
 
 # -------- DATABASE CONNECTION --------
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(**DB_PARAMS)
-        return conn
-    except Exception as e:
-        print(f"Connection failed: {e}")
-        return None
+# One persistent pool for the whole agent; readings are written behind
+# the MQTT thread in batches (see write_behind.py).
+db_pool = None
+writer = None
+
+STATS_INTERVAL_SECONDS = 30
+
+# Readings are handed from the MQTT thread to worker threads (see ingest_queue.py).
+# Only the latest reading per resource matters for state, so under overload
+# pending readings are coalesced rather than stalling the network loop.
+INGEST_WORKERS = 4
+INGEST_QUEUE_MAX = 20000
+INGEST_POLICY = "coalesce_latest"
+ingest = None
+
+# Facility ownership across updater instances
+SHARD_GROUP = "state_updater"
+shard = None
+skipped = 0
+
+# Facilities taken over in a rebalance are not applied until their previous
+# owner has committed and they are seeded: readings for them are held here
+# (latest per resource) and replayed once the aggregates cover seeded_ring.
+seeded_ring = None
+handover = {}             # facility_id -> {(resource_type, resource_id): ingest item}
+handover_lock = threading.Lock()
+rebalance_lock = threading.Lock()
+
+# Reading handling time, and source -> DB commit ages (fed by the writer)
+latency = tracing.LatencyRecorder("state_updator")
+commit_latency = tracing.LatencyRecorder("state_updator_commit")
 
 # -------- LOGIC --------
 
-def update_resource_state(conn, facility_id, resource_type, resource_id, value):
-    cursor = conn.cursor()
-    try:
-        # 1. UPSERT: Update the specific resource
-        cursor.execute("""
-            INSERT INTO hospital_resources (facility_id, resource_type, resource_id, current_value, updated_at)
-            VALUES (%s, %s, %s, %s, now())
-            ON CONFLICT (facility_id, resource_type, resource_id) 
-            DO UPDATE SET current_value = EXCLUDED.current_value, updated_at = now();
-        """, (facility_id, resource_type, resource_id, value))
-
-        # 2. AGGREGATE & HISTORY
-        if resource_type == 'OXYGEN':
-            cursor.execute("""
-                SELECT AVG(current_value) FROM hospital_resources 
-                WHERE facility_id = %s AND resource_type = 'OXYGEN'
-            """, (facility_id,))
-            avg_pressure = cursor.fetchone()[0] or 0
-            new_percent = min(100.0, max(0.0, (avg_pressure / 2000.0) * 100.0))
-            
-            # Update Main State
-            status = 'NORMAL' if new_percent > 30 else 'CRITICAL' if new_percent < 30 else 'WARNING'
-            cursor.execute("""
-                UPDATE hospital_state 
-                SET oxygen_percent = %s, oxygen_status = %s, last_updated = now()
-                WHERE facility_id = %s
-            """, (new_percent, status, facility_id))
-            
-            # --- NEW: SAVE SNAPSHOT FOR GRAPH ---
-            # We fetch current beds to keep the row complete
-            cursor.execute("SELECT beds_occupied FROM hospital_state WHERE facility_id = %s", (facility_id,))
-            current_beds = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                INSERT INTO hospital_history (facility_id, beds_occupied, oxygen_percent, recorded_at)
-                VALUES (%s, %s, %s, now())
-            """, (facility_id, current_beds, new_percent))
-
-        elif resource_type == 'BED':
-            cursor.execute("""
-                SELECT COUNT(*) FROM hospital_resources 
-                WHERE facility_id = %s AND resource_type = 'BED' AND current_value > 10
-            """, (facility_id,))
-            occupied_count = cursor.fetchone()[0] or 0
-            
-            # Update Main State
-            cursor.execute("""
-                UPDATE hospital_state 
-                SET beds_occupied = %s, last_updated = now()
-                WHERE facility_id = %s
-            """, (occupied_count, facility_id))
-
-            # --- NEW: SAVE SNAPSHOT FOR GRAPH ---
-            # Fetch current oxygen to keep row complete
-            cursor.execute("SELECT oxygen_percent FROM hospital_state WHERE facility_id = %s", (facility_id,))
-            current_oxy = cursor.fetchone()[0]
-
-            cursor.execute("""
-                INSERT INTO hospital_history (facility_id, beds_occupied, oxygen_percent, recorded_at)
-                VALUES (%s, %s, %s, now())
-            """, (facility_id, occupied_count, current_oxy))
+# Running per-facility sums/tallies, seeded from hospital_resources at startup
+aggregates = FacilityAggregates()
+
+# At most one hospital_history row per facility per bucket
+HISTORY_BUCKET_SECONDS = 10
+history = HistoryBucketWriter(HISTORY_BUCKET_SECONDS)
+
 
+def seed_aggregates(facility_ids=None):
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            count = aggregates.seed(cursor, facility_ids)
         conn.commit()
-    except Exception as e:
-        print(f"❌ DB Logic Error: {e}")
-        conn.rollback()
+        print(f"✓ Seeded aggregates from {count} resources")
+    finally:
+        db_pool.putconn(conn)
+
+
+def on_rebalance(old_ring, new_ring):
+    """Hands facilities over after membership changed (runs on the shard timer thread)."""
+    global seeded_ring
+    with rebalance_lock:
+        me = shard.member_id
+        held = aggregates.facilities()
+        lost = {f for f in held if new_ring.owner(f) != me}
+        if lost:
+            # Close their history buckets and forget them; the new owner reseeds from the DB
+            writer.put_history(history.flush_expired(force=True, facility_ids=lost))
+            aggregates.drop(lost)
+
+        # Everything we queued for the lost facilities commits before their new owners read it
+        if not writer.barrier(HANDOFF_TIMEOUT_SECONDS):
+            print("⚠️ Write-behind did not drain before hand-off")
+        shard.announce_handoff(new_ring)
+
+        facilities, gained = [], []
+        try:
+            facilities = known_facilities()
+            gained = [f for f in facilities if new_ring.owner(f) == me and seeded_ring.owner(f) != me]
+            if gained:
+                late = shard.wait_for_handoff({seeded_ring.owner(f) for f in gained}, new_ring)
+                if late:
+                    print(f"⚠️ No hand-off from {sorted(late)}, seeding anyway")
+                seed_aggregates(gained)
+        except Exception as e:
+            # Still release the held readings below rather than holding them forever
+            print(f"❌ Seeding taken-over facilities failed: {e}")
+
+        # Replay what was held, before any newer reading for those facilities gets through
+        with handover_lock:
+            seeded_ring = new_ring
+            for facility_id in list(handover):
+                items = handover.pop(facility_id)
+                if shard.owns(facility_id):
+                    for item in items.values():
+                        apply_reading(item)
+        print(f"🔀 Handed off {len(lost)} facilities, took over {len(gained)}, now owning "
+              f"{sum(1 for f in facilities if shard.owns(f))}")
+
+
+def known_facilities():
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT facility_id FROM hospital_state")
+            return [row[0] for row in cursor.fetchall()]
     finally:
-        cursor.close()
+        db_pool.putconn(conn)
+
+
+def update_resource_state(facility_id, resource_type, resource_id, value, source_ts=None):
+    # 1. UPSERT: buffered, flushed in bulk by the write-behind thread
+    writer.put_resource(facility_id, resource_type, resource_id, value, source_ts)
+
+    # 2. AGGREGATE: O(1) in memory, only changed columns are written
+    changed = aggregates.apply(facility_id, resource_type, resource_id, value)
+    if changed:
+        writer.put_state(facility_id, changed)
+
+    # 3. HISTORY: fold into the facility's time bucket; closed buckets are written
+    if resource_type in ('BED', 'OXYGEN'):
+        snapshot = aggregates.snapshot(facility_id)
+        closed = history.observe(facility_id, snapshot["beds_occupied"], snapshot["oxygen_percent"])
+        if closed:
+            writer.put_history(closed)
+
+
+def process_reading(item):
+    """Ingest worker: runs off the MQTT thread, in per-facility order."""
+    facility_id, resource_type, resource_id = item[:3]
+    if not shard.owns(facility_id):
+        return   # Queued before a rebalance moved the facility elsewhere
+    with handover_lock:
+        if seeded_ring.owner(facility_id) != shard.member_id:
+            # Taken over but not seeded yet: hold the latest reading per resource
+            handover.setdefault(facility_id, {})[(resource_type, resource_id)] = item
+            return
+    apply_reading(item)
+
+
+def apply_reading(item):
+    facility_id, resource_type, resource_id, value, trace, started = item
+    update_resource_state(facility_id, resource_type, resource_id, value,
+                          trace["ts"] if trace else None)
+    latency.record(trace, started)
 
 # -------- MQTT HANDLERS --------
 
 def on_message(client, userdata, msg):
-    conn = get_db_connection()
-    if not conn:
-        print("❌ Failed to connect to database")
+    global skipped
+    if shard.is_membership_topic(msg.topic):
+        shard.on_message(msg)
+        return
+
+    # hospital/{facility_id}/{resource}/raw — drop other instances' facilities before decoding
+    if not shard.owns(msg.topic.split('/', 2)[1]):
+        skipped += 1
         return
 
+    # Network thread: decode and enqueue only, never touch the DB here
+    started = time.perf_counter()
     try:
-        payload = json.loads(msg.payload.decode())
+        payload = wire_format.decode(msg.payload)
         
         facility_id = payload.get('facility_id')
         resource_type = payload.get('resource_type') # "BED" or "OXYGEN"
@@ -114,26 +206,102 @@ def on_message(client, userdata, msg):
         raw_value = payload.get('raw_value')
 
         if facility_id and resource_type and resource_id is not None:
-            update_resource_state(conn, facility_id, resource_type, resource_id, float(raw_value))
+            ingest.put(facility_id, (facility_id, resource_type, resource_id),
+                       (facility_id, resource_type, resource_id, float(raw_value),
+                        payload.get('trace'), started))
         
     except Exception as e:
         print(f"❌ Processing Error: {e}")
-    finally:
-        conn.close()
 
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
-        print("✓ Smart State-Updater Connected. Tracking individual resources...")
+        print(f"✓ Smart State-Updater {shard.member_id} Connected. Tracking individual resources...")
         client.subscribe(TOPIC)
+        shard.on_connect(client)
     else:
         print(f"❌ Connection failed with code {rc}")
 
+# -------- PERIODIC TASKS --------
+
+def history_loop():
+    """Close history buckets for facilities that went quiet"""
+    while True:
+        time.sleep(1)
+        closed = history.flush_expired()
+        if closed:
+            writer.put_history(closed)
+
+def stats_loop():
+    """Print write-behind throughput and flush latency every STATS_INTERVAL_SECONDS"""
+    while True:
+        time.sleep(STATS_INTERVAL_SECONDS)
+        s = writer.stats()
+        print(f"📈 Writer: {s['enqueued_per_sec']} readings/s in, {s['rows_written_per_sec']} rows/s out, "
+              f"queue={s['queue_depth']}, flushes={s['flushes']}, "
+              f"flush avg/max={s['flush_ms_avg']}/{s['flush_ms_max']:.1f} ms, errors={s['flush_errors']}, "
+              f"retries={s['flush_retries']}, dropped={s['rows_dropped']} rows")
+        q = ingest.stats()
+        print(f"📥 Ingest ({q['policy']}): depth={q['depth']} (high water {q['high_water']}/lane), "
+              f"processed={q['processed']}, coalesced={q['coalesced']}, dropped={q['dropped']}, "
+              f"blocked={q['blocked']}, errors={q['errors']}")
+        print(f"🔀 Shard: {len(shard.ring.members)} members, {skipped} readings skipped for other members, "
+              f"{shard.rebalances} rebalances")
+
 # -------- MAIN --------
 
-if __name__ == "__main__":
-    client = mqtt.Client()
+def start(member_id):
+    """Opens the pool, seeds aggregates and starts the workers; returns the (unconnected) client."""
+    global db_pool, writer, ingest, shard, seeded_ring
+    shard = ShardMembership(SHARD_GROUP, member_id, on_change=on_rebalance)
+
+    try:
+        db_pool = create_pool(DB_PARAMS)
+    except Exception as e:
+        print(f"❌ Database pool failed: {e}")
+        raise
+
+    try:
+        seed_aggregates()
+    except Exception as e:
+        print(f"❌ Aggregate seeding failed: {e}")
+        raise
+    seeded_ring = shard.ring
+
+    writer = WriteBehindBuffer(db_pool, latency=commit_latency, on_drop=aggregates.forget_written)
+    writer.start()
+    ingest = IngestQueue(process_reading, INGEST_WORKERS, INGEST_QUEUE_MAX, INGEST_POLICY, name="ingest")
+    ingest.start()
+    latency.start_exporter()
+    commit_latency.start_exporter()
+    threading.Thread(target=history_loop, daemon=True).start()
+    threading.Thread(target=stats_loop, daemon=True).start()
+
+    client = transport.create_client(client_id=f"state-updater-{member_id}")
     client.on_connect = on_connect
     client.on_message = on_message
+    shard.install(client)
+    return client
+
+
+def stop(client):
+    """Flushes everything still buffered, then leaves the shard group so peers read committed rows."""
+    ingest.stop()
+    writer.put_history(history.flush_expired(force=True))
+    writer.stop()
+    shard.leave(client)
+    db_pool.closeall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sensor state updater")
+    parser.add_argument("--member-id", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="Unique id of this instance in the shard group")
+    args = parser.parse_args()
+
+    try:
+        client = start(args.member_id)
+    except Exception:
+        exit(1)
     
     try:
         client.connect(BROKER, 1883, 60)
@@ -141,4 +309,6 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\n✓ Stopping agent...")
     except Exception as e:
-        print(f"❌ MQTT Error: {e}")
\ No newline at end of file
+        print(f"❌ MQTT Error: {e}")
+    finally:
+        stop(client)
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""
+Stream Processor — Phase 4
+One runtime for all sensor preprocessors.
+Handlers are registered by topic pattern and share a single MQTT
+connection and decode path (JSON or binary, see wire_format.py).
+Facilities are split across N worker partitions (one process each)
+by a stable hash of the facility id. Within a partition, handlers run
+on ingest worker threads (see ingest_queue.py), not on the MQTT thread.
+
+Usage:
+    python stream_processor.py                  # 1 partition
+    python stream_processor.py --partitions 4   # 4 processes, one per core
+    python stream_processor.py --workers 8 --policy drop_oldest
+"""
+
+import argparse
+import multiprocessing
+import threading
+import time
+import zlib
+import paho.mqtt.client as mqtt
+
+import bed_preprocessor
+import ingest_queue
+import oxygen_preprocessing
+import tracing
+import transport
+import ventilator_preprocessing
+import wire_format
+
+BROKER = "localhost"
+STATS_INTERVAL_SECONDS = 30
+
+# (topic pattern, handler name, handler) — handler(data) -> [(topic, event), ...]
+HANDLERS = []
+
+
+def register(pattern, name, handler):
+    """Registers a per-resource handler for every raw topic matching pattern."""
+    HANDLERS.append((pattern, name, handler))
+
+
+register("hospital/+/bed/raw", "bed", bed_preprocessor.process_reading)
+register("hospital/+/ventilator/raw", "ventilator", ventilator_preprocessing.process_reading)
+register("hospital/+/oxygen/raw", "oxygen", oxygen_preprocessing.process_reading)
+
+
+def partition_of(facility_id, partitions):
+    """Stable facility -> partition mapping (same answer in every process)."""
+    return zlib.crc32(facility_id.encode()) % partitions
+
+
+class StreamProcessor:
+    def __init__(self, partition=0, partitions=1, workers=ingest_queue.INGEST_WORKERS, policy="block"):
+        self.partition = partition
+        self.partitions = partitions
+        self.route_cache = {}   # topic -> (name, handler) or None
+        self.stats = {name: {"messages": 0, "events": 0, "errors": 0, "seconds": 0.0}
+                      for _, name, _ in HANDLERS}
+        self._stats_lock = threading.Lock()   # stats is updated by every ingest worker
+        self.latency = {name: tracing.LatencyRecorder(f"stream_{name}_p{partition}")
+                        for _, name, _ in HANDLERS}
+        self.skipped = 0
+        self.started_at = time.monotonic()
+        self.client = None
+        # Debouncing needs every sample, so the default overload policy is to block
+        self.ingest = ingest_queue.IngestQueue(self.process, workers, policy=policy,
+                                               name=f"stream-p{partition}")
+
+    def route(self, topic):
+        """Resolves a topic to its handler once, then serves it from cache."""
+        if topic not in self.route_cache:
+            self.route_cache[topic] = next(
+                ((name, handler) for pattern, name, handler in HANDLERS
+                 if mqtt.topic_matches_sub(pattern, topic)),
+                None,
+            )
+        return self.route_cache[topic]
+
+    def owns(self, topic):
+        # hospital/{facility_id}/{resource}/raw — partition on the topic, before decoding
+        if self.partitions == 1:
+            return True
+        facility_id = topic.split("/", 2)[1]
+        return partition_of(facility_id, self.partitions) == self.partition
+
+    # -------- MQTT HANDLERS --------
+
+    def on_message(self, client, userdata, msg):
+        if not self.owns(msg.topic):
+            self.skipped += 1
+            return
+
+        routed = self.route(msg.topic)
+        if routed is None:
+            return
+        name, handler = routed
+
+        started = time.perf_counter()
+        try:
+            data = wire_format.decode(msg.payload)
+            facility_id = data["facility_id"]
+            self.ingest.put(facility_id, (facility_id, name, data["resource_id"]),
+                            (name, handler, data, started))
+        except Exception as e:
+            with self._stats_lock:
+                self.stats[name]["errors"] += 1
+            print(f"[p{self.partition}] {name} decode error: {e}")
+
+    def process(self, item):
+        """Ingest worker: runs the handler and publishes its events."""
+        name, handler, data, started = item
+        handler_started = time.perf_counter()
+        events = errors = 0
+        try:
+            for topic, event in handler(data):
+                self.client.publish(topic, wire_format.encode_event(event))
+                events += 1
+            self.latency[name].record(data.get("trace"), started)
+        except Exception as e:
+            errors = 1
+            print(f"[p{self.partition}] {name} handler error: {e}")
+        elapsed = time.perf_counter() - handler_started
+        with self._stats_lock:
+            stats = self.stats[name]
+            stats["events"] += events
+            stats["errors"] += errors
+            stats["messages"] += 1
+            stats["seconds"] += elapsed
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            print(f"[p{self.partition}] Connection failed with code {rc}")
+            return
+        print(f"[p{self.partition}] Stream Processor connected ({self.partitions} partitions)")
+        for pattern, _, _ in HANDLERS:
+            client.subscribe(pattern)
+
+    # -------- PERIODIC STATS --------
+
+    def print_stats(self):
+        uptime = max(time.monotonic() - self.started_at, 1e-9)
+        print(f"\n[p{self.partition}] 📈 HANDLER THROUGHPUT (skipped {self.skipped} for other partitions)")
+        with self._stats_lock:
+            snapshot = {name: dict(s) for name, s in self.stats.items()}
+        for name, s in snapshot.items():
+            avg_us = (s["seconds"] / s["messages"] * 1e6) if s["messages"] else 0.0
+            print(f"  {name:<11} {s['messages'] / uptime:8.1f} msg/s  {s['events']:>8} events  "
+                  f"{s['errors']:>5} errors  {avg_us:7.1f} µs/msg")
+        q = self.ingest.stats()
+        print(f"  ingest ({q['policy']}): depth={q['depth']} high water={q['high_water']}/lane "
+              f"dropped={q['dropped']} coalesced={q['coalesced']} blocked={q['blocked']}")
+
+    def stats_loop(self):
+        while True:
+            time.sleep(STATS_INTERVAL_SECONDS)
+            self.print_stats()
+
+    def run(self):
+        self.client = transport.create_client(client_id=f"stream-processor-{self.partition}-of-{self.partitions}")
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.connect(BROKER, 1883, 60)
+        self.ingest.start()
+        threading.Thread(target=self.stats_loop, daemon=True).start()
+        for recorder in self.latency.values():
+            recorder.start_exporter()
+
+        try:
+            self.client.loop_forever()
+        except KeyboardInterrupt:
+            self.ingest.stop()
+            self.print_stats()
+            print(f"[p{self.partition}] Stream Processor stopped.")
+
+
+def run_partition(partition, partitions, workers=ingest_queue.INGEST_WORKERS, policy="block"):
+    StreamProcessor(partition, partitions, workers, policy).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-sensor stream processor")
+    parser.add_argument("--partitions", type=int, default=1, help="Worker processes to run")
+    parser.add_argument("--workers", type=int, default=ingest_queue.INGEST_WORKERS,
+                        help="Handler threads per partition")
+    parser.add_argument("--policy", choices=ingest_queue.POLICIES, default="block",
+                        help="What to do when a handler lane is full")
+    args = parser.parse_args()
+
+    if args.partitions == 1:
+        run_partition(0, 1, args.workers, args.policy)
+    else:
+        workers = [
+            multiprocessing.Process(target=run_partition, args=(i, args.partitions, args.workers, args.policy))
+            for i in range(args.partitions)
+        ]
+        for w in workers:
+            w.start()
+        try:
+            for w in workers:
+                w.join()
+        except KeyboardInterrupt:
+            print("Stream Processor stopped.")
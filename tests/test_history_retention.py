@@ -0,0 +1,81 @@
+"""
+Partition maintenance for hospital_history (history_retention.py, schema.sql).
+
+Run from the repository root:
+    python -m pytest tests
+
+The database test needs a scratch Postgres with schema.sql applied, given as a
+libpq DSN in HOSPITAL_TEST_DSN; it is skipped otherwise. Everything it does runs
+in one transaction that is rolled back.
+"""
+
+import os
+from datetime import date, timedelta
+
+import pytest
+
+import history_retention
+
+
+class FakeCursor:
+    def __init__(self, oldest_default_day):
+        self.oldest = oldest_default_day
+        self.calls = []
+
+    def execute(self, query, params=None):
+        self.calls.append(params)
+
+    def fetchone(self):
+        return (self.oldest,) if len(self.calls) == 1 else (0,)
+
+
+@pytest.mark.parametrize("oldest, expected", [
+    (None, date.today()),                                   # Default partition empty
+    (date.today() - timedelta(days=3), date.today() - timedelta(days=3)),
+    (date.today() - timedelta(days=400), date.today() - timedelta(days=30)),
+    (date.today() + timedelta(days=30), date.today()),      # Beyond the ahead window: left alone
+])
+def test_ensure_starts_at_oldest_default_day_within_retention(oldest, expected):
+    cursor = FakeCursor(oldest)
+    history_retention.ensure_future_partitions(cursor, 7, date.today() - timedelta(days=30))
+    assert cursor.calls[-1] == (expected, 7)
+
+
+@pytest.fixture
+def db_cursor():
+    dsn = os.environ.get("HOSPITAL_TEST_DSN")
+    if not dsn:
+        pytest.skip("HOSPITAL_TEST_DSN not set")
+    conn = history_retention.psycopg2.connect(dsn)
+    try:
+        yield conn.cursor()
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def test_ensure_moves_default_rows_into_new_partition(db_cursor):
+    day = date(2099, 1, 1)   # Far enough ahead that no partition exists for it
+    db_cursor.execute("""
+        INSERT INTO public.hospital_history (facility_id, beds_occupied, recorded_at)
+        VALUES ('TEST-1', 10, %s::date + time '08:00'),
+               ('TEST-1', 11, %s::date + time '23:59'),
+               ('TEST-1', 12, %s::date + 1 + time '00:30')
+    """, (day, day, day))
+
+    db_cursor.execute("SELECT public.hospital_history_ensure_partitions(%s, %s)", (day, day))
+    assert db_cursor.fetchone()[0] == 1
+
+    db_cursor.execute("SELECT beds_occupied FROM public.hospital_history_p20990101 ORDER BY recorded_at")
+    assert [row[0] for row in db_cursor.fetchall()] == [10, 11]
+
+    # The next day has no partition yet, so its row stays in the default
+    db_cursor.execute("SELECT beds_occupied FROM public.hospital_history_default WHERE facility_id = 'TEST-1'")
+    assert [row[0] for row in db_cursor.fetchall()] == [12]
+
+    db_cursor.execute("""
+        SELECT pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_class c
+        WHERE c.oid = 'public.hospital_history_default'::regclass AND c.relispartition
+    """)
+    assert db_cursor.fetchone() == ("DEFAULT",)
@@ -0,0 +1,145 @@
+"""
+Latency Tracing — Phase 4
+Source stamps and per-stage latency percentiles for the sensor pipeline.
+
+Simulators stamp each raw reading with {"ts": source wall-clock time,
+"seq": per-process sequence}. Every stage copies the stamp onto what it
+publishes and records two series in its own LatencyRecorder:
+    hop_ms  — time spent inside this stage
+    age_ms  — source timestamp -> this stage finished (end-to-end at DB writers)
+Recorders export p50/p95/p99 to TRACE_EXPORT_DIR/{stage}.json.
+
+Report across all stages:
+    python tracing.py
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import config
+
+SAMPLES = 10000   # Most recent samples kept per series
+
+_next_seq = 0
+_seq_lock = threading.Lock()
+
+
+def next_seq(count=1):
+    """Reserves `count` consecutive sequence numbers and returns the first."""
+    global _next_seq
+    with _seq_lock:
+        first = _next_seq
+        _next_seq += count
+    return first
+
+
+def stamp(payload):
+    """Adds a source trace stamp to a raw reading (no-op if tracing is off)."""
+    if config.TRACE_ENABLED:
+        payload["trace"] = {"ts": time.time(), "seq": next_seq()}
+    return payload
+
+
+def carry(source, target):
+    """Copies the trace stamp from an input message onto an output message."""
+    trace = source.get("trace")
+    if trace:
+        target["trace"] = trace
+    return target
+
+
+def oldest(a, b):
+    """The stamp with the earlier source time — used when messages are merged."""
+    if not a:
+        return b
+    if not b:
+        return a
+    return a if a["ts"] <= b["ts"] else b
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(values)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(math.ceil(p / 100.0 * len(ordered))) - 1)], 2)
+
+    return {"count": len(ordered), "p50": pct(50), "p95": pct(95), "p99": pct(99), "max": round(ordered[-1], 2)}
+
+
+class LatencyRecorder:
+    def __init__(self, stage, samples=SAMPLES):
+        self.stage = stage
+        self.hop_ms = deque(maxlen=samples)
+        self.age_ms = deque(maxlen=samples)
+        self.recorded = 0
+
+    def record(self, trace, started=None):
+        """started is a time.perf_counter() taken when the stage picked the message up."""
+        if started is not None:
+            self.hop_ms.append((time.perf_counter() - started) * 1000.0)
+        if trace:
+            self.age_ms.append((time.time() - trace["ts"]) * 1000.0)
+        self.recorded += 1
+
+    def record_ages(self, source_timestamps):
+        """End-to-end ages for a batch that just became durable (DB writers)."""
+        now = time.time()
+        self.age_ms.extend((now - ts) * 1000.0 for ts in source_timestamps)
+        self.recorded += len(source_timestamps)
+
+    def summary(self):
+        return {
+            "stage": self.stage,
+            "recorded": self.recorded,
+            "exported_at": time.time(),
+            "hop_ms": percentiles(list(self.hop_ms)),
+            "age_ms": percentiles(list(self.age_ms)),
+        }
+
+    def export(self, directory=None):
+        directory = directory or config.TRACE_EXPORT_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.stage}.json")
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+    def start_exporter(self, interval=None):
+        interval = interval or config.TRACE_EXPORT_SECONDS
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.export()
+                except Exception as e:
+                    print(f"⚠️  Latency export failed for {self.stage}: {e}")
+
+        threading.Thread(target=loop, name=f"trace-export-{self.stage}", daemon=True).start()
+
+
+def report(directory=None):
+    """Prints every exported stage, ordered by median age (pipeline order)."""
+    directory = directory or config.TRACE_EXPORT_DIR
+    stages = []
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                stages.append(json.load(f))
+
+    print(f"{'STAGE':<22}{'HOP p50/p95/p99 ms':>26}{'AGE p50/p95/p99 ms':>30}{'SAMPLES':>10}")
+    for s in sorted(stages, key=lambda s: s["age_ms"]["p50"]):
+        hop, age = s["hop_ms"], s["age_ms"]
+        hop_str = f"{hop['p50']}/{hop['p95']}/{hop['p99']}"
+        age_str = f"{age['p50']}/{age['p95']}/{age['p99']}"
+        print(f"{s['stage']:<22}{hop_str:>26}{age_str:>30}{age['count']:>10}")
+
+
+if __name__ == "__main__":
+    report()
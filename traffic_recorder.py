@@ -0,0 +1,283 @@
+"""
+Traffic Recorder — Phase 4
+Records MQTT sensor traffic to a compact append-only log and replays it,
+so pipeline versions can be benchmarked against identical traffic.
+
+Log format: the 8-byte MAGIC, then one record per message:
+    ts:f64 topic_len:u16 payload_len:u32 topic payload
+(big-endian, ts = wall-clock receive time). Payloads are stored exactly as
+received, so JSON and binary wire formats both round-trip. A record cut
+short by a crash is ignored on read. Replay reads the file through mmap.
+
+On replay, readings and events that carry a tracing stamp are restamped
+at publish time, so downstream LatencyRecorders (and the lag report
+here) measure the pipeline, not the age of the recording.
+
+Usage:
+    python traffic_recorder.py record traffic.log
+    python traffic_recorder.py info traffic.log
+    python traffic_recorder.py replay traffic.log --speed 10 --facility H001 --topic "hospital/+/bed/raw"
+    python traffic_recorder.py replay traffic.log --speed 0 --lag-topic hospital_delta/updates
+"""
+
+import argparse
+import mmap
+import struct
+import threading
+import time
+from collections import Counter, deque
+import paho.mqtt.client as mqtt
+
+import tracing
+import wire_format
+
+BROKER = "localhost"
+RECORD_TOPICS = ["hospital/#", "events/#"]
+LAG_TOPIC = "hospital_delta/updates"
+
+MAGIC = b"TZTRAF1\n"
+RECORD = struct.Struct(">dHI")
+FLUSH_SECONDS = 1.0
+REPORT_SECONDS = 5
+LAG_SAMPLES = 10000
+
+
+# -------- LOG FILE --------
+
+class TrafficLog:
+    """Append-only writer for the record format above."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.lock = threading.Lock()
+        self.records = 0
+        self.bytes = 0
+
+    def append(self, ts, topic, payload):
+        topic_bytes = topic.encode()
+        record = RECORD.pack(ts, len(topic_bytes), len(payload)) + topic_bytes + payload
+        with self.lock:
+            self.file.write(record)
+            self.records += 1
+            self.bytes += len(record)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_log(path):
+    """Yields (ts, topic, payload) from a log file via mmap; payload is bytes."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a traffic log")
+        if f.seek(0, 2) == len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            offset, end = len(MAGIC), len(buf)
+            topics = {}   # Interned topic strings
+            while offset + RECORD.size <= end:
+                ts, topic_len, payload_len = RECORD.unpack_from(buf, offset)
+                start = offset + RECORD.size
+                stop = start + topic_len + payload_len
+                if stop > end:
+                    break   # Truncated tail
+                raw_topic = buf[start:start + topic_len]
+                topic = topics.get(raw_topic)
+                if topic is None:
+                    topic = topics[raw_topic] = raw_topic.decode()
+                yield ts, topic, buf[start + topic_len:stop]
+                offset = stop
+
+
+# -------- RECORD --------
+
+def record(path, topics):
+    log = TrafficLog(path)
+
+    def on_connect(client, userdata, flags, rc):
+        if rc != 0:
+            print(f"❌ Connection failed with code {rc}")
+            return
+        for topic in topics:
+            client.subscribe(topic)
+        print(f"⏺  Recording {', '.join(topics)} to {path}")
+
+    def on_message(client, userdata, msg):
+        log.append(time.time(), msg.topic, msg.payload)
+
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(BROKER, 1883, 60)
+    client.loop_start()
+
+    last = 0
+    try:
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            log.flush()
+            if time.monotonic() - last >= REPORT_SECONDS:
+                last = time.monotonic()
+                print(f"  {log.records} messages, {log.bytes / 1e6:.1f} MB")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        log.close()
+        print(f"✓ Recorded {log.records} messages to {path}")
+
+
+def info(path):
+    count, size, first, last = 0, 0, None, None
+    topics = Counter()
+    for ts, topic, payload in read_log(path):
+        count += 1
+        size += len(payload)
+        first = ts if first is None else first
+        last = ts
+        topics[topic.split("/", 2)[0] + "/.../" + topic.rsplit("/", 1)[-1]] += 1
+    duration = (last - first) if count else 0.0
+    print(f"{path}: {count} messages over {duration:.1f}s "
+          f"({count / duration if duration else 0:.1f} msg/s), {size / 1e6:.1f} MB payload")
+    for name, n in topics.most_common():
+        print(f"  {name:<40}{n:>10}")
+
+
+# -------- REPLAY --------
+
+def restamp(topic, payload):
+    """Replaces a carried trace stamp with a fresh one, keeping the payload's wire format."""
+    if not payload or not (topic.endswith("/raw") or topic.startswith("events/")):
+        return payload
+    try:
+        data = wire_format.decode(payload)
+    except ValueError:
+        return payload
+    if "trace" not in data:
+        return payload
+    tracing.stamp(data)
+    fmt = "binary" if payload[0] == wire_format.MAGIC else "json"
+    return wire_format.encode_reading(data, fmt) if topic.endswith("/raw") else wire_format.encode_event(data, fmt)
+
+
+class LagMonitor:
+    """Source age of traced messages arriving on a downstream topic."""
+
+    def __init__(self):
+        self.ages_ms = deque(maxlen=LAG_SAMPLES)
+        self.received = 0
+
+    def on_message(self, client, userdata, msg):
+        try:
+            trace = wire_format.decode(msg.payload).get("trace")
+        except Exception:
+            return
+        self.received += 1
+        if trace:
+            self.ages_ms.append((time.time() - trace["ts"]) * 1000.0)
+
+
+def facility_of(topic, payload):
+    if topic.startswith("hospital/"):
+        return topic.split("/", 2)[1]
+    try:
+        return wire_format.decode(payload).get("facility_id")   # events/* carry it in the payload
+    except ValueError:
+        return None
+
+
+def replay(path, speed, facilities, topic_filters, lag_topic, restamp_traces=True):
+    lag = LagMonitor()
+    client = mqtt.Client()
+    if lag_topic:
+        client.message_callback_add(lag_topic, lag.on_message)
+        client.on_connect = lambda c, u, f, rc: c.subscribe(lag_topic)
+    client.connect(BROKER, 1883, 60)
+    client.loop_start()
+    if lag_topic:
+        time.sleep(0.5)   # Let the lag subscription land before traffic starts
+
+    facilities = set(facilities or [])
+    sent, skipped = 0, 0
+    started = time.monotonic()
+    last_report = started
+    first_ts = None
+    print(f"▶  Replaying {path} at {'max speed' if speed <= 0 else f'{speed:g}x'}")
+
+    try:
+        for ts, topic, payload in read_log(path):
+            if facilities and facility_of(topic, payload) not in facilities:
+                skipped += 1
+                continue
+            if topic_filters and not any(mqtt.topic_matches_sub(f, topic) for f in topic_filters):
+                skipped += 1
+                continue
+
+            if first_ts is None:
+                first_ts = ts
+            if speed > 0:
+                delay = (ts - first_ts) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+            if restamp_traces:
+                payload = restamp(topic, payload)
+            client.publish(topic, payload)
+            sent += 1
+
+            now = time.monotonic()
+            if now - last_report >= REPORT_SECONDS:
+                last_report = now
+                print(f"  {sent} sent, {sent / (now - started):.1f} msg/s, lag p50 "
+                      f"{tracing.percentiles(list(lag.ages_ms))['p50']} ms")
+    except KeyboardInterrupt:
+        print("Replay interrupted.")
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    recorded = (ts - first_ts) if first_ts is not None else 0.0
+    if lag_topic:
+        time.sleep(1.0)   # Let in-flight messages drain before the lag report
+    client.loop_stop()
+
+    lag_pct = tracing.percentiles(list(lag.ages_ms))
+    print(f"\n✓ Replayed {sent} messages ({skipped} filtered) in {elapsed:.1f}s — "
+          f"{sent / elapsed:.1f} msg/s achieved, {recorded / elapsed if recorded else 0:.1f}x recorded speed")
+    if lag_topic:
+        print(f"  Downstream lag on {lag_topic}: {lag.received} messages, "
+              f"p50/p95/p99 = {lag_pct['p50']}/{lag_pct['p95']}/{lag_pct['p99']} ms, max {lag_pct['max']} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay MQTT sensor traffic")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record", help="Capture traffic to a log file (appends)")
+    p.add_argument("path")
+    p.add_argument("--topic", action="append", help="Topic filter to record (repeatable)")
+
+    p = sub.add_parser("info", help="Summarize a log file")
+    p.add_argument("path")
+
+    p = sub.add_parser("replay", help="Republish a log file")
+    p.add_argument("path")
+    p.add_argument("--speed", type=float, default=1.0, help="1 = real time, N = N times faster, 0 = max")
+    p.add_argument("--facility", action="append", help="Only replay this facility (repeatable)")
+    p.add_argument("--topic", action="append", help="Only replay topics matching this filter (repeatable)")
+    p.add_argument("--lag-topic", default=LAG_TOPIC, help="Downstream topic to measure lag on ('' to disable)")
+    p.add_argument("--no-restamp", action="store_true", help="Keep the recorded trace stamps")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.path, args.topic or RECORD_TOPICS)
+    elif args.command == "info":
+        info(args.path)
+    else:
+        replay(args.path, args.speed, args.facility, args.topic, args.lag_topic, not args.no_restamp)
@@ -0,0 +1,264 @@
+"""
+Transport — Phase 4
+Pub/sub client factory for pipeline components.
+
+    client = transport.create_client("my-component")
+
+returns a paho MQTT client when config.TRANSPORT == "mqtt", or a
+LocalClient on the process-wide LocalBus when it is "local". LocalClient
+implements the subset of the paho client API the components use (callbacks,
+connect/subscribe/publish, the loop_* methods, message_callback_add,
+will_set), with the same topic wildcard semantics, so components
+composed in one process (see run_pipeline.py) skip the broker, sockets
+and the extra hops entirely.
+
+Like paho, each LocalClient runs its callbacks on its own loop thread;
+publish() never runs subscriber code on the caller's thread. Inboxes
+are bounded, so a slow subscriber applies backpressure to its
+publishers: they wait up to LOCAL_DELIVER_TIMEOUT, then the message is
+dropped and counted. A client's own loop thread never waits on its own
+inbox (it is the only thing that could drain it), so a full inbox drops
+self-delivered messages right away. Last Wills are accepted but never fired, since in-process
+clients cannot vanish without the process.
+"""
+
+import itertools
+import queue
+import threading
+import time
+import paho.mqtt.client as mqtt
+
+import config
+
+LOCAL_INBOX_MAX = 100000   # Pending messages per in-process client
+LOCAL_DELIVER_TIMEOUT = 5.0   # Seconds a publisher waits on a full inbox before dropping
+
+
+def create_client(client_id="", **kwargs):
+    if config.TRANSPORT == "local":
+        return LocalClient(client_id, bus=local_bus)
+    return mqtt.Client(client_id=client_id, **kwargs)
+
+
+class LocalMessage:
+    __slots__ = ("topic", "payload", "qos", "retain", "mid")
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+
+
+class LocalPublishInfo:
+    """Stand-in for paho's MQTTMessageInfo; in-process delivery is immediate."""
+
+    rc = mqtt.MQTT_ERR_SUCCESS
+
+    def __init__(self, mid):
+        self.mid = mid
+
+    def is_published(self):
+        return True
+
+    def wait_for_publish(self, timeout=None):
+        return None
+
+
+class LocalBus:
+    """In-process broker: subscriptions, retained messages and per-topic routing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}   # client -> set of topic filters
+        self._retained = {}        # topic -> LocalMessage
+        self._routes = {}          # topic -> [clients], rebuilt when subscriptions change
+        self._mid = itertools.count(1)
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, client, topic_filter):
+        with self._lock:
+            self._subscriptions.setdefault(client, set()).add(topic_filter)
+            self._routes.clear()
+            retained = [m for t, m in self._retained.items() if mqtt.topic_matches_sub(topic_filter, t)]
+        for msg in retained:
+            client._deliver(msg)
+
+    def unsubscribe(self, client, topic_filter=None):
+        with self._lock:
+            filters = self._subscriptions.get(client, set())
+            if topic_filter is None:
+                filters.clear()
+            else:
+                filters.discard(topic_filter)
+            self._routes.clear()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        elif payload is None:
+            payload = b""
+        msg = LocalMessage(topic, bytes(payload), qos, retain, next(self._mid))
+
+        with self._lock:
+            if retain:
+                if msg.payload:
+                    self._retained[topic] = msg
+                else:
+                    self._retained.pop(topic, None)
+            clients = self._routes.get(topic)
+            if clients is None:
+                clients = self._routes[topic] = [
+                    c for c, filters in self._subscriptions.items()
+                    if any(mqtt.topic_matches_sub(f, topic) for f in filters)
+                ]
+            self.published += 1
+            self.delivered += len(clients)
+
+        # Subscribers see retain=False on live delivery, as with a broker
+        live = LocalMessage(topic, msg.payload, qos, False, msg.mid) if retain else msg
+        for client in clients:
+            client._deliver(live)
+        return LocalPublishInfo(msg.mid)
+
+    def _count_dropped(self):
+        with self._lock:
+            self.dropped += 1
+            self.delivered -= 1
+
+
+local_bus = LocalBus()
+
+
+class LocalClient:
+    """paho.mqtt.client.Client look-alike bound to a LocalBus."""
+
+    def __init__(self, client_id="", bus=None, userdata=None):
+        self._client_id = client_id
+        self.bus = bus or local_bus
+        self.userdata = userdata
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self._callbacks = []   # (topic filter, callback) from message_callback_add
+        self._inbox = queue.Queue(maxsize=LOCAL_INBOX_MAX)
+        self._connected = False
+        self._running = False
+        self._thread = None
+        self._loop_thread = None   # Thread currently running loop() / loop_forever()
+        self.dropped = 0
+        self.will = None
+
+    # -------- CONNECTION --------
+
+    def connect(self, host=None, port=1883, keepalive=60, *args, **kwargs):
+        self._connected = True
+        # on_connect fires from the loop, like a CONNACK would
+        self._inbox.put(None)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def disconnect(self, *args, **kwargs):
+        self._connected = False
+        self._running = False
+        self.bus.unsubscribe(self)
+        if self.on_disconnect:
+            self.on_disconnect(self, self.userdata, mqtt.MQTT_ERR_SUCCESS)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def will_set(self, topic, payload=None, qos=0, retain=False, properties=None):
+        self.will = (topic, payload, qos, retain)
+
+    def is_connected(self):
+        return self._connected
+
+    # -------- PUB/SUB --------
+
+    def subscribe(self, topic, qos=0, *args, **kwargs):
+        for topic_filter in [t[0] if isinstance(t, tuple) else t for t in
+                             (topic if isinstance(topic, list) else [topic])]:
+            self.bus.subscribe(self, topic_filter)
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def unsubscribe(self, topic, *args, **kwargs):
+        self.bus.unsubscribe(self, topic)
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        return self.bus.publish(topic, payload, qos, retain)
+
+    def message_callback_add(self, sub, callback):
+        self._callbacks.append((sub, callback))
+
+    def message_callback_remove(self, sub):
+        self._callbacks = [(s, cb) for s, cb in self._callbacks if s != sub]
+
+    def _deliver(self, msg):
+        try:
+            if threading.current_thread() is self._loop_thread:
+                self._inbox.put_nowait(msg)   # Blocking here would wait on ourselves
+            else:
+                self._inbox.put(msg, timeout=LOCAL_DELIVER_TIMEOUT)
+        except queue.Full:
+            self.dropped += 1
+            self.bus._count_dropped()
+
+    # -------- LOOP --------
+
+    def _dispatch(self, msg):
+        try:
+            if msg is None:
+                if self.on_connect:
+                    self.on_connect(self, self.userdata, {}, 0)
+                return
+            matched = False
+            for sub, callback in self._callbacks:
+                if mqtt.topic_matches_sub(sub, msg.topic):
+                    callback(self, self.userdata, msg)
+                    matched = True
+            if not matched and self.on_message:
+                self.on_message(self, self.userdata, msg)
+        except Exception as e:
+            # One bad callback must not take down the component's loop
+            print(f"❌ {self._client_id or 'local client'} callback error: {e}")
+
+    def loop(self, timeout=1.0, *args, **kwargs):
+        """Dispatches pending messages for up to timeout seconds."""
+        self._loop_thread = threading.current_thread()
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                msg = self._inbox.get(timeout=max(remaining, 0)) if remaining > 0 else self._inbox.get_nowait()
+            except queue.Empty:
+                return mqtt.MQTT_ERR_SUCCESS
+            self._dispatch(msg)
+
+    def loop_forever(self, *args, **kwargs):
+        self._loop_thread = threading.current_thread()
+        self._running = True
+        while self._running:
+            try:
+                msg = self._inbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._dispatch(msg)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.loop_forever, name=f"local-{self._client_id}", daemon=True)
+            self._thread.start()
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_stop(self, force=False):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        self._thread = None
+        return mqtt.MQTT_ERR_SUCCESS
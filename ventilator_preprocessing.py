@@ -3,36 +3,55 @@ Ventilator Preprocessor — Phase 3
 Converts current draw readings to ventilator status events.
 """
 
-import json
-import paho.mqtt.client as mqtt
+import time
+
+import tracing
+import transport
+import wire_format
+from change_detection import Debouncer, hysteresis_state
 
 BROKER = "localhost"
-CURRENT_THRESHOLD = 1.5  # Above this amperage = in use
+CURRENT_ON_THRESHOLD = 1.5   # Above this amperage = in use
+CURRENT_OFF_THRESHOLD = 1.0  # Below this = free; in between keeps the last state
+DEBOUNCE_SAMPLES = 2         # Consecutive readings needed to flip
+
+vent_last_state = Debouncer(DEBOUNCE_SAMPLES)
+latency = tracing.LatencyRecorder("ventilator_preprocessor")
+
+
+def process_reading(data):
+    """Maps one raw current reading to (topic, event) pairs — empty unless the ventilator flipped."""
+    fid = data["facility_id"]
+    vent_id = data["resource_id"]
+    current = data["raw_value"]
 
-vent_last_state = {}
+    key = (fid, vent_id)
+    in_use = hysteresis_state(
+        current, vent_last_state.get(key), CURRENT_ON_THRESHOLD, CURRENT_OFF_THRESHOLD
+    )
+
+    if not vent_last_state.update(key, in_use):
+        return []
+
+    event = {
+        "facility_id": fid,
+        "event_type": "VENTILATOR_STATUS",
+        "status": "IN_USE" if in_use else "FREE",
+        "ventilator_id": vent_id,
+    }
+    tracing.carry(data, event)
+    return [("events/ventilator_status", event)]
 
 
 def on_message(client, userdata, msg):
+    started = time.perf_counter()
     try:
-        data = json.loads(msg.payload.decode())
-        fid = data["facility_id"]
-        vent_id = data["resource_id"]
-        current = data["raw_value"]
-
-        in_use = current > CURRENT_THRESHOLD
-        key = (fid, vent_id)
-        prev = vent_last_state.get(key, None)
-
-        if prev != in_use:
-            vent_last_state[key] = in_use
-            event = {
-                "facility_id": fid,
-                "event_type": "VENTILATOR_STATUS",
-                "status": "IN_USE" if in_use else "FREE",
-                "ventilator_id": vent_id,
-            }
-            client.publish("events/ventilator_status", json.dumps(event))
-            print(f"  Vent {vent_id} at {fid}: {'IN_USE' if in_use else 'FREE'}")
+        data = wire_format.decode(msg.payload)
+        for topic, event in process_reading(data):
+            client.publish(topic, wire_format.encode_event(event))
+            print(f"  Vent {event['ventilator_id']} at {event['facility_id']}: {event['status']}")
+
+        latency.record(data.get("trace"), started)
 
     except Exception as e:
         print(f"Preprocessor error: {e}")
@@ -44,10 +63,11 @@ def on_connect(client, userdata, flags, rc):
 
 
 if __name__ == "__main__":
-    client = mqtt.Client()
+    client = transport.create_client()
     client.on_connect = on_connect
     client.on_message = on_message
     client.connect(BROKER, 1883, 60)
+    latency.start_exporter()
 
     try:
         client.loop_forever()
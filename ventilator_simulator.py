@@ -3,10 +3,12 @@ Ventilator Simulator — Phase 2
 Simulates current draw from ventilator machines.
 """
 
-import json
 import time
 import random
-import paho.mqtt.client as mqtt
+
+import tracing
+import transport
+import wire_format
 
 BROKER = "localhost"
 
@@ -19,7 +21,7 @@ HOSPITALS = {
 
 
 def main():
-    client = mqtt.Client()
+    client = transport.create_client()
     client.connect(BROKER, 1883, 60)
     print("Ventilator Simulator started")
 
@@ -37,8 +39,9 @@ def main():
                     "resource_id": vent_id,
                     "raw_value": round(current, 2),
                 }
+                tracing.stamp(payload)
                 topic = f"hospital/{fid}/ventilator/raw"
-                client.publish(topic, json.dumps(payload))
+                client.publish(topic, wire_format.encode_reading(payload))
 
         time.sleep(4)
 
@@ -0,0 +1,166 @@
+"""
+Wire Format — Phase 4
+Compact binary encoding for hospital/+/+/raw readings and events/* messages,
+with JSON kept as the fallback.
+
+A binary payload starts with the MAGIC byte (JSON always starts with '{'),
+so decode() accepts either format on any topic. Publishers use
+config.WIRE_FORMAT and fall back to JSON for anything the fixed layouts
+cannot carry (unknown event types, ids longer than 255 bytes).
+
+Layouts (big-endian):
+    header   = magic:u8 kind:u8 code:u8 facility_id:str8 resource_id:str8
+    reading  = header raw_value:f64
+    BED_OCCUPANCY     = header occupied:u8
+    VENTILATOR_STATUS = header in_use:u8
+    OXYGEN_LEVEL      = header level_percent:f32 status:u8
+where str8 is a length byte followed by UTF-8. Messages carrying a
+tracing stamp set TRACE_FLAG in kind and end with ts:f64 seq:u32.
+"""
+
+import json
+import struct
+
+import config
+
+MAGIC = 0xB1
+KIND_READING = 1
+KIND_EVENT = 2
+TRACE_FLAG = 0x80
+
+RESOURCE_CODES = {"BED": 1, "VENTILATOR": 2, "OXYGEN": 3}
+EVENT_CODES = {"BED_OCCUPANCY": 1, "VENTILATOR_STATUS": 2, "OXYGEN_LEVEL": 3}
+EVENT_ID_FIELDS = {"BED_OCCUPANCY": "bed_id", "VENTILATOR_STATUS": "ventilator_id", "OXYGEN_LEVEL": "cylinder_id"}
+OXYGEN_STATUSES = ["NORMAL", "WARNING", "CRITICAL"]
+
+RESOURCE_NAMES = {v: k for k, v in RESOURCE_CODES.items()}
+EVENT_NAMES = {v: k for k, v in EVENT_CODES.items()}
+OXYGEN_STATUS_CODES = {s: i for i, s in enumerate(OXYGEN_STATUSES)}
+
+HEADER = struct.Struct(">BBB")
+F64 = struct.Struct(">d")
+OXYGEN_BODY = struct.Struct(">fB")
+TRACE = struct.Struct(">dI")
+
+# Interning: encoded headers per (kind, code, facility, resource) and decoded
+# strings per raw bytes, so hot ids are packed/unpacked once per process
+_header_cache = {}
+_string_cache = {}
+
+
+def _header(kind, code, facility_id, resource_id):
+    key = (kind, code, facility_id, resource_id)
+    header = _header_cache.get(key)
+    if header is None:
+        fid = facility_id.encode()
+        rid = resource_id.encode()
+        if len(fid) > 255 or len(rid) > 255:
+            return None
+        header = HEADER.pack(MAGIC, kind, code) + bytes([len(fid)]) + fid + bytes([len(rid)]) + rid
+        _header_cache[key] = header
+    return header
+
+
+def reading_header(facility_id, resource_type, resource_id, traced=False):
+    """
+    Pre-built prefix for a reading; append F64.pack(raw_value), plus
+    trace_trailer() if traced. None if not encodable.
+    """
+    code = RESOURCE_CODES.get(resource_type)
+    if code is None:
+        return None
+    kind = KIND_READING | TRACE_FLAG if traced else KIND_READING
+    return _header(kind, code, facility_id, str(resource_id))
+
+
+def trace_trailer(trace):
+    return TRACE.pack(trace["ts"], trace["seq"] & 0xFFFFFFFF)
+
+
+# -------- ENCODE --------
+
+def encode_reading(payload, fmt=None):
+    """Raw sensor reading -> bytes (binary) or str (JSON)."""
+    if (fmt or config.WIRE_FORMAT) == "binary":
+        trace = payload.get("trace")
+        header = reading_header(payload["facility_id"], payload["resource_type"], payload["resource_id"],
+                                traced=bool(trace))
+        if header is not None:
+            body = header + F64.pack(float(payload["raw_value"]))
+            return body + trace_trailer(trace) if trace else body
+    return json.dumps(payload)
+
+
+def encode_event(event, fmt=None):
+    """Preprocessor event -> bytes (binary) or str (JSON)."""
+    if (fmt or config.WIRE_FORMAT) == "binary":
+        event_type = event.get("event_type")
+        code = EVENT_CODES.get(event_type)
+        if code is not None:
+            trace = event.get("trace")
+            kind = KIND_EVENT | TRACE_FLAG if trace else KIND_EVENT
+            header = _header(kind, code, event["facility_id"], str(event[EVENT_ID_FIELDS[event_type]]))
+            if header is not None:
+                if event_type == "BED_OCCUPANCY":
+                    body = header + bytes([event["occupancy_state"] == "OCCUPIED"])
+                elif event_type == "VENTILATOR_STATUS":
+                    body = header + bytes([event["status"] == "IN_USE"])
+                else:
+                    body = header + OXYGEN_BODY.pack(
+                        event["estimated_level_percent"], OXYGEN_STATUS_CODES[event["status"]]
+                    )
+                return body + trace_trailer(trace) if trace else body
+    return json.dumps(event)
+
+
+# -------- DECODE --------
+
+def _string(buf, offset):
+    length = buf[offset]
+    end = offset + 1 + length
+    raw = buf[offset + 1:end]
+    value = _string_cache.get(raw)
+    if value is None:
+        value = _string_cache[raw] = raw.decode()
+    return value, end
+
+
+def decode(payload):
+    """Bytes from the wire (either format) -> dict."""
+    if not payload or payload[0] != MAGIC:
+        return json.loads(payload)
+
+    _, kind, code = HEADER.unpack_from(payload, 0)
+    facility_id, offset = _string(payload, HEADER.size)
+    resource_id, offset = _string(payload, offset)
+
+    trace = None
+    if kind & TRACE_FLAG:
+        ts, seq = TRACE.unpack_from(payload, len(payload) - TRACE.size)
+        trace = {"ts": ts, "seq": seq}
+        kind &= ~TRACE_FLAG
+
+    if kind == KIND_READING:
+        reading = {
+            "facility_id": facility_id,
+            "resource_type": RESOURCE_NAMES[code],
+            "resource_id": resource_id,
+            "raw_value": F64.unpack_from(payload, offset)[0],
+        }
+        if trace:
+            reading["trace"] = trace
+        return reading
+
+    event_type = EVENT_NAMES[code]
+    event = {"facility_id": facility_id, "event_type": event_type, EVENT_ID_FIELDS[event_type]: resource_id}
+    if event_type == "BED_OCCUPANCY":
+        event["occupancy_state"] = "OCCUPIED" if payload[offset] else "FREE"
+    elif event_type == "VENTILATOR_STATUS":
+        event["status"] = "IN_USE" if payload[offset] else "FREE"
+    else:
+        level, status = OXYGEN_BODY.unpack_from(payload, offset)
+        event["estimated_level_percent"] = round(level, 1)
+        event["status"] = OXYGEN_STATUSES[status]
+    if trace:
+        event["trace"] = trace
+    return event
@@ -0,0 +1,293 @@
+"""
+Write-Behind Buffer — Phase 4
+Pooled, batched DB writer for the state updater.
+Resource upserts, hospital_state changes and history rows are queued
+from the MQTT thread and flushed in bulk every FLUSH_INTERVAL_MS or
+FLUSH_MAX_ROWS, whichever comes first. barrier() waits until everything
+queued before it has been through a flush.
+
+A failed flush is rolled back as a whole and retried, merged with what
+arrived meanwhile, after FLUSH_RETRY_BACKOFF_MS (doubling per attempt).
+After FLUSH_MAX_RETRIES the batch is dropped, logged and counted, and
+on_drop(facility_ids) is told which facilities' hospital_state columns
+were lost.
+"""
+
+import queue
+import threading
+import time
+
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+# -------- CONFIG --------
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 4
+
+FLUSH_INTERVAL_MS = 250   # Max time a reading waits before hitting the DB
+FLUSH_MAX_ROWS = 1000     # Flush early once this many items are buffered
+QUEUE_MAX_SIZE = 50000    # Producers block when the buffer is this full
+FLUSH_MAX_RETRIES = 5           # Attempts after the first before a failed batch is dropped
+FLUSH_RETRY_BACKOFF_MS = 500    # Wait before the first retry; doubles up to FLUSH_RETRY_BACKOFF_MAX_MS
+FLUSH_RETRY_BACKOFF_MAX_MS = 8000
+
+
+def create_pool(db_params, min_conn=POOL_MIN_CONN, max_conn=POOL_MAX_CONN):
+    """Opens a persistent, thread-safe connection pool."""
+    return ThreadedConnectionPool(min_conn, max_conn, **db_params)
+
+
+RESOURCE, STATE, HISTORY, BARRIER = "resource", "state", "history", "barrier"
+
+
+class WriteBehindBuffer:
+    """
+    Bounded queue of pending writes, drained by a background thread.
+    Within one flush, repeated readings for the same resource and repeated
+    state changes for the same facility are coalesced, so only the latest
+    values are written. Everything in a flush commits in one transaction.
+    """
+
+    def __init__(self, pool, flush_interval_ms=FLUSH_INTERVAL_MS,
+                 flush_max_rows=FLUSH_MAX_ROWS, max_queue=QUEUE_MAX_SIZE, latency=None, on_drop=None):
+        self.pool = pool
+        self.latency = latency   # tracing.LatencyRecorder: source -> commit ages
+        self.on_drop = on_drop   # Called with the facility ids of dropped hospital_state rows
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_max_rows = flush_max_rows
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._retry = []          # Items of the last failed flush, written again with the next one
+        self._attempts = 0        # Consecutive failures of those items
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self.counters = {
+            "enqueued": 0,
+            "rows_written": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "flush_retries": 0,
+            "rows_dropped": 0,
+            "batches_dropped": 0,
+            "flush_ms_last": 0.0,
+            "flush_ms_max": 0.0,
+            "flush_ms_total": 0.0,
+        }
+
+    # -------- PRODUCER SIDE --------
+
+    def put_resource(self, facility_id, resource_type, resource_id, value, source_ts=None):
+        """
+        Queues an upsert into hospital_resources. Blocks if the buffer is full.
+        source_ts is the reading's tracing timestamp, recorded once it commits.
+        """
+        self._put((RESOURCE, (facility_id, resource_type, resource_id), value, source_ts))
+
+    def put_state(self, facility_id, columns):
+        """Queues changed hospital_state columns (beds_occupied, oxygen_percent, oxygen_status)."""
+        self._put((STATE, facility_id, dict(columns), None))
+
+    def put_history(self, rows):
+        """Queues closed hospital_history bucket rows (see history_writer.py)."""
+        for row in rows:
+            self._put((HISTORY, row[0], row[1:], None))
+
+    def barrier(self, timeout=None):
+        """Blocks until everything queued so far has been flushed; False on timeout."""
+        done = threading.Event()
+        self.queue.put((BARRIER, done, None, None))
+        return done.wait(timeout)
+
+    def _put(self, item):
+        self.queue.put(item)
+        with self._stats_lock:
+            self.counters["enqueued"] += 1
+
+    # -------- CONSUMER SIDE --------
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stops the flusher and writes whatever is still buffered (one attempt, no backoff)."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        while True:
+            items = self._retry + self._drain(block=False)
+            self._retry = []
+            if not items:
+                break
+            if not self._flush(items):
+                self._drop(items)
+
+    def _drain(self, block=True):
+        """Collects up to FLUSH_MAX_ROWS items, waiting at most FLUSH_INTERVAL_MS."""
+        items = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.flush_max_rows:
+            try:
+                if block:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    items.append(self.queue.get(timeout=remaining))
+                else:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Failed items go first, so anything newer for the same key wins the coalescing
+            items = self._retry + self._drain()
+            self._retry = []
+            if not items or self._flush(items):
+                self._attempts = 0
+                continue
+
+            self._attempts += 1
+            if self._attempts > FLUSH_MAX_RETRIES:
+                self._drop(items)
+                self._attempts = 0
+                continue
+            self._retry = items
+            with self._stats_lock:
+                self.counters["flush_retries"] += 1
+            backoff_ms = min(FLUSH_RETRY_BACKOFF_MS * 2 ** (self._attempts - 1), FLUSH_RETRY_BACKOFF_MAX_MS)
+            self._stop.wait(backoff_ms / 1000.0)
+
+    def _drop(self, items):
+        """Gives up on a batch that kept failing; barriers waiting on it are released."""
+        rows = self._coalesce(items)[0]
+        print(f"❌ Write-behind dropped {rows} rows after {FLUSH_MAX_RETRIES + 1} failed flushes")
+        with self._stats_lock:
+            self.counters["rows_dropped"] += rows
+            self.counters["batches_dropped"] += 1
+        if self.on_drop:
+            try:
+                self.on_drop({key for kind, key, _, _ in items if kind == STATE})
+            except Exception as e:
+                print(f"❌ Write-behind on_drop failed: {e}")
+        for kind, done, _, _ in items:
+            if kind == BARRIER:
+                done.set()
+
+    def _coalesce(self, items):
+        """Last reading per resource / last columns per facility win; returns the rows to write."""
+        resources = {}
+        states = {}
+        history = []
+        source_timestamps = []
+        barriers = []
+        for kind, key, value, source_ts in items:
+            if source_ts is not None:
+                source_timestamps.append(source_ts)
+            if kind == BARRIER:
+                barriers.append(key)
+            elif kind == RESOURCE:
+                resources[key] = value
+            elif kind == STATE:
+                states.setdefault(key, {}).update(value)
+            else:
+                history.append((key,) + value)
+
+        resource_rows = [key + (value,) for key, value in resources.items()]
+        state_rows = [
+            (fid, cols.get("beds_occupied"), cols.get("oxygen_percent"), cols.get("oxygen_status"))
+            for fid, cols in states.items()
+        ]
+        rows = len(resource_rows) + len(state_rows) + len(history)
+        return rows, resource_rows, state_rows, history, source_timestamps, barriers
+
+    def _flush(self, items):
+        """Writes one coalesced batch in a single transaction; False if it was rolled back."""
+        rows, resource_rows, state_rows, history, source_timestamps, barriers = self._coalesce(items)
+
+        if not rows:
+            for done in barriers:
+                done.set()
+            return True
+
+        started = time.perf_counter()
+        conn = None
+        broken = False
+        try:
+            conn = self.pool.getconn()
+            with conn.cursor() as cursor:
+                if resource_rows:
+                    execute_values(cursor, """
+                        INSERT INTO hospital_resources (facility_id, resource_type, resource_id, current_value, updated_at)
+                        VALUES %s
+                        ON CONFLICT (facility_id, resource_type, resource_id)
+                        DO UPDATE SET current_value = EXCLUDED.current_value, updated_at = now();
+                    """, resource_rows, template="(%s, %s, %s, %s, now())", page_size=len(resource_rows))
+
+                if state_rows:
+                    # NULL means "unchanged" for that column
+                    execute_values(cursor, """
+                        UPDATE hospital_state AS s
+                        SET beds_occupied = COALESCE(v.beds_occupied, s.beds_occupied),
+                            oxygen_percent = COALESCE(v.oxygen_percent, s.oxygen_percent),
+                            oxygen_status = COALESCE(v.oxygen_status, s.oxygen_status),
+                            last_updated = now()
+                        FROM (VALUES %s) AS v (facility_id, beds_occupied, oxygen_percent, oxygen_status)
+                        WHERE s.facility_id = v.facility_id
+                    """, state_rows, template="(%s, %s::integer, %s::double precision, %s::text)",
+                        page_size=len(state_rows))
+
+                if history:
+                    execute_values(cursor, """
+                        INSERT INTO hospital_history (
+                            facility_id, recorded_at,
+                            beds_occupied, beds_min, beds_max,
+                            oxygen_percent, oxygen_min, oxygen_max
+                        ) VALUES %s
+                    """, history, page_size=len(history))
+            conn.commit()
+        except Exception as e:
+            print(f"❌ Write-behind flush failed ({rows} rows): {e}")
+            if conn and not conn.closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True   # Connection died mid-flush: putconn below discards it
+            with self._stats_lock:
+                self.counters["flush_errors"] += 1
+            return False
+        finally:
+            if conn:
+                # A dropped connection must not be handed to the retry
+                self.pool.putconn(conn, close=broken or bool(conn.closed))
+
+        for done in barriers:
+            done.set()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        if self.latency and source_timestamps:
+            self.latency.record_ages(source_timestamps)
+        with self._stats_lock:
+            self.counters["rows_written"] += rows
+            self.counters["flushes"] += 1
+            self.counters["flush_ms_last"] = elapsed_ms
+            self.counters["flush_ms_max"] = max(self.counters["flush_ms_max"], elapsed_ms)
+            self.counters["flush_ms_total"] += elapsed_ms
+        return True
+
+    # -------- METRICS --------
+
+    def stats(self):
+        """Snapshot of throughput and flush-latency counters."""
+        with self._stats_lock:
+            snapshot = dict(self.counters)
+        uptime = max(time.monotonic() - self._started_at, 1e-9)
+        flushes = snapshot["flushes"]
+        snapshot["queue_depth"] = self.queue.qsize()
+        snapshot["enqueued_per_sec"] = round(snapshot["enqueued"] / uptime, 1)
+        snapshot["rows_written_per_sec"] = round(snapshot["rows_written"] / uptime, 1)
+        snapshot["flush_ms_avg"] = round(snapshot["flush_ms_total"] / flushes, 2) if flushes else 0.0
+        return snapshot